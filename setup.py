@@ -13,6 +13,7 @@ setup(
 			'beautifulsoup4>=4.3.2',
 			'htmlmin>=0.1.5',
 			'python-dateutil>=1.5',
+			'numpy>=1.7',
 			],
     tests_require    = ['sentinels>=0.0.6', 'nose>=1.0'],
 
@@ -4,92 +4,296 @@ $(function () {
      * This plugin extends Highcharts in two ways:
      * - Use HTML5 canvas instead of SVG for rendering of the heatmap squares. Canvas
      *   outperforms SVG when it comes to thousands of single shapes.
-     * - Add a K-D-tree to find the nearest point on mouse move. Since we no longer have SVG shapes
-     *   to capture mouseovers, we need another way of detecting hover points for the tooltip.
+     * - Find the point under the mouse through an index of the points. Since we no longer have SVG 
+     *   shapes to capture mouseovers, we need another way of detecting hover points for the tooltip.
+     *   Points on a regular grid are looked up by their cell; other points by a K-D-tree.
      */
     (function (H) {
         var wrap = H.wrap,
         seriesTypes = H.seriesTypes;
 
+        // Regular series whose grid would have more than this
+        // many cells per point are indexed by a K-D-tree instead:
+        var MAX_EMPTY_CELLS_PER_POINT = 4,
+            // A value that is this close to a multiple of the
+            // cell size, relative to that size, is on the grid:
+            GRID_TOLERANCE = 1e-6;
+
         /**
-         * Recursively builds a K-D-tree 
+         * Fill a typed array; Int32Array.fill() is missing in older browsers 
          */
-        function KDTree(points, depth) {
-            var axis, median, length = points && points.length;
+        function fill(array, value) {
+            var i;
 
-            if (length) {
+            if (array.fill) {
+                return array.fill(value);
+            }
+            for (i = 0; i < array.length; i++) {
+                array[i] = value;
+            }
+            return array;
+        }
 
-                // alternate between the axis
-                axis = ['plotX', 'plotY'][depth % 2];
+        /**
+         * Smallest value in data, ignoring null and NaN
+         */
+        function minimum(data) {
+            var min = Infinity,
+                i;
 
-                // sort point array
-                points.sort(function(a, b) {
-                    return a[axis] - b[axis];
-                });
-               
-                median = Math.floor(length / 2);
-                
-                // build and return node
-                return {
-                    point: points[median],
-                    left: KDTree(points.slice(0, median), depth + 1),
-                    right: KDTree(points.slice(median + 1), depth + 1)
-                };
-            
+            for (i = 0; i < data.length; i++) {
+                if (data[i] < min) {
+                    min = data[i];
+                }
             }
+            return min;
         }
 
         /**
-         * Recursively searches for the nearest neighbour using the given K-D-tree
+         * Index of the points of a series whose x and y values lie on
+         * a regular grid with cells of colsize by rowsize, as heatmap
+         * points normally do. The index maps an x/y value to the index
+         * of the point in that cell in constant time. It works in axis
+         * values rather than pixels, so it stays valid when the chart
+         * is resized. Returns null if the points are not on a grid, or
+         * the grid would be mostly empty.
          */
-        function nearest(search, tree, depth) {
-            var point = tree.point,
-                axis = ['plotX', 'plotY'][depth % 2],
-                tdist,
-                sideA,
-                sideB,
-                ret = point,
-                nPoint1,
-                nPoint2;
-            
-            // Get distance
-            point.dist = Math.pow(search.plotX - point.plotX, 2) + 
-                Math.pow(search.plotY - point.plotY, 2);
-            
-            // Pick side based on distance to splitting point
-            tdist = search[axis] - point[axis];
-            sideA = tdist < 0 ? 'left' : 'right';
-
-            // End of tree
-            if (tree[sideA]) {
-                nPoint1 = nearest(search, tree[sideA], depth + 1);
-
-                ret = (nPoint1.dist < ret.dist ? nPoint1 : point);
-
-                sideB = tdist < 0 ? 'right' : 'left';
-                if (tree[sideB]) {
-                    // compare distance to current best to splitting point to decide wether to check side B or not
-                    if (Math.abs(tdist) < ret.dist) {
-                        nPoint2 = nearest(search, tree[sideB], depth + 1);
-                        ret = (nPoint2.dist < ret.dist ? nPoint2 : ret);
-                    }
+        function GridIndex(xData, yData, colsize, rowsize) {
+            var length = xData.length,
+                xStart = minimum(xData),
+                yStart = minimum(yData),
+                cols = new Int32Array(length),
+                rows = new Int32Array(length),
+                numCols = 0,
+                numRows = 0,
+                col,
+                row,
+                colValue,
+                rowValue,
+                i;
+
+            if (!isFinite(xStart) || !isFinite(yStart)) {
+                return null;
+            }
+            for (i = 0; i < length; i++) {
+                if (xData[i] === null || yData[i] === null || isNaN(xData[i]) || isNaN(yData[i])) {
+                    cols[i] = -1;
+                    continue;
+                }
+                colValue = (xData[i] - xStart) / colsize;
+                rowValue = (yData[i] - yStart) / rowsize;
+                col = Math.round(colValue);
+                row = Math.round(rowValue);
+                if (Math.abs(colValue - col) > GRID_TOLERANCE || Math.abs(rowValue - row) > GRID_TOLERANCE) {
+                    return null;
+                }
+                cols[i] = col;
+                rows[i] = row;
+                numCols = Math.max(numCols, col + 1);
+                numRows = Math.max(numRows, row + 1);
+            }
+            if (numCols * numRows > MAX_EMPTY_CELLS_PER_POINT * length + 1024) {
+                return null;
+            }
+
+            this.xStart = xStart;
+            this.yStart = yStart;
+            this.colsize = colsize;
+            this.rowsize = rowsize;
+            this.numCols = numCols;
+            this.numRows = numRows;
+            // Point index by cell, column by column; -1 for empty cells:
+            this.cells = fill(new Int32Array(numCols * numRows), -1);
+            for (i = 0; i < length; i++) {
+                if (cols[i] >= 0) {
+                    this.cells[cols[i] * numRows + rows[i]] = i;
                 }
             }
-            return ret;
         }
 
-        // Extend the heatmap to use the K-D-tree to search for nearest points
+        /**
+         * Index of the point whose cell contains x/y, or -1
+         */
+        GridIndex.prototype.lookup = function (x, y) {
+            var col = Math.floor((x - this.xStart) / this.colsize + 0.5),
+                row = Math.floor((y - this.yStart) / this.rowsize + 0.5);
+
+            if (col < 0 || col >= this.numCols || row < 0 || row >= this.numRows) {
+                return -1;
+            }
+            return this.cells[col * this.numRows + row];
+        };
+
+        /**
+         * K-D-tree over the x and y values of the points of a series, for
+         * series whose points are not on a regular grid. The tree is kept
+         * in one array of point indices: the median of each index range
+         * is the node, with the lower and upper half as its subtrees. Like
+         * GridIndex it works in axis values, and so survives resizes.
+         */
+        function KDTree(xData, yData) {
+            var length = xData.length,
+                numPoints = 0,
+                i;
+
+            this.xs = new Float64Array(length);
+            this.ys = new Float64Array(length);
+            this.order = new Int32Array(length);
+            for (i = 0; i < length; i++) {
+                this.xs[i] = xData[i];
+                this.ys[i] = yData[i];
+                if (xData[i] !== null && yData[i] !== null && !isNaN(xData[i]) && !isNaN(yData[i])) {
+                    this.order[numPoints++] = i;
+                }
+            }
+            this.length = numPoints;
+            this.build(0, numPoints, 0);
+        }
+
+        /**
+         * Arrange the index range [lo, hi) into a subtree
+         * that splits on x at even depths, on y at odd ones
+         */
+        KDTree.prototype.build = function (lo, hi, depth) {
+            var mid = (lo + hi) >> 1;
+
+            if (hi - lo < 2) {
+                return;
+            }
+            this.select(lo, hi, mid, depth % 2 ? this.ys : this.xs);
+            this.build(lo, mid, depth + 1);
+            this.build(mid + 1, hi, depth + 1);
+        };
+
+        /**
+         * Partially sort the index range [lo, hi) in place such that
+         * position k holds the point that belongs there, with no larger
+         * coordinates before it, and no smaller ones after it
+         */
+        KDTree.prototype.select = function (lo, hi, k, coords) {
+            var order = this.order,
+                pivot,
+                swap,
+                i,
+                j;
+
+            hi -= 1;
+            while (lo < hi) {
+                pivot = coords[order[(lo + hi) >> 1]];
+                i = lo;
+                j = hi;
+                while (i <= j) {
+                    while (coords[order[i]] < pivot) {
+                        i++;
+                    }
+                    while (coords[order[j]] > pivot) {
+                        j--;
+                    }
+                    if (i <= j) {
+                        swap = order[i];
+                        order[i] = order[j];
+                        order[j] = swap;
+                        i++;
+                        j--;
+                    }
+                }
+                if (k <= j) {
+                    hi = j;
+                } else if (k >= i) {
+                    lo = i;
+                } else {
+                    return;
+                }
+            }
+        };
+
+        /**
+         * Index of the point nearest to x/y, or -1. Distances are
+         * measured in pixels: xScale and yScale are the number of
+         * pixels per unit of the x and y axis.
+         */
+        KDTree.prototype.lookup = function (x, y, xScale, yScale) {
+            var best = {index: -1, dist: Infinity};
+
+            this.nearest(x, y, xScale * xScale, yScale * yScale, 0, this.length, 0, best);
+            return best.index;
+        };
+
+        KDTree.prototype.nearest = function (x, y, xScale2, yScale2, lo, hi, depth, best) {
+            var mid = (lo + hi) >> 1,
+                index,
+                dx,
+                dy,
+                dist,
+                splitDist2;
+
+            if (lo >= hi) {
+                return;
+            }
+            index = this.order[mid];
+            dx = x - this.xs[index];
+            dy = y - this.ys[index];
+            dist = dx * dx * xScale2 + dy * dy * yScale2;
+            if (dist < best.dist) {
+                best.dist = dist;
+                best.index = index;
+            }
+            // Signed distance to the splitting line, and its square in pixels:
+            splitDist2 = depth % 2 ? dy * dy * yScale2 : dx * dx * xScale2;
+            if ((depth % 2 ? dy : dx) < 0) {
+                this.nearest(x, y, xScale2, yScale2, lo, mid, depth + 1, best);
+                // The other side can only hold a nearer point if
+                // the splitting line is nearer than the best point:
+                if (splitDist2 < best.dist) {
+                    this.nearest(x, y, xScale2, yScale2, mid + 1, hi, depth + 1, best);
+                }
+            } else {
+                this.nearest(x, y, xScale2, yScale2, mid + 1, hi, depth + 1, best);
+                if (splitDist2 < best.dist) {
+                    this.nearest(x, y, xScale2, yScale2, lo, mid, depth + 1, best);
+                }
+            }
+        };
+
+        // Index the heatmap points for hover lookup. Called after every
+        // redraw; the index is only rebuilt when the data changed, since
+        // it is in axis values rather than pixels:
         H.seriesTypes.heatmap.prototype.setTooltipPoints = function () {
-            var series = this;
+            var series = this,
+                xData = series.processedXData,
+                yData = series.processedYData;
 
-            this.tree = null;
+            if (series.hoverIndex && series.hoverIndex.xData === xData && series.hoverIndex.yData === yData) {
+                return;
+            }
+            series.hoverIndex = null;
             setTimeout(function () {
-                series.tree = KDTree(series.points, 0);
+                var index;
+
+                if (series.processedXData !== xData || series.processedYData !== yData) {
+                    // Data changed again meanwhile
+                    return;
+                }
+                index = new GridIndex(xData, yData, series.options.colsize || 1, series.options.rowsize || 1);
+                if (!index.cells) {
+                    index = new KDTree(xData, yData);
+                }
+                index.xData = xData;
+                index.yData = yData;
+                series.hoverIndex = index;
             });
         };
         H.seriesTypes.heatmap.prototype.getNearest = function (search) {
-            if (this.tree) {
-                return nearest(search, this.tree, 0);
+            var xAxis = this.xAxis,
+                yAxis = this.yAxis,
+                index;
+
+            if (this.hoverIndex) {
+                index = this.hoverIndex.lookup(xAxis.toValue(search.plotX, true), 
+                                               yAxis.toValue(search.plotY, true),
+                                               Math.abs(xAxis.transA),
+                                               Math.abs(yAxis.transA));
+                return index >= 0 ? this.points[index] : undefined;
             }
         };
 
@@ -112,27 +316,251 @@ $(function () {
             })
         });
 
+        // Number of colors sampled from a gradient color axis:
+        var COLOR_LUT_SIZE = 256,
+            LITTLE_ENDIAN = new Uint8Array(new Uint32Array([1]).buffer)[0] === 1;
+
+        /**
+         * Fill rectangles in a buffer of 32-bit pixels. rects holds x, y,
+         * width, and height of each rectangle, colors the pixel value of
+         * each. Self-contained, so that it can run in a worker, too.
+         */
+        function fillRects(pixels, width, height, rects, colors) {
+            var count = colors.length,
+                hasFill = typeof pixels.fill === 'function',
+                i,
+                x0,
+                x1,
+                y,
+                y1,
+                start,
+                color,
+                k;
+
+            for (i = 0; i < count; i++) {
+                x0 = Math.max(0, rects[4 * i]);
+                x1 = Math.min(width, rects[4 * i] + rects[4 * i + 2]);
+                y = Math.max(0, rects[4 * i + 1]);
+                y1 = Math.min(height, rects[4 * i + 1] + rects[4 * i + 3]);
+                color = colors[i];
+                for (; y < y1; y++) {
+                    start = y * width;
+                    if (hasFill) {
+                        pixels.fill(color, start + x0, start + x1);
+                    } else {
+                        for (k = start + x0; k < start + x1; k++) {
+                            pixels[k] = color;
+                        }
+                    }
+                }
+            }
+        }
+
+        /**
+         * Source of the worker that draws into an OffscreenCanvas
+         * for series with option renderInWorker
+         */
+        var WORKER_SOURCE = fillRects.toString() + '\n(' + function () {
+            var canvas, ctx, imageData;
+
+            self.onmessage = function (e) {
+                var msg = e.data,
+                    pixels;
+
+                if (msg.canvas) {
+                    canvas = msg.canvas;
+                    ctx = canvas.getContext('2d');
+                    return;
+                }
+                if (canvas.width !== msg.width || canvas.height !== msg.height) {
+                    canvas.width = msg.width;
+                    canvas.height = msg.height;
+                    imageData = null;
+                }
+                if (!imageData) {
+                    imageData = ctx.createImageData(msg.width, msg.height);
+                }
+                pixels = new Uint32Array(imageData.data.buffer);
+                pixels.fill(0);
+                fillRects(pixels, msg.width, msg.height, msg.rects, msg.colors);
+                ctx.putImageData(imageData, 0, 0);
+            };
+        }.toString() + '());';
+
+        /**
+         * Pixel value of a CSS color, or null if it is not a plain color
+         */
+        function packColor(color) {
+            var rgba = H.Color(color).rgba,
+                alpha;
+
+            if (!rgba || rgba[0] === undefined) {
+                return null;
+            }
+            alpha = Math.round((rgba[3] === undefined ? 1 : rgba[3]) * 255);
+            if (LITTLE_ENDIAN) {
+                return ((alpha << 24) | (rgba[2] << 16) | (rgba[1] << 8) | rgba[0]) >>> 0;
+            }
+            return ((rgba[0] << 24) | (rgba[1] << 16) | (rgba[2] << 8) | alpha) >>> 0;
+        }
+
+        /**
+         * Return a function that gives the pixel value of a point. Values 
+         * on a gradient color axis are looked up in a table of COLOR_LUT_SIZE
+         * colors, which is computed once per draw. Other colors are parsed
+         * once per distinct color. Returns null for colors that are not
+         * plain colors, such as gradients.
+         */
+        function pointColorer(series) {
+            var colorAxis = series.colorAxis,
+                nullColor = packColor(series.options.nullColor),
+                parsed = {},
+                lut,
+                min,
+                max,
+                scale,
+                k;
+
+            function fromColor(point) {
+                var color = point.color;
+
+                if (!parsed.hasOwnProperty(color)) {
+                    parsed[color] = packColor(color);
+                }
+                return parsed[color];
+            }
+
+            if (!colorAxis || colorAxis.dataClasses || !(colorAxis.max > colorAxis.min)) {
+                return fromColor;
+            }
+            min = colorAxis.isLog ? colorAxis.val2lin(colorAxis.min) : colorAxis.min;
+            max = colorAxis.isLog ? colorAxis.val2lin(colorAxis.max) : colorAxis.max;
+            lut = new Uint32Array(COLOR_LUT_SIZE);
+            for (k = 0; k < COLOR_LUT_SIZE; k++) {
+                lut[k] = packColor(colorAxis.toColor(colorAxis.isLog ? 
+                                                     colorAxis.lin2val(min + (max - min) * k / (COLOR_LUT_SIZE - 1)) :
+                                                     min + (max - min) * k / (COLOR_LUT_SIZE - 1)));
+            }
+            scale = (COLOR_LUT_SIZE - 1) / (max - min);
+            return function (point) {
+                var value = point.value;
+
+                if (value === null || value === undefined) {
+                    return nullColor;
+                }
+                if (point.options && point.options.color) {
+                    return fromColor(point);
+                }
+                if (colorAxis.isLog) {
+                    value = colorAxis.val2lin(value);
+                }
+                return lut[Math.max(0, Math.min(COLOR_LUT_SIZE - 1, Math.round((value - min) * scale)))];
+            };
+        }
+
         /**
-         * Get the canvas context for a series 
+         * Get the canvas for a series, sized and placed over the plot area.
+         * With series option renderInWorker, and where the browser can, the
+         * canvas is handed to a worker that draws it (this.renderWorker);
+         * otherwise its 2D context is this.ctx.
          */
-        H.Series.prototype.getContext = function () {
-            var canvas;
-            if (!this.ctx) {
-                canvas = document.createElement('canvas');
-                canvas.setAttribute('width', this.chart.plotWidth);
-                canvas.setAttribute('height', this.chart.plotHeight);
+        H.Series.prototype.getCanvas = function () {
+            var chart = this.chart,
+                canvas = this.canvas,
+                worker,
+                offscreen;
+
+            if (!canvas) {
+                canvas = this.canvas = document.createElement('canvas');
+                canvas.setAttribute('width', chart.plotWidth);
+                canvas.setAttribute('height', chart.plotHeight);
                 canvas.style.position = 'absolute';
-                canvas.style.left = this.group.translateX + 'px';
-                canvas.style.top = this.group.translateY + 'px';
                 canvas.style.zIndex = 0;
                 canvas.style.cursor = 'crosshair';
-                this.chart.container.appendChild(canvas);
-                if (canvas.getContext) {
+                chart.container.appendChild(canvas);
+                if (this.options.renderInWorker && window.Worker && window.Blob && window.URL && 
+                        canvas.transferControlToOffscreen) {
+                    try {
+                        worker = new Worker(URL.createObjectURL(new Blob([WORKER_SOURCE], {type: 'application/javascript'})));
+                        offscreen = canvas.transferControlToOffscreen();
+                        worker.postMessage({canvas: offscreen}, [offscreen]);
+                        this.renderWorker = worker;
+                    } catch (e) {
+                        // E.g. workers from blobs not allowed on file:// pages
+                        this.renderWorker = null;
+                    }
+                }
+                if (!this.renderWorker && canvas.getContext) {
                     this.ctx = canvas.getContext('2d');
                 }
             }
-            return this.ctx;
-        }
+            canvas.style.left = this.group.translateX + 'px';
+            canvas.style.top = this.group.translateY + 'px';
+            if (this.ctx && (canvas.width !== chart.plotWidth || canvas.height !== chart.plotHeight)) {
+                canvas.width = chart.plotWidth;
+                canvas.height = chart.plotHeight;
+            }
+            return canvas;
+        };
+
+        /**
+         * Draw the points of a series into its canvas: the rectangles
+         * of all points go into one pixel buffer, which is then put
+         * into the canvas at once. Returns false if a point's color
+         * cannot be drawn that way.
+         */
+        H.Series.prototype.drawPixels = function () {
+            var chart = this.chart,
+                width = chart.plotWidth,
+                height = chart.plotHeight,
+                points = this.points,
+                colorOf = pointColorer(this),
+                rects = new Int32Array(4 * points.length),
+                colors = new Uint32Array(points.length),
+                count = 0,
+                imageData,
+                pixels,
+                point,
+                shapeArgs,
+                color,
+                i;
+
+            for (i = 0; i < points.length; i++) {
+                point = points[i];
+                if (point.plotY !== undefined && !isNaN(point.plotY) && point.y !== null) {
+                    color = colorOf(point);
+                    if (color === null) {
+                        return false;
+                    }
+                    shapeArgs = point.shapeArgs;
+                    rects[4 * count] = shapeArgs.x;
+                    rects[4 * count + 1] = shapeArgs.y;
+                    rects[4 * count + 2] = shapeArgs.width;
+                    rects[4 * count + 3] = shapeArgs.height;
+                    colors[count] = color;
+                    count++;
+                }
+            }
+            rects = rects.subarray(0, 4 * count);
+            colors = colors.subarray(0, count);
+
+            if (this.renderWorker) {
+                rects = new Int32Array(rects);
+                colors = new Uint32Array(colors);
+                this.renderWorker.postMessage({width: width, height: height, rects: rects, colors: colors}, 
+                                              [rects.buffer, colors.buffer]);
+                return true;
+            }
+            imageData = this.imageData;
+            if (!imageData || imageData.width !== width || imageData.height !== height) {
+                imageData = this.imageData = this.ctx.createImageData(width, height);
+            }
+            pixels = new Uint32Array(imageData.data.buffer);
+            fill(pixels, 0);
+            fillRects(pixels, width, height, rects, colors);
+            this.ctx.putImageData(imageData, 0, 0);
+            return true;
+        };
 
         /**
          * Wrap the drawPoints method to draw the points in canvas instead of the slower SVG, 
@@ -146,21 +574,26 @@ $(function () {
                 proceed.call(this);
             
             } else {
-                
-                if (ctx = this.getContext()) {
-                    
-                    // draw the columns
-                    H.each(this.points, function (point) {
-                        var plotY = point.plotY,
-                            shapeArgs;
 
-                        if (plotY !== undefined && !isNaN(plotY) && point.y !== null) {
-                            shapeArgs = point.shapeArgs;
+                this.getCanvas();
+                if (this.renderWorker || this.ctx) {
+
+                    if (!this.drawPixels() && this.ctx) {
+                        // Colors such as gradients: one rectangle at a time
+                        ctx = this.ctx;
+                        ctx.clearRect(0, 0, this.chart.plotWidth, this.chart.plotHeight);
+                        H.each(this.points, function (point) {
+                            var plotY = point.plotY,
+                                shapeArgs;
+
+                            if (plotY !== undefined && !isNaN(plotY) && point.y !== null) {
+                                shapeArgs = point.shapeArgs;
                             
-                            ctx.fillStyle = point.pointAttr[''].fill;
-                            ctx.fillRect(shapeArgs.x, shapeArgs.y, shapeArgs.width, shapeArgs.height);
-                        }
-                    });
+                                ctx.fillStyle = point.pointAttr[''].fill;
+                                ctx.fillRect(shapeArgs.x, shapeArgs.y, shapeArgs.width, shapeArgs.height);
+                            }
+                        });
+                    }
                 
                 } else {
                     this.chart.showLoading("Your browser doesn't support HTML5 canvas, <br>please use a modern browser");
@@ -173,3 +606,4 @@ $(function () {
         });
     }(Highcharts));
 
+});
@@ -0,0 +1,38 @@
+/**
+ * The two uses of jQuery in WebReports pages, for pages that
+ * run Highcharts on its standalone adapter instead:
+ *
+ *     $(function () {...})                 runs the function once the page is loaded
+ *     $('#chart0').highcharts({...})       makes a chart in the element with id chart0
+ *
+ * Does nothing if jQuery is loaded.
+ */
+(function (win, doc) {
+
+    if (win.jQuery) {
+        return;
+    }
+
+    function whenReady(callback) {
+        if (doc.readyState === 'loading') {
+            doc.addEventListener('DOMContentLoaded', callback, false);
+        } else {
+            callback();
+        }
+    }
+
+    win.$ = function (arg) {
+        if (typeof arg === 'function') {
+            whenReady(arg);
+            return;
+        }
+        return {
+            highcharts: function (options) {
+                options.chart = options.chart || {};
+                options.chart.renderTo = doc.getElementById(arg.replace(/^#/, ''));
+                return new win.Highcharts.Chart(options);
+            }
+        };
+    };
+
+}(window, document));
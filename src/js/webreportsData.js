@@ -0,0 +1,274 @@
+/**
+ * Decoding of chart data that ChartMaker ships as pre-parsed
+ * columns instead of CSV text. Each chart's payload is a JSON
+ * document in a <script type="application/json"> element whose
+ * id is the chart's id plus '_data'. The payload holds a list of
+ * chunks; each chunk holds the chart's columns as base64 encoded,
+ * little-endian typed arrays:
+ *
+ *     {chunks: [{x:     {type: 'f64', data: '...'},
+ *                y:     {type: 'i32', data: '...'},
+ *                value: {type: 'i32', data: '...', scale: 0.1}},
+ *               ...]}
+ *
+ * Integer columns with a scale hold quantized values. The smallest
+ * int32 stands for a missing value, as does NaN in float columns.
+ *
+ * Charts may instead have their data in a sidecar script next to
+ * the page, such as report.chart0.js, which calls
+ * WebReports.receive(chartId, data). WebReports.whenData() loads
+ * the sidecar by adding a <script> element, which, unlike XHR,
+ * also works for pages opened from the local file system.
+ *
+ * On pages with lazy charts, WebReports.whenVisible() makes each
+ * chart only once its <div> comes near the viewport.
+ */
+var WebReports = window.WebReports || {};
+
+(function (WR) {
+    var INT32_NULL = -2147483648,
+        ARRAY_TYPES = {
+            f64: Float64Array,
+            f32: Float32Array,
+            i32: Int32Array
+        },
+        // Data received from sidecars, and callbacks
+        // waiting for them, by chart id:
+        received = {},
+        waiting = {},
+        // Charts are made when their <div> is this close
+        // to the viewport:
+        LAZY_MARGIN_PX = 300,
+        // Lazy charts not yet made: callbacks by chart id,
+        // and for browsers without IntersectionObserver
+        // their elements:
+        invisible = {},
+        invisibleElements = [],
+        observer = null,
+        scrollTimer = null;
+
+    /**
+     * Turn one base64 encoded column into a typed array
+     */
+    function decodeColumn(column) {
+        var binary = atob(column.data),
+            length = binary.length,
+            bytes = new Uint8Array(length),
+            i;
+
+        for (i = 0; i < length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new ARRAY_TYPES[column.type](bytes.buffer);
+    }
+
+    /**
+     * Return a function that maps the raw numbers of a
+     * decoded column to chart values, including nulls.
+     */
+    function valueReader(column) {
+        var scale = column.scale,
+            divisor = scale && Math.round(1 / scale);
+
+        if (column.type === 'i32') {
+            // Dividing by e.g. 10 rather than multiplying by 0.1
+            // avoids values like 1.4000000000000001:
+            if (divisor && Math.abs(divisor - 1 / scale) < 1e-9) {
+                return function (raw) {
+                    return raw === INT32_NULL ? null : raw / divisor;
+                };
+            }
+            if (scale) {
+                return function (raw) {
+                    return raw === INT32_NULL ? null : raw * scale;
+                };
+            }
+            return function (raw) {
+                return raw === INT32_NULL ? null : raw;
+            };
+        }
+        return function (raw) {
+            return isNaN(raw) ? null : raw;
+        };
+    }
+
+    /**
+     * Called by a chart's sidecar script with the chart's data
+     */
+    WR.receive = function (chartId, data) {
+        var callbacks = waiting[chartId] || [],
+            i;
+
+        received[chartId] = data;
+        delete waiting[chartId];
+        for (i = 0; i < callbacks.length; i++) {
+            callbacks[i]();
+        }
+    };
+
+    /**
+     * Call callback once the data of the given chart have
+     * arrived from the sidecar script at src. Starts loading
+     * the script unless it is already loading.
+     */
+    WR.whenData = function (chartId, src, callback) {
+        var script;
+
+        if (received.hasOwnProperty(chartId)) {
+            callback();
+            return;
+        }
+        if (!waiting[chartId]) {
+            waiting[chartId] = [];
+            script = document.createElement('script');
+            script.src = src;
+            script.async = true;
+            document.getElementsByTagName('head')[0].appendChild(script);
+        }
+        waiting[chartId].push(callback);
+    };
+
+    /**
+     * Call callback once the page is loaded
+     */
+    function whenReady(callback) {
+        if (document.readyState === 'loading') {
+            document.addEventListener('DOMContentLoaded', callback, false);
+        } else {
+            callback();
+        }
+    }
+
+    /**
+     * Run and forget the callback of a lazy chart
+     */
+    function makeVisible(element) {
+        var callback = invisible[element.id];
+
+        if (callback) {
+            delete invisible[element.id];
+            callback();
+        }
+    }
+
+    function isNearViewport(element) {
+        var rect = element.getBoundingClientRect(),
+            viewportHeight = window.innerHeight || document.documentElement.clientHeight;
+
+        return rect.bottom >= -LAZY_MARGIN_PX && rect.top <= viewportHeight + LAZY_MARGIN_PX;
+    }
+
+    /**
+     * Fallback for browsers without IntersectionObserver:
+     * make the waiting charts that are near the viewport
+     */
+    function checkInvisible() {
+        var stillInvisible = [],
+            i;
+
+        scrollTimer = null;
+        for (i = 0; i < invisibleElements.length; i++) {
+            if (isNearViewport(invisibleElements[i])) {
+                makeVisible(invisibleElements[i]);
+            } else {
+                stillInvisible.push(invisibleElements[i]);
+            }
+        }
+        invisibleElements = stillInvisible;
+        if (invisibleElements.length === 0) {
+            window.removeEventListener('scroll', onScroll, false);
+            window.removeEventListener('resize', onScroll, false);
+        }
+    }
+
+    function onScroll() {
+        if (scrollTimer === null) {
+            scrollTimer = setTimeout(checkInvisible, 100);
+        }
+    }
+
+    /**
+     * Call callback once the element with id chartId
+     * is near the viewport. Charts whose element is
+     * missing are made right away.
+     */
+    WR.whenVisible = function (chartId, callback) {
+        whenReady(function () {
+            var element = document.getElementById(chartId);
+
+            if (!element) {
+                callback();
+                return;
+            }
+            invisible[chartId] = callback;
+            if (window.IntersectionObserver) {
+                if (observer === null) {
+                    observer = new IntersectionObserver(function (entries) {
+                        var i;
+
+                        for (i = 0; i < entries.length; i++) {
+                            if (entries[i].isIntersecting) {
+                                observer.unobserve(entries[i].target);
+                                makeVisible(entries[i].target);
+                            }
+                        }
+                    }, {rootMargin: LAZY_MARGIN_PX + 'px 0px'});
+                }
+                observer.observe(element);
+            } else {
+                if (invisibleElements.length === 0) {
+                    window.addEventListener('scroll', onScroll, false);
+                    window.addEventListener('resize', onScroll, false);
+                }
+                invisibleElements.push(element);
+                onScroll();
+            }
+        });
+    };
+
+    /**
+     * Return the payload of the given chart: the data
+     * from its sidecar, or else the parsed JSON in the page
+     */
+    WR.getPayload = function (chartId) {
+        if (received.hasOwnProperty(chartId)) {
+            return received[chartId];
+        }
+        return JSON.parse(document.getElementById(chartId + '_data').textContent);
+    };
+
+    /**
+     * Return the CSV text of the given chart: from its
+     * sidecar, or else from the hidden <pre> in the page
+     */
+    WR.getCSV = function (chartId) {
+        if (received.hasOwnProperty(chartId)) {
+            return received[chartId];
+        }
+        return document.getElementById(chartId + '_csv').innerHTML;
+    };
+
+    /**
+     * Return the [x, y, value] points of a heatmap
+     */
+    WR.heatmapPoints = function (chartId) {
+        var chunks = WR.getPayload(chartId).chunks,
+            points = [],
+            c, i, chunk, x, y, value, readX, readY, readValue;
+
+        for (c = 0; c < chunks.length; c++) {
+            chunk = chunks[c];
+            x = decodeColumn(chunk.x);
+            y = decodeColumn(chunk.y);
+            value = decodeColumn(chunk.value);
+            readX = valueReader(chunk.x);
+            readY = valueReader(chunk.y);
+            readValue = valueReader(chunk.value);
+
+            for (i = 0; i < x.length; i++) {
+                points.push([readX(x[i]), readY(y[i]), readValue(value[i])]);
+            }
+        }
+        return points;
+    };
+}(WebReports));
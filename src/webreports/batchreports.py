@@ -0,0 +1,210 @@
+'''
+Created on Oct 16, 2026
+
+Generation of the same report for many partitions of
+the data, such as one page per course, on a pool of
+worker processes.
+
+A report spec is a function that takes a partition's key
+and the name of the CSV file with the partition's rows, and
+returns the charts for that partition's page. Specs are passed
+either as the function itself, or as a 'module:function' string.
+Partitions are a dict from key to CSV file, or are made from a
+single CSV file by partitionCSV().
+
+Command line usage:
+
+    python batchreports.py --spec myreports:courseCharts --key course_display_name
+                           --outDir /tmp/reports data/testProblemSet.csv
+'''
+from __future__ import print_function
+
+import argparse
+from collections import OrderedDict
+import csv
+import hashlib
+import importlib
+import multiprocessing
+import os
+import re
+import sys
+
+from chartmaker import ChartMaker
+
+
+# Worker processes are replaced after this many pages,
+# which returns memory that a page's charts leave behind:
+MAX_PAGES_PER_WORKER = 10
+
+# Maximum number of partition files that partitionCSV()
+# keeps open at the same time:
+MAX_OPEN_PARTITION_FILES = 64
+
+def loadReportSpec(reportSpec):
+    '''
+    Return the report function named by reportSpec.
+    :param reportSpec: function, or 'module:function'
+    :type reportSpec: {function | String}
+    :rtype: function
+    '''
+    if callable(reportSpec):
+        return reportSpec
+    try:
+        (moduleName, funcName) = reportSpec.split(':')
+    except ValueError:
+        raise ValueError("Report spec must be 'module:function', not %s" % reportSpec)
+    return getattr(importlib.import_module(moduleName), funcName)
+
+def pageFileName(outDir, partitionKey):
+    '''
+    Return the path of the page for the given partition.
+    Characters that are not safe in file names, such as
+    the slashes in course names, become underscores; the
+    name then ends in a short hash of the key, so that keys
+    like 'a/b' and 'a b' still get pages of their own.
+    :param outDir: directory of the pages
+    :type outDir: String
+    :param partitionKey: key of the partition
+    :type partitionKey: String
+    :rtype: String
+    '''
+    partitionKey = str(partitionKey)
+    fileName = re.sub(r'[^A-Za-z0-9._-]', '_', partitionKey)
+    if fileName != partitionKey:
+        fileName += '_' + hashlib.sha1(partitionKey.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(outDir, fileName + '.html')
+
+def partitionCSV(csvFileName, keyColumn, outDir, fieldSep=','):
+    '''
+    Split a CSV file with a header line into one CSV file per
+    distinct value of the key column, each with the header. The
+    input is read a row at a time, so files of any size can be
+    split. Files are named like the pages of pageFileName(),
+    with extension .csv.
+    :param csvFileName: file to split
+    :type csvFileName: String
+    :param keyColumn: name or zero-based index of the key column
+    :type keyColumn: {String | int}
+    :param outDir: directory for the partition files
+    :type outDir: String
+    :param fieldSep: field separator
+    :type fieldSep: String
+    :return: partition file for each key, in order of first appearance
+    :rtype: OrderedDict
+    '''
+    partitions = OrderedDict()
+    openFiles = OrderedDict()
+    try:
+        with open(csvFileName, 'r', newline='') as fd:
+            reader = csv.reader(fd, delimiter=fieldSep)
+            header = next(reader)
+            keyIndex = keyColumn if isinstance(keyColumn, int) else header.index(keyColumn)
+            for row in reader:
+                if len(row) <= keyIndex:
+                    continue
+                key = row[keyIndex]
+                writer = openFiles.get(key)
+                if writer is None:
+                    if len(openFiles) >= MAX_OPEN_PARTITION_FILES:
+                        (_, (oldFd, _)) = openFiles.popitem(last=False)
+                        oldFd.close()
+                    isNew = key not in partitions
+                    if isNew:
+                        partitions[key] = pageFileName(outDir, key)[:-len('.html')] + '.csv'
+                    partitionFd = open(partitions[key], 'w' if isNew else 'a', newline='')
+                    writer = (partitionFd, csv.writer(partitionFd, delimiter=fieldSep))
+                    if isNew:
+                        writer[1].writerow(header)
+                    openFiles[key] = writer
+                else:
+                    openFiles.move_to_end(key)
+                writer[1].writerow(row)
+    finally:
+        for (partitionFd, _) in openFiles.values():
+            partitionFd.close()
+    return partitions
+
+def makePartitionPage(reportSpec, partitionKey, partitionFile, outDir):
+    '''
+    Make the page of one partition. Chart names start
+    over at chart0, so that each page is the same no
+    matter which process makes it, or in which order.
+    :return: the partition key, and the file of its page
+    :rtype: (String, String)
+    '''
+    ChartMaker.resetChartNameIndex()
+    charts = loadReportSpec(reportSpec)(partitionKey, partitionFile)
+    outFile = pageFileName(outDir, partitionKey)
+    with open(outFile, 'w') as fd:
+        ChartMaker.writeWebPage(fd, charts)
+    return (partitionKey, outFile)
+
+def _makePartitionPage(args):
+    return makePartitionPage(*args)
+
+def generateReports(reportSpec, partitions, outDir, numProcesses=None, maxPagesPerWorker=MAX_PAGES_PER_WORKER):
+    '''
+    Make one page per partition on a pool of numProcesses
+    worker processes. Each worker holds only the charts of
+    the page it works on, and is replaced after maxPagesPerWorker
+    pages. With numProcesses=1, pages are made in this process.
+    :param reportSpec: report function, or 'module:function';
+        module functions must be given as strings when the
+        workers cannot import the function's module by name
+    :type reportSpec: {function | String}
+    :param partitions: CSV file for each partition key
+    :type partitions: {String : String}
+    :param outDir: directory for the pages
+    :type outDir: String
+    :param numProcesses: number of workers; None: one per CPU
+    :type numProcesses: {int | None}
+    :param maxPagesPerWorker: pages after which a worker is replaced
+    :type maxPagesPerWorker: int
+    :return: page file for each partition key
+    :rtype: {String : String}
+    '''
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    tasks = [(reportSpec, key, partitionFile, outDir) for (key, partitionFile) in partitions.items()]
+    if numProcesses == 1:
+        return dict(map(_makePartitionPage, tasks))
+    pool = multiprocessing.Pool(processes=numProcesses, maxtasksperchild=maxPagesPerWorker)
+    try:
+        pages = dict(pool.imap_unordered(_makePartitionPage, tasks))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return pages
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     description='Make one report page per partition of the data.')
+    parser.add_argument('--spec', required=True,
+                        help="report function as 'module:function'")
+    parser.add_argument('--key',
+                        help='name of the column whose values partition a single CSV file')
+    parser.add_argument('--outDir', required=True,
+                        help='directory for the pages, and for partition files')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes; default: one per CPU')
+    parser.add_argument('--fieldSep', default=',',
+                        help='CSV field separator')
+    parser.add_argument('csvFiles', nargs='+',
+                        help='with --key: one CSV file to partition; else one CSV file per partition, '
+                             'keyed by file name without extension')
+    args = parser.parse_args()
+
+    if args.key is not None:
+        if len(args.csvFiles) != 1:
+            parser.error('--key partitions exactly one CSV file')
+        if not os.path.isdir(args.outDir):
+            os.makedirs(args.outDir)
+        partitions = partitionCSV(args.csvFiles[0], args.key, args.outDir, fieldSep=args.fieldSep)
+    else:
+        partitions = OrderedDict((os.path.splitext(os.path.basename(csvFile))[0], csvFile) for csvFile in args.csvFiles)
+    pages = generateReports(args.spec, partitions, args.outDir, numProcesses=args.processes)
+    for key in partitions:
+        print('%s: %s' % (key, pages[key]))
@@ -0,0 +1,405 @@
+'''
+Created on Oct 16, 2026
+
+Aggregation of x/y/value rows into a bounded grid
+of x-bins by y-bins. Used by Heatmap to keep the number
+of cells it sends to the browser independent of the
+number of input rows. Also the binning and counting
+of raw values for Histogram.
+'''
+import math
+import numbers
+
+import numpy as np
+
+
+# Functions that combine the values falling into one grid cell:
+REDUCERS = ('sum', 'mean', 'max', 'min', 'count')
+
+def chooseBinCounts(numXValues, numYValues, maxCells, keepX=False, keepY=False):
+    '''
+    Given the number of distinct x and y values in the data,
+    return the number of x-bins and y-bins of a grid with at
+    most maxCells cells. An axis with no more values than the
+    side of a square grid of maxCells cells is kept whole, and 
+    the other axis gets the rest of the cells; otherwise both
+    axes are shrunk by the same factor. Axes marked with keepX 
+    or keepY, such as text axes, are always kept whole; the grid
+    may then exceed maxCells. Returns None if the unbinned data 
+    fit into maxCells cells.
+    :param numXValues: number of distinct x values
+    :type numXValues: int
+    :param numYValues: number of distinct y values
+    :type numYValues: int
+    :param maxCells: maximum number of grid cells
+    :type maxCells: int
+    :param keepX: whether x must keep all its values
+    :type keepX: bool
+    :param keepY: whether y must keep all its values
+    :type keepY: bool
+    :rtype: {(int, int) | None}
+    '''
+    numXValues = max(1, numXValues)
+    numYValues = max(1, numYValues)
+    if numXValues * numYValues <= maxCells:
+        return None
+    if keepX and keepY:
+        return (numXValues, numYValues)
+    squareSide = math.sqrt(maxCells)
+    if keepY or (not keepX and numYValues <= min(numXValues, squareSide)):
+        return (max(1, min(numXValues, maxCells // numYValues)), numYValues)
+    if keepX or numXValues <= squareSide:
+        return (numXValues, max(1, min(numYValues, maxCells // numXValues)))
+    shrinkFactor = math.sqrt(float(maxCells) / (numXValues * numYValues))
+    xBins = max(1, min(numXValues, int(numXValues * shrinkFactor)))
+    yBins = max(1, min(numYValues, maxCells // xBins))
+    return (xBins, yBins)
+
+class DistinctCounter(object):
+    '''
+    Counts the distinct values of a numeric column that
+    arrives in chunks. Only up to limit values are remembered;
+    beyond that, count stays at limit + 1.
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.distinct = np.empty(0)
+
+    def update(self, values):
+        '''
+        :param values: one chunk of the column; NaNs are ignored
+        :type values: np.ndarray
+        '''
+        if len(self.distinct) > self.limit:
+            return
+        self.distinct = np.union1d(self.distinct, values[~np.isnan(values)])[:self.limit + 1]
+
+    @property
+    def count(self):
+        return len(self.distinct)
+
+class GridAggregator(object):
+    '''
+    Grid of xBins by yBins equally wide cells over the given
+    x and y ranges. Rows are added in chunks; each cell keeps
+    enough running state for the reducer, so memory use is
+    proportional to the number of cells, not rows.
+    '''
+
+    def __init__(self, xRange, yRange, xBins, yBins, reducer='mean'):
+        '''
+        :param xRange: smallest and largest x value
+        :type xRange: (float, float)
+        :param yRange: smallest and largest y value
+        :type yRange: (float, float)
+        :param xBins: number of bins along x
+        :type xBins: int
+        :param yBins: number of bins along y
+        :type yBins: int
+        :param reducer: one of REDUCERS
+        :type reducer: String
+        '''
+        if reducer not in REDUCERS:
+            raise ValueError('Reducer must be one of %s, not %s' % (', '.join(REDUCERS), str(reducer)))
+        self.reducer = reducer
+        self.xBins = xBins
+        self.yBins = yBins
+        (self.xStart, self.xBinWidth) = self.binGeometry(xRange, xBins)
+        (self.yStart, self.yBinWidth) = self.binGeometry(yRange, yBins)
+        numCells = xBins * yBins
+        # Rows per cell, and rows with a value per cell:
+        self.rowCounts = np.zeros(numCells, dtype=np.int64)
+        self.valueCounts = np.zeros(numCells, dtype=np.int64)
+        if reducer in ('sum', 'mean'):
+            self.accumulator = np.zeros(numCells)
+        elif reducer == 'max':
+            self.accumulator = np.full(numCells, -np.inf)
+        elif reducer == 'min':
+            self.accumulator = np.full(numCells, np.inf)
+        else:
+            self.accumulator = None
+
+    @staticmethod
+    def binGeometry(valueRange, numBins):
+        '''
+        :return: lower edge of the first bin, and bin width
+        :rtype: (float, float)
+        '''
+        (low, high) = valueRange
+        if high <= low:
+            return (low - 0.5, 1.0)
+        return (low, (high - low) / float(numBins))
+
+    def cellIndices(self, x, y):
+        '''
+        :return: flat cell index of each x/y pair
+        :rtype: np.ndarray
+        '''
+        xIndices = np.clip(((x - self.xStart) / self.xBinWidth).astype(np.int64), 0, self.xBins - 1)
+        yIndices = np.clip(((y - self.yStart) / self.yBinWidth).astype(np.int64), 0, self.yBins - 1)
+        return xIndices * self.yBins + yIndices
+
+    def update(self, x, y, values):
+        '''
+        Add one chunk of rows. x and y must not be NaN;
+        NaN values count as rows without a value.
+        :param x: x of each row
+        :type x: np.ndarray
+        :param y: y of each row
+        :type y: np.ndarray
+        :param values: value of each row
+        :type values: np.ndarray
+        '''
+        cells = self.cellIndices(x, y)
+        numCells = len(self.rowCounts)
+        self.rowCounts += np.bincount(cells, minlength=numCells)
+        hasValue = ~np.isnan(values)
+        cells = cells[hasValue]
+        values = values[hasValue]
+        self.valueCounts += np.bincount(cells, minlength=numCells)
+        if self.reducer in ('sum', 'mean'):
+            self.accumulator += np.bincount(cells, weights=values, minlength=numCells)
+        elif self.reducer == 'max':
+            np.maximum.at(self.accumulator, cells, values)
+        elif self.reducer == 'min':
+            np.minimum.at(self.accumulator, cells, values)
+
+    def cells(self):
+        '''
+        Return the center x and y, and the reduced value, of each
+        cell that received at least one row. Cells whose rows have
+        no value have value NaN, except for the count reducer.
+        :rtype: (np.ndarray, np.ndarray, np.ndarray)
+        '''
+        occupied = np.flatnonzero(self.rowCounts)
+        xCenters = self.xStart + (occupied // self.yBins + 0.5) * self.xBinWidth
+        yCenters = self.yStart + (occupied % self.yBins + 0.5) * self.yBinWidth
+        if self.reducer == 'count':
+            return (xCenters, yCenters, self.rowCounts[occupied].astype(np.float64))
+        valueCounts = self.valueCounts[occupied]
+        values = self.accumulator[occupied].copy()
+        if self.reducer == 'mean':
+            values /= np.maximum(valueCounts, 1)
+        values[valueCounts == 0] = np.nan
+        return (xCenters, yCenters, values)
+
+    def extend(self, xRange, yRange):
+        '''
+        Add bins of the current width at either end of x
+        and y, such that the grid covers the given ranges.
+        The existing bins, and their contents, stay as they are.
+        :param xRange: smallest and largest x value
+        :type xRange: (float, float)
+        :param yRange: smallest and largest y value
+        :type yRange: (float, float)
+        '''
+        padding = []
+        for ((low, high), start, binWidth, numBins) in ((xRange, self.xStart, self.xBinWidth, self.xBins),
+                                                        (yRange, self.yStart, self.yBinWidth, self.yBins)):
+            # Values on the upper edge of the last bin are in that bin:
+            binsBefore = max(0, int(math.ceil((start - low) / binWidth - 1e-9)))
+            binsAfter = max(0, int(math.ceil((high - start) / binWidth - 1e-9)) - numBins)
+            padding.append((binsBefore, binsAfter))
+        if padding == [(0, 0), (0, 0)]:
+            return
+        self.reshapeCells(lambda cells, fillValue: np.pad(cells, padding, mode='constant', constant_values=fillValue))
+        self.xStart -= padding[0][0] * self.xBinWidth
+        self.yStart -= padding[1][0] * self.yBinWidth
+        self.xBins += sum(padding[0])
+        self.yBins += sum(padding[1])
+
+    def coarsen(self, xFactor, yFactor):
+        '''
+        Merge each xFactor by yFactor adjacent cells, counted
+        from the first bin, into one. Cells keep the state of
+        the reducer, so the merged cells are those that all their
+        rows would have gone into.
+        :param xFactor: number of x-bins per merged bin
+        :type xFactor: int
+        :param yFactor: number of y-bins per merged bin
+        :type yFactor: int
+        '''
+        if xFactor == 1 and yFactor == 1:
+            return
+        (xBins, yBins) = (-(-self.xBins // xFactor), -(-self.yBins // yFactor))
+        padding = [(0, xBins * xFactor - self.xBins), (0, yBins * yFactor - self.yBins)]
+        def merged(cells, fillValue):
+            blocks = np.pad(cells, padding, mode='constant', constant_values=fillValue)
+            blocks = blocks.reshape(xBins, xFactor, yBins, yFactor)
+            if fillValue == -np.inf:
+                return blocks.max(axis=(1, 3))
+            if fillValue == np.inf:
+                return blocks.min(axis=(1, 3))
+            return blocks.sum(axis=(1, 3))
+        self.reshapeCells(merged)
+        (self.xBins, self.yBins) = (xBins, yBins)
+        self.xBinWidth *= xFactor
+        self.yBinWidth *= yFactor
+
+    def reshapeCells(self, reshape):
+        '''
+        Replace the cell arrays by reshape(cells, fillValue),
+        applied to each as an xBins by yBins array. fillValue
+        is the content of a cell without rows.
+        '''
+        shape = (self.xBins, self.yBins)
+        self.rowCounts = reshape(self.rowCounts.reshape(shape), 0).reshape(-1)
+        self.valueCounts = reshape(self.valueCounts.reshape(shape), 0).reshape(-1)
+        if self.accumulator is not None:
+            fillValue = {'max' : -np.inf, 'min' : np.inf}.get(self.reducer, 0.0)
+            self.accumulator = reshape(self.accumulator.reshape(shape), fillValue).reshape(-1)
+
+# ------------------------------ Histograms ------------------------
+
+# Upper limit on the number of bins the 'fd' and 'discrete'
+# rules, and a binWidth, may produce, so that a few outliers
+# cannot blow up the chart:
+MAX_HISTOGRAM_BINS = 1000
+
+# Number of values kept to estimate the interquartile range
+# of streamed data:
+QUANTILE_SAMPLE_SIZE = 100000
+
+# Default seed of ValueSample, so that the same data get the
+# same sample, and thus the same histogram bins, on every run:
+SAMPLE_SEED = 0
+
+def histogramEdges(low, high, bins='fd', binWidth=None, iqr=None, numValues=None):
+    '''
+    Return the bin edges for values between low and high.
+    
+    bins is one of:
+        - an int: that many equally wide bins
+        - a sequence of edges: taken as they are
+        - 'fd': the Freedman-Diaconis rule; bins of width 
+          2 * iqr / numValues ** (1/3)
+        - 'discrete': one bin per integer, centered on it
+    binWidth, if given, overrides bins with bins of that width,
+    starting at low.
+    :param low: smallest value
+    :type low: float
+    :param high: largest value
+    :type high: float
+    :param bins: binning rule
+    :type bins: {int | [float] | np.ndarray | String}
+    :param binWidth: width of each bin
+    :type binWidth: {float | None}
+    :param iqr: interquartile range of the values; needed for 'fd'
+    :type iqr: {float | None}
+    :param numValues: number of values; needed for 'fd'
+    :type numValues: {int | None}
+    :rtype: np.ndarray
+    '''
+    if binWidth is not None:
+        numBins = max(1, int(math.ceil((high - low) / float(binWidth))))
+        if low + numBins * binWidth <= high:
+            numBins += 1
+        if numBins > MAX_HISTOGRAM_BINS:
+            raise ValueError('Too many bins of width %g for a histogram: %d' % (binWidth, numBins))
+        return low + np.arange(numBins + 1) * float(binWidth)
+    if isinstance(bins, str):
+        if bins == 'discrete':
+            (low, high) = (math.floor(low), math.floor(high))
+            if high - low + 1 > MAX_HISTOGRAM_BINS:
+                raise ValueError('Too many distinct integers for a discrete histogram: %d' % (high - low + 1))
+            return np.arange(low, high + 2) - 0.5
+        if bins != 'fd':
+            raise ValueError("Histogram bins must be an int, a list of edges, 'fd', or 'discrete', not %s" % bins)
+        fdWidth = 2.0 * iqr / numValues ** (1.0 / 3) if numValues else 0
+        if fdWidth <= 0 or high <= low:
+            bins = 1
+        else:
+            bins = min(MAX_HISTOGRAM_BINS, int(math.ceil((high - low) / fdWidth)))
+    if isinstance(bins, numbers.Integral):
+        bins = int(bins)
+        if high <= low:
+            (low, high) = (low - 0.5, high + 0.5)
+        return np.linspace(low, high, bins + 1)
+    return np.asarray(bins, dtype=np.float64)
+
+def histogramLabels(edges):
+    '''
+    Return an x axis label for each bin: the integer for
+    bins made by the 'discrete' rule, else 'low - high'.
+    :param edges: bin edges
+    :type edges: np.ndarray
+    :rtype: [String]
+    '''
+    centers = (edges[:-1] + edges[1:]) / 2.0
+    if np.all(np.diff(edges) == 1) and np.all(centers == np.round(centers)):
+        return ['%d' % center for center in centers]
+    return ['%g - %g' % (low, high) for (low, high) in zip(edges[:-1].tolist(), edges[1:].tolist())]
+
+class HistogramCounter(object):
+    '''
+    Counts values that arrive in chunks into fixed bins.
+    Values outside the edges, and NaNs, are not counted.
+    Like np.histogram, the last bin includes its upper edge.
+    '''
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        widths = np.diff(self.edges)
+        self.equalWidths = np.allclose(widths, widths[0])
+
+    def update(self, values):
+        '''
+        :param values: one chunk of values
+        :type values: np.ndarray
+        '''
+        values = values[~np.isnan(values)]
+        if self.equalWidths:
+            # With a range instead of edges NumPy computes
+            # the bin of each value rather than searching for it:
+            self.counts += np.histogram(values, bins=len(self.counts), range=(self.edges[0], self.edges[-1]))[0]
+        else:
+            self.counts += np.histogram(values, bins=self.edges)[0]
+
+class ValueSample(object):
+    '''
+    Uniform random sample of at most sampleSize values from
+    a column that arrives in chunks, together with the column's
+    count and extrema. Each value gets a random key; the values
+    with the smallest keys form the sample. The keys come from
+    a generator with a fixed seed; pass seed=None for a
+    different sample on each run.
+    '''
+
+    def __init__(self, sampleSize=QUANTILE_SAMPLE_SIZE, seed=SAMPLE_SEED):
+        self.sampleSize = sampleSize
+        self.random = np.random.default_rng(seed)
+        self.values = np.empty(0)
+        self.keys = np.empty(0)
+        self.numValues = 0
+        self.low = None
+        self.high = None
+
+    def update(self, values):
+        '''
+        :param values: one chunk of the column; NaNs are ignored
+        :type values: np.ndarray
+        '''
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.numValues += len(values)
+        (chunkLow, chunkHigh) = (float(values.min()), float(values.max()))
+        self.low = chunkLow if self.low is None else min(self.low, chunkLow)
+        self.high = chunkHigh if self.high is None else max(self.high, chunkHigh)
+        self.values = np.concatenate((self.values, values))
+        self.keys = np.concatenate((self.keys, self.random.random(len(values))))
+        if len(self.values) > self.sampleSize:
+            kept = np.argpartition(self.keys, self.sampleSize)[:self.sampleSize]
+            (self.values, self.keys) = (self.values[kept], self.keys[kept])
+
+    def iqr(self):
+        '''
+        :return: interquartile range of the sample
+        :rtype: float
+        '''
+        if len(self.values) == 0:
+            return 0.0
+        (q1, q3) = np.percentile(self.values, [25, 75])
+        return float(q3 - q1)
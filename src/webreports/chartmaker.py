@@ -5,12 +5,32 @@ Created on May 8, 2014
 '''
 from __future__ import print_function
 
-from collections import MutableMapping
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+import array
+import base64
+import calendar
 import datetime
+import gzip
+import hashlib
+from itertools import islice
+import json
+import numbers
 import os
+import re
 import sys
 
-import dateutil.parser
+import numpy as np
+
+from binning import REDUCERS, DistinctCounter, GridAggregator, HistogramCounter, ValueSample, \
+    chooseBinCounts, histogramEdges, histogramLabels
+from columns import ColumnKind, XYZStatistics, iterRowChunks, parseColumn, parseXYZColumns, splitColumns
+from sketches import SpaceSaving
+from dateparsing import looksLikeDate, parseDatetime, toUTC
+from downsampling import lttbIndices
+from heatmapstate import HeatmapState
 
 
 class ChartTypes:
@@ -22,6 +42,17 @@ class DataCategory:
     CATEGORICAL = 0
     CONTINUOUS  = 1
 
+class AssetMode:
+    # <script> tags that reference the vendored Highcharts
+    # files under HIGHCHARTS_URL, and jQuery under JQUERY_URL:
+    LINK   = 'link'
+    # The Highcharts files a page needs, inlined into the
+    # page as one script; works without network access:
+    INLINE = 'inline'
+    # Like INLINE, but the script is copied into a file next
+    # to the page, where browsers can cache it for all pages:
+    COPY   = 'copy'
+
 class ChartMaker(object):
     '''
     An abstract superclass of all
@@ -33,17 +64,23 @@ class ChartMaker(object):
     TICKWITH=2      # px width of main tickmarks
     TICKLENGTH = 10
     
+    # Constructor parameters that may name data files; a
+    # RenderCache keys charts on the content of these files:
+    FILE_PARAMETERS = ()
+    
     
-    # Opening of complete HTML document
-    # Includes start of <head>, up to 
-    # just before the function def(s):
+    # Opening of complete HTML document,
+    # up to the scripts in <head>:
     HTML_HEADER = "<!DOCTYPE HTML>\n" +\
                   " <head>\n" +\
                   '     <meta http-equiv="Content-Type" content="text/HTML; charset=utf-8">\n' +\
                   "     <title>OpenEdx Chart</title>\n" +\
-                  "\n" +\
-                  '     <script type="text/javascript" src="http://ajax.googleapis.com/ajax/libs/jquery/1.8.2/jquery.min.js"></script>\n' +\
-                  '     <script type="text/javascript">\n'
+                  "\n"
+    # Reference to a script file in <head>; the %s is its URL:
+    HEAD_SCRIPT_TAG = '     <script type="text/javascript" src="%s"></script>\n'
+    # Start of the script in <head> that holds the 
+    # chart function defs:
+    HEAD_SCRIPT_START = '     <script type="text/javascript">\n'
     # Beginning of a function def inside <head>.
     # The %s is used in in each instantiation
     # of a chart making subclass to provide a name
@@ -53,79 +90,399 @@ class ChartMaker(object):
     CHART_FUNC_HEADER = " $(function () {\n" +\
                         "     $('#%s').highcharts({\n"
 
-    CHART_FUNC_HEADER_HEATMAP = "$('#%s').highcharts({\n"
-
     # Closing one chart function definition;
     # common to all definitions: 
     CHART_FUNC_FOOTER = "});});"
-    CURR_DIR  = os.path.dirname(__file__)
+
+    # Chart function of a chart whose data are in a
+    # sidecar file: starts loading the file right away, 
+    # and makes the chart once both the data and the 
+    # page are there. Filled in by getChartFuncSource():
+    SIDECAR_FUNC_HEADER = " WebReports.whenData(%s, %s, function () {\n" +\
+                          " $(function () {\n" +\
+                          "     $('#%s').highcharts({\n"
+    SIDECAR_FUNC_FOOTER = "});});});"
+    # Chart functions of lazy charts, which are made only
+    # once their <div> comes near the viewport; the sidecar of
+    # a lazy chart is loaded then, too. Closed by CHART_FUNC_FOOTER
+    # and SIDECAR_FUNC_FOOTER, respectively:
+    LAZY_FUNC_HEADER = " WebReports.whenVisible(%s, function () {\n" +\
+                       "     $('#%s').highcharts({\n"
+    LAZY_SIDECAR_FUNC_HEADER = " WebReports.whenVisible(%s, function () {\n" +\
+                               " WebReports.whenData(%s, %s, function () {\n" +\
+                               "     $('#%s').highcharts({\n"
+    # Directory with our JavaScript files, independent
+    # of the current working directory:
+    JS_DIR    = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'js'))
+
+    # Where pages made with AssetMode.LINK get jQuery and the
+    # vendored Highcharts files from. Set HIGHCHARTS_URL to 
+    # wherever src/js/highcharts is served when pages are
+    # served from a web server:
+    JQUERY_URL     = 'http://ajax.googleapis.com/ajax/libs/jquery/1.8.2/jquery.min.js'
+    HIGHCHARTS_URL = os.path.join(JS_DIR, 'highcharts')
+    # Highcharts files, relative to the highcharts directory, 
+    # in the order in which they must be loaded. Each chart
+    # lists the ones it needs in highchartsModules:
+    HIGHCHARTS_FILES = ['highcharts.js',
+                        'modules/data.js',
+                        'modules/exporting.js',
+                        'modules/heatmap.js']
+    # Used instead of jQuery by pages whose scripts are inlined
+    # or bundled, so that they load without network access:
+    STANDALONE_FILES = ['highcharts/adapters/standalone-framework.js', 
+                        'jqueryShim.js']
 
     # End of a complete definition of chart 
-    # functions in <head> section, plus 
-    # ref to required Highchart files: 
+    # functions in <head> section; with AssetMode.LINK
+    # followed by a HIGHCHARTS_SCRIPT_TAG for each
+    # Highcharts file the page needs:
     HTML_END_FUNC_DEFS = "      </script>" +\
                        "   </head>" +\
-                       "   <body>" +\
-                       '<script src="%s/../js/highcharts/highcharts.js"></script>' % CURR_DIR +\
-                       '<script src="%s/../js/highcharts/modules/data.js"></script>' % CURR_DIR +\
-                       '<script src="%s/../js/highcharts/modules/exporting.js"></script>' % CURR_DIR +\
-                       '<script src="%s/../js/highcharts/modules/heatmap.js"></script>' % CURR_DIR +\
-                       '<script src="%s/../js/highcharts/modules/exporting.js"></script>'
+                       "   <body>"
+    HIGHCHARTS_SCRIPT_TAG = '<script src="%s"></script>'
 
     # A <div> in the <body> that contains a chart.
     # The %s is used to reference the chart object
     # that is to be included (i.e. a chart function definition
     # in <head> section):
     CHART_DIV   = '<div id="%s" style="min-width: 310px; height: 400px; margin: 0 auto"></div>'
-    CHART_DIV_HEATMAP = '<div id="%s" style="height: 320px; width: 1000px; margin: 0 auto"></div>' +\
-                        '<pre id="csv" style="display: none">'
+    CHART_DIV_HEATMAP = '<div id="%s" style="height: 320px; width: 1000px; margin: 0 auto"></div>'
+    # Heatmap data, either as CSV text, or as pre-parsed
+    # columns (see webreportsData.js). The %s is the 
+    # chart name:
+    HEATMAP_CSV_START = '<pre id="%s_csv" style="display: none">'
+    HEATMAP_PAYLOAD_START = '<script type="application/json" id="%s_data">'
+    HEATMAP_PAYLOAD_END   = '</script>\n'
     
     HTML_END    =  "   </body></html>"
 
     CHART_NAME_INDEX = 0
 
+    # Option subtrees that at least SHARE_MIN_CHARTS charts on
+    # a page have in common, and whose source is at least
+    # SHARE_MIN_LENGTH characters long, go into the page only
+    # once, in the array SHARED_OPTIONS_VAR; see SharedOptions:
+    SHARE_MIN_CHARTS = 2
+    SHARE_MIN_LENGTH = 32
+    SHARED_OPTIONS_VAR = 'WR_SHARED'
+
+    # Source of JavaScript files that are inlined into
+    # pages, such as the heatmap plugin. Filled on first
+    # use, and shared by all charts in the process:
+    SCRIPT_SOURCE_CACHE = {}
+
+    # Number of heatmap data lines that are joined
+    # into a single chunk when a page is streamed:
+    STREAM_ROWS_PER_CHUNK = 1000
+    # Number of rows per chunk of pre-parsed column data:
+    PAYLOAD_ROWS_PER_CHUNK = 100000
+    # Number of rows read and parsed at a time when 
+    # charts stream their input files:
+    INGEST_ROWS_PER_CHUNK = 100000
+    # Int32 that stands for 'no value' in integer columns:
+    INT32_NULL = -2**31
 
     # -------------------------------------- Superclass for All Chart Classes ----------------------------
     @classmethod
-    def makeWebPage(cls, chartObjArr):
+    def makeWebPage(cls, chartObjArr, assets=AssetMode.LINK, lazy=False):
         '''
         Class method that creates a renderable
         HTML page, given an array of chart instances,
-        i.e. of ChartMaker subclasses:
+        i.e. of ChartMaker subclasses. The whole page
+        is built in memory; for large pages see writeWebPage()
+        and iterWebPage().
+        :param cls: ChartMaker class object
+        :type cls: ChartMaker
+        :param chartObjArr: array of previously created chart objects. 
+            Individual chart object works as well. 
+        :type chartObjArr: {[Subclasses of ChartMaker] | Subclasses of ChartMaker}
+        :param assets: how the page gets the Highcharts files; see iterWebPage()
+        :type assets: String
+        :param lazy: whether charts are made only when scrolled into view; see iterWebPage()
+        :type lazy: bool
+        :return: complete HTML page
+        :rtype: String
+        '''
+        return ''.join(cls.iterWebPage(chartObjArr, assets=assets, lazy=lazy))
+
+    @classmethod
+    def writeWebPage(cls, fileObj, chartObjArr, assets=AssetMode.LINK, lazy=False):
+        '''
+        Write a renderable HTML page for the given charts
+        to fileObj chunk by chunk, without ever holding the
+        complete page in memory. fileObj may be anything with
+        a write() method, or a socket (anything with sendall()),
+        to which the page is sent UTF-8 encoded.
+        :param fileObj: destination of the page
+        :type fileObj: {file-like | socket}
+        :param chartObjArr: array of previously created chart objects. 
+            Individual chart object works as well. 
+        :type chartObjArr: {[Subclasses of ChartMaker] | Subclasses of ChartMaker}
+        :param assets: how the page gets the Highcharts files; see iterWebPage()
+        :type assets: String
+        :param lazy: whether charts are made only when scrolled into view; see iterWebPage()
+        :type lazy: bool
+        '''
+        try:
+            write = fileObj.write
+        except AttributeError:
+            write = lambda chunk: fileObj.sendall(chunk.encode('utf-8'))
+        for chunk in cls.iterWebPage(chartObjArr, assets=assets, lazy=lazy):
+            write(chunk)
+
+    @classmethod
+    def writeWebPageWithSidecars(cls, htmlFileName, chartObjArr, compress=True, assets=AssetMode.LINK, lazy=False):
+        '''
+        Write a page to htmlFileName, with each chart's data
+        in a sidecar file next to it, rather than inline. Sidecars
+        are named after the page and the chart, as in 
+        report.chart0.js, and are loaded asynchronously by the page.
+        Browsers can therefore cache the data apart from the page, 
+        and the page itself stays small. With compress=True, each
+        sidecar also gets a gzip compressed variant, report.chart0.js.gz,
+        for static servers that serve precompressed files (e.g. nginx
+        gzip_static). Everything works from a local directory as well.
+        Charts without data of their own, such as cached charts,
+        stay inline.
+        :param htmlFileName: path of the page
+        :type htmlFileName: String
+        :param chartObjArr: array of previously created chart objects. 
+            Individual chart object works as well. 
+        :type chartObjArr: {[Subclasses of ChartMaker] | Subclasses of ChartMaker}
+        :param compress: whether to also write .gz variants of the sidecars
+        :type compress: bool
+        :param assets: how the page gets the Highcharts files; see iterWebPage().
+            With AssetMode.COPY the bundle goes next to the page.
+        :type assets: String
+        :param lazy: whether charts are made, and their sidecars loaded, 
+            only when scrolled into view; see iterWebPage()
+        :type lazy: bool
+        :return: paths of all files written, the page first
+        :rtype: [String]
+        '''
+        if not isinstance(chartObjArr, list):
+            chartObjArr = [chartObjArr]
+        pageBase = os.path.splitext(htmlFileName)[0]
+        filesWritten = [htmlFileName]
+        # Charts go back to inline data once the page is written:
+        oldModes = [(chartObj.sidecarSrc, list(chartObj.scriptDependencies)) for chartObj in chartObjArr]
+        try:
+            for chartObj in chartObjArr:
+                if not chartObj.hasSidecarData():
+                    continue
+                sidecarFileName = '%s.%s.js' % (pageBase, chartObj.getInternalName())
+                chartObj.setSidecar(os.path.basename(sidecarFileName))
+                outFiles = [open(sidecarFileName, 'wb')]
+                if compress:
+                    # No timestamp, so that unchanged data give identical files:
+                    outFiles.append(gzip.GzipFile(sidecarFileName + '.gz', 'wb', mtime=0))
+                try:
+                    for chunk in chartObj.iterSidecarSource():
+                        encodedChunk = chunk.encode('utf-8')
+                        for outFile in outFiles:
+                            outFile.write(encodedChunk)
+                finally:
+                    for outFile in outFiles:
+                        outFile.close()
+                filesWritten.append(sidecarFileName)
+                if compress:
+                    filesWritten.append(sidecarFileName + '.gz')
+            if assets == AssetMode.COPY:
+                bundleFileName = cls.writeAssetBundle(os.path.dirname(htmlFileName), chartObjArr)
+                filesWritten.append(bundleFileName)
+                assets = os.path.basename(bundleFileName)
+            with open(htmlFileName, 'w') as fd:
+                cls.writeWebPage(fd, chartObjArr, assets=assets, lazy=lazy)
+        finally:
+            for (chartObj, (sidecarSrc, scriptDependencies)) in zip(chartObjArr, oldModes):
+                chartObj.sidecarSrc = sidecarSrc
+                chartObj.scriptDependencies = scriptDependencies
+        return filesWritten
+
+    @classmethod
+    def writeAssetBundle(cls, outDir, chartObjArr):
+        '''
+        Write the script that AssetMode.COPY pages of the given
+        charts load: the Highcharts files they need, in one file.
+        The file is named after a hash of its content, so pages
+        with the same needs share one file, and browsers never 
+        use a stale copy. An existing file is not written again.
+        :param outDir: directory for the bundle
+        :type outDir: String
+        :param chartObjArr: the charts on the page(s) that use the bundle
+        :type chartObjArr: {[Subclasses of ChartMaker] | Subclasses of ChartMaker}
+        :return: path of the bundle
+        :rtype: String
+        '''
+        if not isinstance(chartObjArr, list):
+            chartObjArr = [chartObjArr]
+        bundle = cls.getAssetBundle(chartObjArr)
+        bundleFileName = os.path.join(outDir, 'webreports-%s.js' % hashlib.sha1(bundle.encode('utf-8')).hexdigest()[:12])
+        if not os.path.exists(bundleFileName):
+            with open(bundleFileName, 'w') as fd:
+                fd.write(bundle)
+        return bundleFileName
+
+    @classmethod
+    def getAssetBundle(cls, chartObjArr):
+        '''
+        Return the Highcharts files the given charts need, with 
+        the standalone adapter in place of jQuery, as one script.
+        :param chartObjArr: the charts on one page
+        :type chartObjArr: [Subclasses of ChartMaker]
+        :rtype: String
+        '''
+        scriptFileNames = ChartMaker.STANDALONE_FILES +\
+                          ['highcharts/' + fileName for fileName in cls.getPageHighchartsFiles(chartObjArr)]
+        return ';\n'.join(cls.getScriptSource(scriptFileName) for scriptFileName in scriptFileNames) + ';\n'
+
+    @classmethod
+    def iterWebPage(cls, chartObjArr, assets=AssetMode.LINK, lazy=False):
+        '''
+        Generator that yields a renderable HTML page for
+        the given charts as a sequence of string chunks.
+        Concatenated, the chunks are identical to the result
+        of makeWebPage(). Heatmap data are yielded in chunks of
+        STREAM_ROWS_PER_CHUNK lines, so memory use does not grow
+        with the size of the page.
+        
+        The page loads only the Highcharts modules its charts
+        need, each once. assets is one of:
+            - AssetMode.LINK: <script> tags referencing jQuery and
+              the Highcharts files under JQUERY_URL and HIGHCHARTS_URL
+            - AssetMode.INLINE: the minified Highcharts files, and
+              the standalone adapter instead of jQuery, inlined
+              into the page; the page needs no network access
+            - the URL of a bundle written by writeAssetBundle()
+              (writeWebPageWithSidecars() does this for AssetMode.COPY)
+        
+        With lazy=True, each chart is made only when its <div> comes
+        near the viewport, rather than all charts when the page is 
+        loaded. Pages with many charts then become usable as fast
+        as pages with few.
         :param cls: ChartMaker class object
         :type cls: ChartMaker
         :param chartObjArr: array of previously created chart objects. 
             Individual chart object works as well. 
         :type chartObjArr: {[Subclasses of ChartMaker] | Subclasses of ChartMaker}
+        :param assets: how the page gets the Highcharts files
+        :type assets: String
+        :param lazy: whether charts are made only when scrolled into view
+        :type lazy: bool
+        :return: successive pieces of the HTML page
+        :rtype: Generator(String)
         '''
         
         if not isinstance(chartObjArr, list):
             chartObjArr = [chartObjArr]
+        if assets == AssetMode.COPY:
+            raise ValueError('AssetMode.COPY needs a directory for the bundle; '
+                             'see writeAssetBundle() and writeWebPageWithSidecars()')
         
         # HTML up to chart function defs in <head>:
-        html = ChartMaker.HTML_HEADER
-        # Add each chart function definition:
+        yield ChartMaker.HTML_HEADER
+        if assets == AssetMode.LINK:
+            yield ChartMaker.HEAD_SCRIPT_TAG % ChartMaker.JQUERY_URL
+        elif assets == AssetMode.INLINE:
+            yield ChartMaker.HEAD_SCRIPT_START
+            yield cls.getAssetBundle(chartObjArr)
+            yield '     </script>\n'
+        else:
+            yield ChartMaker.HEAD_SCRIPT_TAG % assets
+        yield ChartMaker.HEAD_SCRIPT_START
+        # Scripts shared by several charts, such as
+        # the heatmap plugin, go in only once:
+        scriptFileNames = cls.getPageScriptDependencies(chartObjArr)
+        if lazy and 'webreportsData.js' not in scriptFileNames:
+            scriptFileNames.append('webreportsData.js')
+        for scriptFileName in scriptFileNames:
+            yield cls.getScriptSource(scriptFileName)
+        # Add each chart function definition. The chart
+        # functions run once the page is loaded, so the shared
+        # option subtrees they use may be defined after them:
+        sharedOptions = None
+        if len(chartObjArr) >= ChartMaker.SHARE_MIN_CHARTS:
+            sharedOptions = SharedOptions(chartObjArr, ChartMaker.SHARE_MIN_CHARTS, ChartMaker.SHARE_MIN_LENGTH)
         for chartObj in chartObjArr:
-            html += chartObj.getChartFuncSource()
+            yield chartObj.getChartFuncSource(sharedOptions, lazy=lazy)
+        if sharedOptions is not None and len(sharedOptions.used) > 0:
+            yield sharedOptions.declaration()
         # Close out the <head> section, finishing
         # chart function defs, and reference Highchart
         # files:
-        html += ChartMaker.HTML_END_FUNC_DEFS
+        yield ChartMaker.HTML_END_FUNC_DEFS
+        if assets == AssetMode.LINK:
+            for fileName in cls.getPageHighchartsFiles(chartObjArr):
+                yield ChartMaker.HIGHCHARTS_SCRIPT_TAG % (ChartMaker.HIGHCHARTS_URL + '/' + fileName)
 
         # Create one <div> section for each chart:
         for chartObj in chartObjArr:
-            if chartObj.chartType == 'heatmap':
-                # Add the data inline in a <pre>
-                html += ChartMaker.CHART_DIV_HEATMAP % chartObj.getInternalName()
-                # The [1:=1] snips the array brackets around the data:
-                html += '\n'.join(line for line in chartObj.heatmapData)
-                #****html += str(chartObj.heatmapData)[1:-1]
-                html += '\n</pre>\n'
-            else: 
-                html += ChartMaker.CHART_DIV % chartObj.getInternalName()
-        html += ChartMaker.HTML_END
-
-        return html
+            for chunk in chartObj.iterDivSource():
+                yield chunk
+        yield ChartMaker.HTML_END
+
+    @classmethod
+    def getPageScriptDependencies(cls, chartObjArr):
+        '''
+        Return the names of the scripts in JS_DIR that the 
+        given charts need inlined into their page. Each name
+        is listed once, in order of first need.
+        :param chartObjArr: the charts on one page
+        :type chartObjArr: [Subclasses of ChartMaker]
+        :return: file names relative to JS_DIR
+        :rtype: [String]
+        '''
+        dependencies = []
+        for chartObj in chartObjArr:
+            for scriptFileName in chartObj.scriptDependencies:
+                if scriptFileName not in dependencies:
+                    dependencies.append(scriptFileName)
+        return dependencies
+
+    @classmethod
+    def getPageHighchartsFiles(cls, chartObjArr):
+        '''
+        Return the Highcharts files that the given charts
+        need: highcharts.js, and the modules their chart types
+        use, each once, in the order of HIGHCHARTS_FILES.
+        :param chartObjArr: the charts on one page
+        :type chartObjArr: [Subclasses of ChartMaker]
+        :return: file names relative to the highcharts directory
+        :rtype: [String]
+        '''
+        needed = set(['highcharts.js'])
+        for chartObj in chartObjArr:
+            needed.update(chartObj.highchartsModules)
+        return [fileName for fileName in ChartMaker.HIGHCHARTS_FILES if fileName in needed]
+
+    @classmethod
+    def getScriptSource(cls, scriptFileName):
+        '''
+        Return the source of a JavaScript file in JS_DIR. 
+        Each file is read from disk only once per process.
+        :param scriptFileName: file name relative to JS_DIR
+        :type scriptFileName: String
+        :return: the script's source
+        :rtype: String
+        '''
+        try:
+            return ChartMaker.SCRIPT_SOURCE_CACHE[scriptFileName]
+        except KeyError:
+            with open(os.path.join(ChartMaker.JS_DIR, scriptFileName), 'r') as fd:
+                scriptSource = fd.read()
+            ChartMaker.SCRIPT_SOURCE_CACHE[scriptFileName] = scriptSource
+            return scriptSource
+
+    @classmethod
+    def resetChartNameIndex(cls):
+        '''
+        Make the next chart created in this process chart0.
+        Call before creating the charts of a page to get the
+        same chart names no matter how many pages the process
+        made before.
+        '''
+        ChartMaker.CHART_NAME_INDEX = 0
 
     def __init__(self, chartType=None):
         '''
@@ -133,27 +490,198 @@ class ChartMaker(object):
         '''
         self.internalChartName = 'chart%d' % ChartMaker.CHART_NAME_INDEX
         ChartMaker.CHART_NAME_INDEX += 1
+        self.thisChartFuncHeader = ChartMaker.CHART_FUNC_HEADER % self.internalChartName
+        # Files in JS_DIR to inline once into
+        # each page that contains this chart:
         if chartType is None:
-            self.thisChartFuncHeader = ChartMaker.CHART_FUNC_HEADER % self.internalChartName
+            self.scriptDependencies = []
         elif chartType == 'heatmap':
-            # need a number of inline functions.
-            # Grab them from file:
-            with open('../js/heatmapHighchartsPlugin.js', 'r') as fd:
-                self.thisChartFuncHeader = ''.join(line for line in fd)
-            # Add the 
-            self.thisChartFuncHeader += ChartMaker.CHART_FUNC_HEADER_HEATMAP % self.internalChartName
+            # need a number of inline functions:
+            self.scriptDependencies = ['heatmapHighchartsPlugin.js']
         else:
             raise ValueError('Unknown chart type: %s' % str(chartType))  
+        # Highcharts modules this chart needs, as
+        # listed in HIGHCHARTS_FILES:
+        self.highchartsModules = ['modules/exporting.js']
+        if chartType == 'heatmap':
+            self.highchartsModules.append('modules/heatmap.js')
         
-        self.funcDef = self.thisChartFuncHeader
+        # The chart's Highcharts options. Chart classes fill
+        # this tree with dicts, lists, and plain Python values;
+        # JavaScript expressions are wrapped in JsRaw. The tree
+        # is turned into JavaScript in one pass when the chart
+        # function source is requested:
+        self.options = {}
+        # Page-relative URL of the file with this chart's
+        # data, if they are not inline; see setSidecar():
+        self.sidecarSrc = None
 
-    def getChartFuncSource(self):
+    @property
+    def funcDef(self):
+        '''
+        The chart function body built so far: the function
+        header, followed by the serialized option tree.
+        
+        Subclasses written when this was a plain string may
+        still assign to it. Text appended to the current body,
+        as with +=, is add()ed, and text cut from the end of
+        add()ed substrings is backtrack()ed. Any other text 
+        replaces the options: after the function header, it 
+        becomes one run of add()ed source; without the header, 
+        it becomes the header.
+        :rtype: String
+        '''
+        return self.thisChartFuncHeader + self.toJavaScript(self.options, members=True)
+
+    @funcDef.setter
+    def funcDef(self, funcDef):
+        currentFuncDef = self.funcDef
+        if funcDef.startswith(currentFuncDef):
+            if len(funcDef) > len(currentFuncDef):
+                self.add(funcDef[len(currentFuncDef):])
+            return
+        lastKey = next(reversed(self.options), None)
+        numCutChars = len(currentFuncDef) - len(funcDef)
+        if currentFuncDef.startswith(funcDef) and isinstance(lastKey, JsFragment) and \
+           numCutChars <= len(''.join(self.options[lastKey])):
+            self.backtrack(numCutChars)
+            return
+        self.options = {}
+        if funcDef.startswith(self.thisChartFuncHeader):
+            self.add(funcDef[len(self.thisChartFuncHeader):])
+        else:
+            self.thisChartFuncHeader = funcDef
+
+    def getChartFuncSource(self, sharedOptions=None, lazy=False):
         '''
         Return a fully formed chart function.
+        :param sharedOptions: option subtrees shared by the charts on 
+            the page, which the function refers to rather than repeats
+        :type sharedOptions: {SharedOptions | None}
+        :param lazy: whether the chart is made only when scrolled into view
+        :type lazy: bool
         :return: Highcharts chart function
         :rtype: String 
         '''
-        return self.funcDef + ChartMaker.CHART_FUNC_FOOTER
+        if self.sidecarSrc is None and sharedOptions is None and not lazy:
+            return self.funcDef + ChartMaker.CHART_FUNC_FOOTER
+        optionTree = self.getOptionTree()
+        if sharedOptions is not None:
+            optionTree = sharedOptions.substitute(optionTree)
+        (header, footer) = self.getChartFuncFrame(lazy)
+        return header + self.toJavaScript(optionTree, members=True) + footer
+
+    def getChartFuncFrame(self, lazy=False):
+        '''
+        Return the source that goes before and after the
+        options in the chart function. It depends on whether
+        the chart is lazy, and whether it has a sidecar.
+        :param lazy: whether the chart is made only when scrolled into view
+        :type lazy: bool
+        :return: function header and footer
+        :rtype: (String, String)
+        '''
+        encoder = JsEncoder()
+        chartName = self.internalChartName
+        if self.sidecarSrc is None:
+            if lazy:
+                return (ChartMaker.LAZY_FUNC_HEADER % (encoder.quote(chartName), chartName), 
+                        ChartMaker.CHART_FUNC_FOOTER)
+            return (self.thisChartFuncHeader, ChartMaker.CHART_FUNC_FOOTER)
+        if lazy:
+            return (ChartMaker.LAZY_SIDECAR_FUNC_HEADER % (encoder.quote(chartName), encoder.quote(chartName), 
+                                                           encoder.quote(self.sidecarSrc), chartName),
+                    ChartMaker.SIDECAR_FUNC_FOOTER)
+        return (ChartMaker.SIDECAR_FUNC_HEADER % (encoder.quote(chartName), encoder.quote(self.sidecarSrc), chartName),
+                ChartMaker.SIDECAR_FUNC_FOOTER)
+
+    def getOptionTree(self):
+        '''
+        Return the option tree that goes into the chart function:
+        the chart's options, or with a sidecar, sidecarOptions().
+        :rtype: {String : <any>}
+        '''
+        if self.sidecarSrc is None:
+            return self.options
+        return self.sidecarOptions()
+
+    def hasSidecarData(self):
+        '''
+        :return: whether the chart has data that can be moved 
+            to a sidecar file; see writeWebPageWithSidecars()
+        :rtype: bool
+        '''
+        return 'series' in self.options
+
+    def setSidecar(self, sidecarSrc):
+        '''
+        Have the chart load its data from a sidecar file,
+        whose content is produced by iterSidecarSource().
+        :param sidecarSrc: URL of the sidecar file, relative to the page
+        :type sidecarSrc: String
+        '''
+        self.sidecarSrc = sidecarSrc
+        if 'webreportsData.js' not in self.scriptDependencies:
+            self.scriptDependencies.append('webreportsData.js')
+
+    def iterSidecarSource(self):
+        '''
+        Yield the JavaScript source of the chart's sidecar
+        file, which hands the chart's data to webreportsData.js.
+        :rtype: Generator(String)
+        '''
+        yield 'WebReports.receive(%s, ' % JsEncoder().quote(self.internalChartName)
+        for chunk in self.iterSidecarPayload():
+            yield chunk
+        yield ');\n'
+
+    def iterSidecarPayload(self):
+        '''
+        Yield the JavaScript source of the chart's data, as
+        it goes into the sidecar file: an array with the data
+        of each series. Subclasses with other data override 
+        this method together with sidecarOptions().
+        :rtype: Generator(String)
+        '''
+        yield '['
+        for (seriesIndex, series) in enumerate(self.options['series']):
+            seriesTree = series.asOptionTree() if hasattr(series, 'asOptionTree') else series
+            yield (',' if seriesIndex > 0 else '') + self.toJavaScript(seriesTree.get('data', []))
+        yield ']'
+
+    def sidecarOptions(self):
+        '''
+        Return the option tree for use with a sidecar: the
+        chart's options, with the data of each series taken
+        from the sidecar's payload.
+        :rtype: {String : <any>}
+        '''
+        options = dict(self.options)
+        options['series'] = []
+        for (seriesIndex, series) in enumerate(self.options['series']):
+            seriesTree = dict(series.asOptionTree() if hasattr(series, 'asOptionTree') else series)
+            seriesTree['data'] = JsRaw('WebReports.getPayload(%s)[%d]' % (JsEncoder().quote(self.internalChartName), 
+                                                                           seriesIndex))
+            options['series'].append(seriesTree)
+        return options
+
+    def toJavaScript(self, value, members=False):
+        '''
+        Serialize an option tree, or any part of one, into
+        JavaScript source. Dates are converted via
+        pythonToJavaScriptType().
+        :param value: option (sub)tree to serialize
+        :type value: <any>
+        :param members: if True, value must be a dict, and only its
+            comma separated members are returned, without braces.
+        :type members: bool
+        :return: JavaScript source
+        :rtype: String
+        '''
+        encoder = JsEncoder(dateConverter=self.pythonToJavaScriptType)
+        if members:
+            return encoder.encodeMembers(value)
+        return encoder.encode(value)
 
     def getInternalName(self):
         '''
@@ -164,41 +692,99 @@ class ChartMaker(object):
         :rtype: String
         '''
         return self.internalChartName
+
+    def iterDivSource(self):
+        '''
+        Yield the HTML that goes into the page <body> for
+        this chart: the <div> that holds the chart, plus
+        any inline data the chart needs. Subclasses with 
+        inline data override this method.
+        :return: successive pieces of the chart's <body> HTML
+        :rtype: Generator(String)
+        '''
+        yield ChartMaker.CHART_DIV % self.getInternalName()
     
     def add(self, javascriptStr):
         '''
-        Add one substring to the growing function body
+        Add one substring to the growing function body.
+        The substring is kept verbatim in the option tree;
+        consecutive substrings are concatenated, and need 
+        not each be complete JavaScript. Leading and trailing
+        commas of such a run are ignored, since commas between
+        options are supplied during serialization.
         :param javascriptStr: substring to add
         :type javascriptStr: String
         '''
-        self.funcDef += javascriptStr
+        lastKey = next(reversed(self.options), None)
+        if isinstance(lastKey, JsFragment):
+            self.options[lastKey].append(javascriptStr)
+        else:
+            self.options[JsFragment()] = [javascriptStr]
 
     def addDictItem(self, dictKey, **dictKwdVals):
-        if dictKey is None:
-            self.add('{')
+        '''
+        Add an option whose value is a JavaScript object.
+        The keyword values are JavaScript source; for 
+        example, strings must include their quotes. 
+        
+        If the most recent options were add()ed substrings, the 
+        object is appended to them as source, followed by a comma,
+        such that it lands inside any object those substrings
+        opened, and backtrack() can remove the comma. Otherwise
+        it becomes an option of the tree; adding the same
+        option again adds to its attributes.
+        :param dictKey: option name. If None, the object is added without a name.
+        :type dictKey: {String | None}
+        :param dictKwdVals: attr/JavaScript source pairs of the object
+        :type dictKwdVals: kwd=<any>
+        '''
+        item = dict((key, JsRaw(val)) for key,val in dictKwdVals.items())
+        lastKey = next(reversed(self.options), None)
+        if dictKey is None or isinstance(lastKey, JsFragment):
+            source = self.toJavaScript(item)
+            if dictKey is not None:
+                source = '%s: %s' % (dictKey if JsEncoder.IDENTIFIER_PATTERN.match(dictKey) 
+                                     else JsEncoder().quote(dictKey), source)
+            fragmentSource = ''.join(self.options[lastKey]).rstrip() if isinstance(lastKey, JsFragment) else ''
+            if len(fragmentSource) > 0 and fragmentSource[-1] not in '{[,':
+                source = ',' + source
+            self.add(source + ',')
+        elif isinstance(self.options.get(dictKey), dict):
+            self.options[dictKey].update(item)
         else:
-            self.add(dictKey + ':' + '{')
-        for key,val in dictKwdVals.iteritems():
-            self.add(key + ':' + str(val) + ',')
-        self.backtrack()
-        self.add('},')
+            self.options[dictKey] = item
         
     def makeDictStr(self, **dictKwdVals):
-        res = '{'
-        for key,val in dictKwdVals.iteritems():
-            res += key + ':' + str(val) + ','
-        return res[:-1] + '}'
-        
+        '''
+        Return the JavaScript source of an object with the
+        given attributes. As in addDictItem(), the values 
+        are JavaScript source.
+        :param dictKwdVals: attr/JavaScript source pairs of the object
+        :type dictKwdVals: kwd=<any>
+        :return: JavaScript object literal
+        :rtype: JsRaw
+        '''
+        return JsRaw(self.toJavaScript(dict((key, JsRaw(val)) for key,val in dictKwdVals.items())))
     
     def backtrack(self, numChars=1):
         '''
-        Remove numChars characters from the function
-        body. Used in loops where commas are added.
-        The last comma must often be removed
+        Remove numChars characters from the end of the 
+        most recently add()ed substrings. Kept for callers
+        that add commas in loops and then remove the last one.
+        Options that were not added as substrings never carry
+        trailing commas, so there is nothing to remove from them.
         :param numChars: number of characters to remove from function body
         :type numChars: int
         '''
-        self.funcDef = self.funcDef[:-numChars]
+        lastKey = next(reversed(self.options), None)
+        if not isinstance(lastKey, JsFragment):
+            return
+        fragmentParts = self.options[lastKey]
+        while numChars > 0 and fragmentParts:
+            lastPart = fragmentParts.pop()
+            if len(lastPart) > numChars:
+                fragmentParts.append(lastPart[:-numChars])
+            numChars -= len(lastPart)
 
     def addAllSeries(self, seriesArray):
         '''
@@ -210,12 +796,7 @@ class ChartMaker(object):
         :param seriesArray: all data series objects to add. 
         :type seriesArray: [DataSeries]
         '''
-        self.add('series: [')
-        for seriesObj in seriesArray:
-            self.add(str(seriesObj) + ',')
-        # Remove last comma:
-        self.backtrack()
-        self.add(']')
+        self.options['series'] = list(seriesArray)
         
     def createViz(self, **dictValKwds):
         '''
@@ -247,11 +828,17 @@ class ChartMaker(object):
         by fieldSep. The method return a six-tuple: the minimum and maximum
         value in each dimension.
         
-        The parameters xToComparableFunc, yToComparableFunc, and
-        zToComparableFunc must be functions that, when appied to
-        the respective dimension data returns a new value that is
-        comparable. Comparable means that, for instance, max(val1,val2)
-        will not break. 
+        Without further arguments, the three columns are parsed in
+        bulk, and their kinds (numbers, dates, or text) are detected
+        from the data. The parameters xToComparableFunc, yToComparableFunc,
+        and zToComparableFunc, if given, must be functions that, when 
+        appied to the respective dimension data returns a new value
+        that is comparable. Comparable means that, for instance,
+        max(val1,val2) will not break. The rows are then converted
+        one at a time, with these functions; dimensions without a 
+        function get one for the kind of their first value, see
+        valueToComparable(). Rows for which a function raises 
+        ValueError or TypeError do not count towards the extrema.
         
         :param xyzArr: array of three-tuples. Each tuple element must be,
                        or must be convertible to a value that is comparable.
@@ -268,73 +855,55 @@ class ChartMaker(object):
         :param rowsToSkip: number of elements in array to skip. Useful to skip header info.
         :type rowsToSkip: int
         '''
-        try:
-            if len(xyzArr) <= rowsToSkip:
-                raise ValueError('Insufficient number of values in data array.')
-    
-            # Initialize min/max values:
-            firstArrEl = xyzArr[rowsToSkip]
+        if len(xyzArr) <= rowsToSkip:
+            raise ValueError('Insufficient number of values in data array.')
 
-            if type(firstArrEl) == tuple:
-                (x,y,z) = firstArrEl
-            else:
-                (x,y,z) = firstArrEl.split(fieldSep)
-            
-            # Get functions that, when applied to values
-            # in col x, y, and z, respectively, yield 
-            # equivalent values for which MAX, MIN, and
-            # relational ops work. Only strings that 
-            # represent dates and times are currently 
-            # treated specially here:
-             
-            xToComparableFunc = self.valueToComparable(x)
-            yToComparableFunc = self.valueToComparable(y)
-            zToComparableFunc = self.valueToComparable(z)
-            
-            xmin = xToComparableFunc(x)
-            xmax = xmin
-            ymin = yToComparableFunc(y)
-            ymax = ymin
-            zmin = zToComparableFunc(z)
-            zmax = zmin
-            numMissingValues = 0
-            # If array only had one non-header element: done
-            if len(xyzArr) == rowsToSkip+1:
-                return (xmin, xmax, ymin, ymax, zmin, zmax)
-    
-            for arrElement in xyzArr[rowsToSkip+1:]:
-                try:
-                    if type(arrElement) == tuple:
-                        (x,y,z) = arrElement
+        if (xToComparableFunc, yToComparableFunc, zToComparableFunc) != (None, None, None):
+            return self.findMinMaxYZByRow(xyzArr, fieldSep, 
+                                          (xToComparableFunc, yToComparableFunc, zToComparableFunc), 
+                                          rowsToSkip)
+        # Parse all three columns in bulk. Rows with a
+        # missing or unparsable cell in any column do not
+        # count towards the extrema:
+        statistics = XYZStatistics()
+        statistics.update(parseXYZColumns(xyzArr, fieldSep=fieldSep, rowsToSkip=rowsToSkip))
+        if statistics.numMissing > 0:
+            self.warning('Data contains %d empty, or otherwise non-float/int x,y, or z values' % statistics.numMissing)
+        return tuple(self.pythonToJavaScriptType(extreme) for extreme in statistics.extrema())
+
+    def findMinMaxYZByRow(self, xyzArr, fieldSep, toComparableFuncs, rowsToSkip):
+        '''
+        findMinMaxYZ() with caller supplied conversion functions,
+        applied to one row at a time.
+        :param toComparableFuncs: x, y, and z conversion functions; 
+            None for a function chosen by valueToComparable()
+        :type toComparableFuncs: ({<function> | None}, {<function> | None}, {<function> | None})
+        '''
+        toComparableFuncs = list(toComparableFuncs)
+        extrema = [None] * 6
+        numMissingValues = 0
+        for arrElement in xyzArr[rowsToSkip:]:
+            try:
+                xyz = arrElement if isinstance(arrElement, tuple) else arrElement.split(fieldSep)
+                if len(xyz) != 3:
+                    raise ValueError('Not an x,y,z row: %s' % str(arrElement))
+                for (dim, value) in enumerate(xyz):
+                    if toComparableFuncs[dim] is None:
+                        toComparableFuncs[dim] = self.valueToComparable(value)
+                comparables = [toComparableFunc(value) for (toComparableFunc, value) in zip(toComparableFuncs, xyz)]
+                newExtrema = list(extrema)
+                for (dim, comparable) in enumerate(comparables):
+                    if extrema[2 * dim] is None:
+                        newExtrema[2 * dim:2 * dim + 2] = [comparable, comparable]
                     else:
-                        (x,y,z) = arrElement.split(fieldSep)
-                    x = xToComparableFunc(x)
-                    y = yToComparableFunc(y)
-                    z = zToComparableFunc(z)
-                    xmin = min(xmin, x)
-                    xmax = max(xmax, x)
-                    ymin = min(ymin, y)
-                    ymax = max(ymax, y)
-                    zmin = min(zmin, z)
-                    zmax = max(zmax, z)
-                except (ValueError,TypeError):
-                    # The '+rowsToSkip' is required to
-                    # match the offending arrElement properly:
-                    # enumerate starts the count at 0, even
-                    # if rowsToSkip > 0:
-                    numMissingValues += 1
-                    #self.warning('Data contains non-float/int in arrElement %d (%s)' % (arrIndex+rowsToSkip,arrElement))
-                    continue
-        finally:
-            if numMissingValues > 0:
-                self.warning('Data contains %d empty, or otherwise non-float/int x,y, or z values' % numMissingValues)
-            return (self.pythonToJavaScriptType(xmin), 
-                    self.pythonToJavaScriptType(xmax), 
-                    self.pythonToJavaScriptType(ymin), 
-                    self.pythonToJavaScriptType(ymax), 
-                    self.pythonToJavaScriptType(zmin),
-                    self.pythonToJavaScriptType(zmax)
-                    )
+                        newExtrema[2 * dim:2 * dim + 2] = [min(extrema[2 * dim], comparable), 
+                                                           max(extrema[2 * dim + 1], comparable)]
+                extrema = newExtrema
+            except (ValueError, TypeError):
+                numMissingValues += 1
+        if numMissingValues > 0:
+            self.warning('Data contains %d empty, or otherwise non-float/int x,y, or z values' % numMissingValues)
+        return tuple(self.pythonToJavaScriptType(extreme) for extreme in extrema)
 
     def warning(self, *objsToPrint):
         print("WARNING: ", *objsToPrint, file=sys.stderr)
@@ -365,33 +934,37 @@ class ChartMaker(object):
         '''
         identity = lambda x: x
         # A string that can be interpreted as a date?
-        try:
-            datetime.datetime(value)
+        if isinstance(value, str) and looksLikeDate(value):
             return ChartMaker.makeDatetimeFromString
-        except:
-            # not a date or time in string form
-            pass
         return identity
     
-    def pythonToJavaScriptType(self, quantity):
+    @classmethod
+    def pythonToJavaScriptType(cls, quantity):
         '''
         Given any Python quantity, return either the
         same quantity, if the quantity is the same in 
         JavaScript, or a JavaScript string that will 
         produce the equivalent quantity in JS. NOTE:
         this method only handles what's needed for 
-        the purpose of this file! 
+        the purpose of this file! Datetimes, and strings
+        that valueToComparable() recognizes as dates, become
+        a Date.UTC() call. Datetimes without timezone are
+        taken to be UTC.
         :param quantity: Python item to be converted to JavaScript equivalent
         :type quantity: <any>
+        :return: quantity, or JavaScript source for dates
+        :rtype: {<any> | JsRaw}
         '''
-        if type(quantity) == datetime.datetime:
-            return "new Date('%s').UTC" % quantity.isoformat()
-        try:
-            aDate = self.makeDatetimeFromString(quantity)
-            return "new Date('%s').UTC" % aDate.isoformat()
-        except:
+        if isinstance(quantity, datetime.datetime):
+            aDate = toUTC(quantity)
+        elif isinstance(quantity, str) and looksLikeDate(quantity):
+            aDate = toUTC(cls.makeDatetimeFromString(quantity))
+        else:
             # It's not a date; just return unchanged:
             return quantity
+        return JsRaw('Date.UTC(%d, %d, %d, %d, %d, %d, %d)' % (aDate.year, aDate.month - 1, aDate.day,
+                                                               aDate.hour, aDate.minute, aDate.second,
+                                                               aDate.microsecond // 1000))
             
     @classmethod
     def makeDatetimeFromString(cls, dateTimeStr):
@@ -401,13 +974,75 @@ class ChartMaker(object):
         Examples of acceptable strings: '2013-01-01',
         '2010-05-08T23:41:54.000Z', and '23:41:54.000Z'.
         The latter uses current calendar date for the 
-        date. For details, see PyPi's datedutil.
+        date. ISO 8601 strings take a fast path; odd
+        formats go to PyPi's dateutil. Results for recently
+        seen strings are cached; see dateparsing.parseDatetime().
         :param dateTimeStr: acceptable date, time, or date-and-time string
         :type dateTimeStr: String
         :return corresponding Datetime object.
         :rtype Datetime
+        :raise ValueError: if dateTimeStr holds no date or time
+        '''
+        aDatetime = parseDatetime(dateTimeStr)
+        if aDatetime is None:
+            raise ValueError('Not a date or time: %s' % dateTimeStr)
+        return aDatetime
+
+    @classmethod
+    def datetimeToJavaScriptMillis(cls, aDatetime):
+        '''
+        Given a datetime, return milliseconds since the epoch,
+        which is how Highcharts represents dates. Datetimes without
+        timezone are taken to be UTC.
+        :param aDatetime: date and time to convert
+        :type aDatetime: datetime.datetime
+        :return: milliseconds since 1970-01-01 UTC
+        :rtype: int
         '''
-        return dateutil.parser.parse(dateTimeStr)
+        return calendar.timegm(aDatetime.utctimetuple()) * 1000 + aDatetime.microsecond // 1000
+
+    @classmethod
+    def encodeColumn(cls, values, quantum=None, floatType='f64'):
+        '''
+        Encode a column of numbers for webreportsData.js: a
+        dict with the type of typed array to create in the browser,
+        and the array's little-endian bytes in base64. NaN stands 
+        for missing values. 
+        
+        If quantum is given, values are sent as int32 multiples of
+        quantum. Otherwise integral columns are sent as int32, and 
+        all others as floatType.
+        :param values: the numbers to encode
+        :type values: np.ndarray
+        :param quantum: value resolution to preserve, or None for full resolution
+        :type quantum: {float | None}
+        :param floatType: typed array for non-integral values: 'f64' or 'f32'
+        :type floatType: String
+        :return: the encoded column
+        :rtype: {String : <any>}
+        '''
+        int32Max = -ChartMaker.INT32_NULL - 1
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        present = values[~missing]
+        column = {}
+        if quantum is not None:
+            column['scale'] = quantum
+            codes = np.clip(np.round(values / quantum), -int32Max, int32Max)
+        elif np.all(present == np.trunc(present)) and np.all(np.abs(present) <= int32Max):
+            codes = values
+        else:
+            codes = None
+
+        if codes is None:
+            column['type'] = floatType
+            encoded = values.astype('<f4' if floatType == 'f32' else '<f8')
+        else:
+            column['type'] = 'i32'
+            codes[missing] = ChartMaker.INT32_NULL
+            encoded = codes.astype('<i4')
+        column['data'] = base64.b64encode(encoded.tobytes()).decode('ascii')
+        return column
 
 # ---------------------------------------  Chart Class Histogram ----------------------------        
         
@@ -450,12 +1085,93 @@ class Histogram(ChartMaker):
                      )
                      
         # Start a chart function:  
-        self.createViz({'title': {'text': '%s' % chartTitle},
-                        'type' : "'column'"})
-        self.add(str(xAxis) + ',')
-        self.add(str(yAxis) + ',')
-        self.add("legend: {enabled : false},")
+        self.options['chart'] = {'type' : 'column'}
+        self.options['title'] = {'text' : chartTitle}
+        self.options['xAxis'] = xAxis
+        self.options['yAxis'] = yAxis
+        self.options['legend'] = {'enabled' : False}
         self.addAllSeries([histogramDataSeries])
+
+    @classmethod
+    def fromValues(cls, chartTitle, xAxisTitle, values, bins='fd', binWidth=None):
+        '''
+        Make a histogram of raw observations, rather than of
+        counts. Bins and their labels are computed from the
+        values; see binning.histogramEdges() for the choices
+        of bins: a number of bins, a list of edges, 'fd' for 
+        Freedman-Diaconis, or 'discrete' for one bin per integer.
+        binWidth, if given, makes bins of that width. Missing
+        values (None or NaN) are not counted.
+        
+        :param chartTitle: Title to print underneath the chart
+        :type chartTitle: String
+        :param xAxisTitle: x-Axis name
+        :type xAxisTitle: String
+        :param values: the observations
+        :type values: {[float] | np.ndarray | array.array}
+        :param bins: binning rule
+        :type bins: {int | [float] | String}
+        :param binWidth: width of each bin
+        :type binWidth: {float | None}
+        :rtype: Histogram
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            raise ValueError('Histogram needs at least one value')
+        (q1, q3) = np.percentile(values, [25, 75]) if isinstance(bins, str) and bins == 'fd' else (0, 0)
+        edges = histogramEdges(float(values.min()), float(values.max()), 
+                               bins=bins, 
+                               binWidth=binWidth, 
+                               iqr=float(q3 - q1), 
+                               numValues=len(values))
+        if isinstance(bins, str) and bins == 'discrete':
+            counts = np.bincount((values - edges[0]).astype(np.int64), minlength=len(edges) - 1)
+        else:
+            counter = HistogramCounter(edges)
+            counter.update(values)
+            counts = counter.counts
+        return cls(chartTitle, xAxisTitle, histogramLabels(edges), DataSeries(counts.tolist()))
+
+    @classmethod
+    def fromCSVColumn(cls, chartTitle, xAxisTitle, csvFileName, column=0, fieldSep=',', rowsToSkip=0, 
+                      bins='fd', binWidth=None):
+        '''
+        Make a histogram of one numeric column of a CSV file.
+        The file is read in two passes of INGEST_ROWS_PER_CHUNK
+        lines at a time: one for the extrema, and the interquartile 
+        range estimated from a random sample, the other for the counts.
+        Bins are as for fromValues(). Empty and non-numeric cells
+        are not counted.
+        
+        :param csvFileName: path to the CSV file
+        :type csvFileName: String
+        :param column: zero-based index of the column to count
+        :type column: int
+        :param fieldSep: field separator of the CSV lines
+        :type fieldSep: String
+        :param rowsToSkip: number of header lines
+        :type rowsToSkip: int
+        :rtype: Histogram
+        '''
+        def iterValueChunks():
+            for rowChunk in iterRowChunks(csvFileName, ChartMaker.INGEST_ROWS_PER_CHUNK, rowsToSkip=rowsToSkip):
+                cells = splitColumns(rowChunk, fieldSep=fieldSep, numCols=column + 1)[column]
+                yield parseColumn(cells, kind=ColumnKind.NUMERIC).values
+        sample = ValueSample()
+        for values in iterValueChunks():
+            sample.update(values)
+        if sample.numValues == 0:
+            raise ValueError('Column %d of %s holds no numbers' % (column, csvFileName))
+        edges = histogramEdges(sample.low, sample.high, 
+                               bins=bins, 
+                               binWidth=binWidth, 
+                               iqr=sample.iqr(), 
+                               numValues=sample.numValues)
+        counter = HistogramCounter(edges)
+        for values in iterValueChunks():
+            counter.update(values)
+        return cls(chartTitle, xAxisTitle, histogramLabels(edges), DataSeries(counter.counts.tolist()))
         
         
 
@@ -463,6 +1179,9 @@ class Histogram(ChartMaker):
         
 class Pie(ChartMaker):
     
+    # Labels counted by fromStream() for each slice shown:
+    COUNTERS_PER_SLICE = 10
+
     def __init__(self, chartTitle, pieDataSeriesObjArr):
         '''
         Build a pie chart. Can control chart title, slice
@@ -477,33 +1196,29 @@ class Pie(ChartMaker):
         super(Pie, self).__init__()
         self.chartType = 'pie'
 
-        # Start the function string, taking
+        # Start the option tree, taking
         # care of the 'chart' and 'title' entries:
-        self.createViz(chartTitle, {'title' : {'text': '%s' % chartTitle}, 
-                                    'plotBackgroundColor' : 'null',
-                                    'plotBorderWidth' : 'null',
-                                    'plotShadow' : 'false'
-                                    })
-
-        self.add("plotOptions: {" +
-                 "pie: {" +
-                     "allowPointSelect: true," +
-                     "cursor: 'pointer'," +
-                     "dataLabels: {" +
-                         "enabled: true," +
-                         "format: '<b>{point.name}</b>: {point.percentage:.1f} %'," +
-                         "style: {" +
-                             "color: (Highcharts.theme && Highcharts.theme.contrastTextColor) || 'black'" +
-                             "}"
-                        "}" +
-                    "}" + # close pie:...
-                  "},") # close plotOptions
-                 
-        self.add('series: [{')
-        self.add("type: 'pie',")
-        self.add("name: '%s'," % self.internalChartName)
-        self.add("data: [")
+        self.options['chart'] = {'plotBackgroundColor' : None,
+                                 'plotBorderWidth' : None,
+                                 'plotShadow' : False
+                                 }
+        self.options['title'] = {'text' : chartTitle}
+
+        self.options['plotOptions'] = {
+            'pie': {
+                'allowPointSelect': True,
+                'cursor': 'pointer',
+                'dataLabels': {
+                    'enabled': True,
+                    'format': '<b>{point.name}</b>: {point.percentage:.1f} %',
+                    'style': {
+                        'color': JsRaw("(Highcharts.theme && Highcharts.theme.contrastTextColor) || 'black'")
+                        }
+                    }
+                }
+            }
 
+        sliceData = []
         for pieSliceDataSeries in pieDataSeriesObjArr:
             if len(pieSliceDataSeries['data']) != 1:
                 raise ValueError("Pie charts need exactly one data value for each slice.")
@@ -512,38 +1227,139 @@ class Pie(ChartMaker):
                 sliceCallout =  pieSliceDataSeries['name']
             except KeyError:
                 raise ValueError("Pie chart needs a slice name for each slice.")
-            self.add("['%s', %s]," % (sliceCallout, sliceSize))
+            sliceData.append([sliceCallout, sliceSize])
 
-        self.backtrack() # remove trailing comma left by loop
-        self.add(']')  # close 'data: [': array of attr/value arrays 
-        self.add("}]") # close 'series: [{'
+        # The chart's name is JavaScript source, like the other
+        # places that refer to the chart, rather than data:
+        self.options['series'] = [{'type' : 'pie',
+                                   'name' : JsRaw(JsEncoder().quote(self.internalChartName)),
+                                   'data' : sliceData
+                                   }]
+
+    @classmethod
+    def fromStream(cls, chartTitle, rows, topK=10, otherLabel='Other', capacity=None, exact=False):
+        '''
+        Make a pie chart of the topK most frequent categories in
+        a stream of category labels, or of (label, weight) rows;
+        all other categories are folded into one slice named
+        otherLabel. Memory use does not depend on the number of
+        categories: a SpaceSaving sketch counts at most capacity 
+        labels. The slices' sizes may then overestimate the true
+        weights by at most total / capacity, which is taken from
+        the Other slice.
+
+        With exact=True, rows are read a second time to count the
+        weights of the topK labels exactly; rows must then be a
+        sequence or other re-iterable, not an iterator.
+        
+        :param chartTitle: title to appear above the chart
+        :type chartTitle: String
+        :param rows: labels, or (label, weight) pairs
+        :type rows: {iterable | iterator}
+        :param topK: number of slices besides the Other slice
+        :type topK: int
+        :param otherLabel: name of the slice for all other categories
+        :type otherLabel: String
+        :param capacity: number of labels counted; None: COUNTERS_PER_SLICE * topK
+        :type capacity: {int | None}
+        :param exact: whether to count the slices exactly in a second pass
+        :type exact: bool
+        :rtype: Pie
+        '''
+        if exact and iter(rows) is rows:
+            raise ValueError('Exact pie slices need rows that can be read twice, not an iterator')
+        sketch = SpaceSaving(cls.COUNTERS_PER_SLICE * topK if capacity is None else capacity)
+        rowIterator = iter(rows)
+        while True:
+            chunk = list(islice(rowIterator, ChartMaker.INGEST_ROWS_PER_CHUNK))
+            if len(chunk) == 0:
+                break
+            sketch.updateChunk(chunk)
+        slices = [(label, count) for (label, count, _) in sketch.top(topK)]
+        if exact:
+            exactCounts = dict((label, 0) for (label, _) in slices)
+            for row in rows:
+                (label, weight) = row if isinstance(row, (tuple, list)) else (row, 1)
+                if label in exactCounts:
+                    exactCounts[label] += weight
+            slices = sorted(exactCounts.items(), key=lambda labelCount: -labelCount[1])
+        otherCount = sketch.total - sum(count for (_, count) in slices)
+        if otherCount > 0:
+            slices.append((otherLabel, otherCount))
+        return cls(chartTitle, [DataSeries([count], legendLabel=label) for (label, count) in slices])
 
 # ---------------------------------------  Chart Class Line ----------------------------        
 
 
 class Line(ChartMaker):
     
-    def __init__(self, chartTitle, xAxisLabels, yAxisTitle, lineSeriesObjArray):
+    # Fewest date labels that are taken to be a regular time series:
+    MIN_REGULAR_POINTS = 3
+    # Highcharts' default turboThreshold. Longer series are read
+    # on its fast path, which takes only arrays of numbers; they
+    # are drawn without markers, shadows, or animation:
+    LARGE_SERIES_POINTS = 1000
+
+    def __init__(self, chartTitle, xAxisLabels, yAxisTitle, lineSeriesObjArray, downsampleTo=None,
+                 pointStart=None, pointInterval=None):
         '''
         Special subclass for making line graphs. The lineData
         is a dictionary. 
         
+        Dates as x axis labels that are equally far apart, such as
+        hourly or daily samples, are not sent as category labels.
+        Rather, the x axis becomes a datetime axis, and each series
+        carries just the start date and interval: its y values
+        go into the page as one flat array of numbers. Regular
+        intervals may also be given explicitly.
+        
         :param chartTitle: Title to print underneath the chart
         :type chartTitle: String
+        :param xAxisLabels: x axis labels, one per point; may be 
+            None if pointStart and pointInterval are given
+        :type xAxisLabels: {[<any>] | np.ndarray | None}
         :param yAxisTitle: x-Axis name
         :type yAxisTitle: String
         :param lineSeriesObjArray: array of DataSeries objects
         :type lineSeriesObjArray: [DataSeries]
+        :param downsampleTo: maximum number of points per series, for
+            series that do not set their own; None: all points
+        :type downsampleTo: {int | None}
+        :param pointStart: date of each series' first point; None: the
+            first x axis label
+        :type pointStart: {datetime.datetime | int | None}
+        :param pointInterval: time between points, or milliseconds; 
+            None: detected from the x axis labels
+        :type pointInterval: {datetime.timedelta | int | None}
         '''
         super(Line, self).__init__()
         self.chartType = 'line'
         
         if not isinstance(lineSeriesObjArray, list):
             lineSeriesObjArray = [lineSeriesObjArray]
+        # The caller's series stay as they are:
+        lineSeriesObjArray = [series.copy() for series in lineSeriesObjArray]
+        if downsampleTo is not None:
+            for series in lineSeriesObjArray:
+                if series.downsampleTo is None:
+                    series.downsampleTo = downsampleTo
 
-        xAxis = Axis(axisDir='x', 
-                     labelArr = xAxisLabels
-                     )
+        regularInterval = self.regularInterval(xAxisLabels, pointStart, pointInterval)
+        if regularInterval is None:
+            xAxis = Axis(axisDir='x', 
+                         labelArr = xAxisLabels
+                         )
+        else:
+            xAxis = Axis(axisDir='x')
+            xAxis.axisDict['type'] = 'datetime'
+            for series in lineSeriesObjArray:
+                (series['pointStart'], series['pointInterval']) = regularInterval
+                try:
+                    dataArr = np.asarray(series['data'], dtype=np.float64)
+                except (TypeError, ValueError):
+                    continue
+                if dataArr.ndim == 1:
+                    series['data'] = dataArr
 
         yAxis = Axis(axisDir='y',
                      titleText=yAxisTitle,
@@ -557,26 +1373,88 @@ class Line(ChartMaker):
                                 }
                     )
 
-        legend = "legend: {" +\
-                    "layout: 'vertical'," +\
-                    "align: 'right'," +\
-                    "verticalAlign: 'middle'," +\
-                    "borderWidth: 0" +\
-                  "}"
+        legend = {'layout': 'vertical',
+                  'align': 'right',
+                  'verticalAlign': 'middle',
+                  'borderWidth': 0
+                  }
 
         # Start a chart function:  
-        self.createViz({'title': "{text: '%s'}," % chartTitle,  
-                        'type' : "'line'"})
-        self.add(str(xAxis) + ',')
-        self.add(str(yAxis) + ',')
-        self.add(legend + ',')
+        self.options['chart'] = {'type' : 'line'}
+        self.options['title'] = {'text' : chartTitle}
+        self.options['xAxis'] = xAxis
+        self.options['yAxis'] = yAxis
+        self.options['legend'] = legend
+        if max([len(series['data']) for series in lineSeriesObjArray] + [0]) > Line.LARGE_SERIES_POINTS:
+            self.options['plotOptions'] = {'series' : {'animation' : False,
+                                                       'marker' : {'enabled' : False},
+                                                       'shadow' : False
+                                                       }}
         self.addAllSeries(lineSeriesObjArray)
 
+    @classmethod
+    def regularInterval(cls, xAxisLabels, pointStart=None, pointInterval=None):
+        '''
+        Return the start and interval, in milliseconds, of a regular
+        time series, or None if the points are not equally far apart 
+        in time. Without pointInterval, the x axis labels must be 
+        at least MIN_REGULAR_POINTS dates, or date strings, that are 
+        equally far apart.
+        :param xAxisLabels: x axis labels
+        :type xAxisLabels: {[<any>] | np.ndarray | None}
+        :param pointStart: date of the first point, or None
+        :type pointStart: {datetime.datetime | int | None}
+        :param pointInterval: time between points, or None
+        :type pointInterval: {datetime.timedelta | int | None}
+        :rtype: {(int, int) | None}
+        '''
+        if isinstance(pointStart, datetime.datetime):
+            pointStart = cls.datetimeToJavaScriptMillis(pointStart)
+        if isinstance(pointInterval, datetime.timedelta):
+            pointInterval = int(round(pointInterval.total_seconds() * 1000))
+        if pointInterval is not None and pointStart is not None:
+            return (pointStart, pointInterval)
+        if xAxisLabels is None or len(xAxisLabels) < (1 if pointInterval is not None else cls.MIN_REGULAR_POINTS):
+            return None
+        labels = parseColumn(xAxisLabels if isinstance(xAxisLabels, np.ndarray) else list(xAxisLabels))
+        if labels.kind != ColumnKind.DATE or labels.invalid.any():
+            return None
+        millis = labels.values.astype('datetime64[ms]').astype(np.int64)
+        if pointInterval is None:
+            intervals = np.diff(millis)
+            if intervals[0] <= 0 or np.any(intervals != intervals[0]):
+                return None
+            pointInterval = int(intervals[0])
+        return (int(millis[0]) if pointStart is None else pointStart, pointInterval)
+
 
 # ---------------------------------------  Chart Class Heatmap ----------------------------        
 
 class Heatmap(ChartMaker):
     
+    FILE_PARAMETERS = ('xyzCSVFileOrArr',)
+
+    # Tooltip of heatmaps with a text axis, whose points carry
+    # codes into the axis' categories rather than labels:
+    CATEGORY_TOOLTIP_FORMATTER = '''function () {
+            function label(axis, value) {
+                if (axis.categories) {
+                    return axis.categories[value];
+                }
+                return axis.isDatetimeAxis ? Highcharts.dateFormat('%e %b, %Y', value) : value;
+            }
+            return label(this.series.xAxis, this.point.x) + ' ' + label(this.series.yAxis, this.point.y) + 
+                   ': <b>' + this.point.value + '</b>';
+        }'''
+
+    # Colors of the color axis, from smallest to largest
+    # value, at fractions of the axis:
+    COLOR_STOPS = [[0, '#3060cf'],
+                   [0.5, '#fffbbc'],
+                   [0.9, '#c4463a'],
+                   [1, '#c4463a']
+                   ]
+
     def __init__(self,
                  xyzCSVFileOrArr,
                  chartTitle='',
@@ -591,108 +1469,529 @@ class Heatmap(ChartMaker):
                  rowsToSkip=0,
                  xToComparableFunc=float,
                  yToComparableFunc=float,
-                 zToComparableFunc=float,):
+                 zToComparableFunc=float,
+                 payloadMode='csv',
+                 valueQuantum=None,
+                 streaming=False,
+                 maxCells=None,
+                 binning=None,
+                 reducer='mean',
+                 renderInWorker=False,
+                 colorPercentiles=None,
+                 quantileStops=False):
+        '''
+        Heatmap of x/y/value rows, given as a CSV file, as
+        an array of CSV lines, or as a HeatmapState that holds
+        previously parsed rows and their statistics. Data that 
+        grow over time can be appended to a HeatmapState, and 
+        charted without re-reading what came before.
+        
+        The data go into the page in one of two ways. With 
+        payloadMode 'csv' the lines are included verbatim, and are
+        parsed by the browser. With payloadMode 'columnar' they are 
+        parsed here, and sent as base64 encoded typed arrays that 
+        the chart uses without further parsing. Dates then become
+        millisecond timestamps, and values are sent as float32, or,
+        if valueQuantum is given, as int32 multiples of valueQuantum. 
+        
+        With streaming=True, a CSV file is never held in memory
+        as a whole: it is read INGEST_ROWS_PER_CHUNK lines at a time
+        to compute the data's statistics, and read again while the
+        page is written. heatmapData is then None.
+        
+        Data with more distinct x/y combinations than the chart has 
+        pixels can be aggregated into a grid of x-bins by y-bins 
+        before they go into the page. Either pass binning as 
+        (xBins, yBins), or pass maxCells to have the bins chosen
+        such that the grid has at most that many cells; data
+        that fit are then left alone. The rows in each cell are
+        combined by the reducer: 'sum', 'mean', 'max', 'min', or
+        'count'. Binned x and y are the centers of the cells.
+        Only numeric and date axes are binned; a text axis keeps
+        one column or row per category.
+        
+        The browser draws the cells into one pixel buffer. With
+        renderInWorker=True, it does so in a Web Worker where the
+        browser supports OffscreenCanvas, which keeps large heatmaps
+        from blocking the page while they are drawn.
+        
+        The color axis spans the values from their colorPercentiles[0]
+        to their colorPercentiles[1] percentile, e.g. (1, 99), such
+        that a few outliers do not wash out the colors of all other
+        cells; without colorPercentiles it spans all values. With
+        quantileStops=True the colors of the axis are placed at the
+        respective quantiles of the values, rather than at equal
+        distances, so skewed data use the whole color range. Quantiles
+        are estimated with a t-digest in the same pass over the data
+        that finds the extrema; for binned data they are those of the
+        grid cells.
+
+        :param xyzCSVFileOrArr: path to CSV file, array of CSV lines, or parsed state
+        :type xyzCSVFileOrArr: {String | [String] | HeatmapState}
+        :param fieldSep: field separator of the CSV lines
+        :type fieldSep: String
+        :param rowsToSkip: number of header lines
+        :type rowsToSkip: int
+        :param payloadMode: either 'csv' or 'columnar'
+        :type payloadMode: String
+        :param valueQuantum: resolution of values in columnar mode; None: float32
+        :type valueQuantum: {float | None}
+        :param streaming: whether to stream a CSV file rather than load it
+        :type streaming: bool
+        :param maxCells: maximum number of heatmap cells; None: no limit
+        :type maxCells: {int | None}
+        :param binning: number of x-bins and y-bins; None: no binning
+        :type binning: {(int, int) | None}
+        :param reducer: how the values in one bin are combined
+        :type reducer: String
+        :param renderInWorker: whether to draw the cells in a Web Worker, if possible
+        :type renderInWorker: bool
+        :param colorPercentiles: percentiles of the values at the ends of 
+            the color axis; None: the smallest and largest value
+        :type colorPercentiles: {(float, float) | None}
+        :param quantileStops: whether to place the color stops at quantiles
+        :type quantileStops: bool
+        '''
 
         super(Heatmap, self).__init__(chartType='heatmap')
         self.chartType = 'heatmap'
+        if payloadMode not in ('csv', 'columnar'):
+            raise ValueError("Heatmap payloadMode must be 'csv' or 'columnar', not %s" % str(payloadMode))
+        self.payloadMode = payloadMode
+        if payloadMode == 'csv':
+            # Highcharts parses the CSV lines:
+            self.highchartsModules.append('modules/data.js')
+        self.valueQuantum = valueQuantum
+        self.fieldSep = fieldSep
+        self.rowsToSkip = rowsToSkip
         
-        if not isinstance(xyzCSVFileOrArr, list):
+        self.state = None
+        if isinstance(xyzCSVFileOrArr, HeatmapState):
+            self.state = xyzCSVFileOrArr
+            self.heatmapData = None
+            self.heatmapFileName = None
+        elif isinstance(xyzCSVFileOrArr, list):
+            self.heatmapData = xyzCSVFileOrArr
+            self.heatmapFileName = None
+        elif streaming:
+            self.heatmapData = None
+            self.heatmapFileName = xyzCSVFileOrArr
+        else:
             with open(xyzCSVFileOrArr, 'r') as fd:
-                xyzCSVFileOrArr = [line.rstrip() for line in fd]
-        self.heatmapData = xyzCSVFileOrArr
-        (xmin, xmax, ymin, ymax, zmin, zmax) = self.findMinMaxYZ(self.heatmapData,  # @UnusedVariable
-                                                         fieldSep=fieldSep,
-                                                         rowsToSkip=rowsToSkip,
-                                                         xToComparableFunc=xToComparableFunc,
-                                                         yToComparableFunc=yToComparableFunc,
-                                                         zToComparableFunc=zToComparableFunc
-                                                         )
+                self.heatmapData = [line.rstrip() for line in fd]
+            self.heatmapFileName = xyzCSVFileOrArr
+        
+        if reducer not in REDUCERS:
+            raise ValueError('Heatmap reducer must be one of %s, not %s' % (', '.join(REDUCERS), str(reducer)))
+        
+        # Extrema, and other statistics, in one chunked pass.
+        # For maxCells, also count distinct x and y:
+        # A HeatmapState already has the statistics:
+        if maxCells is not None and binning is None:
+            distinctCounters = (DistinctCounter(maxCells), DistinctCounter(maxCells))
+        else:
+            distinctCounters = ()
+        if self.state is not None:
+            self.statistics = XYZStatistics.fromJSON(self.state.statistics.toJSON())
+            if distinctCounters:
+                distinctCounters = self.state.distinctCounters(maxCells)
+        else:
+            self.statistics = XYZStatistics()
+            for rowChunk in self.iterDataChunks(ChartMaker.INGEST_ROWS_PER_CHUNK):
+                columns = parseXYZColumns(rowChunk, fieldSep=fieldSep, kinds=self.statistics.kinds)
+                self.statistics.update(columns)
+                for (column, distinctCounter) in zip(columns, distinctCounters):
+                    distinctCounter.update(column.asNumbers())
+        if self.statistics.numMissing > 0:
+            self.warning('Data contains %d empty, or otherwise non-float/int x,y, or z values' % self.statistics.numMissing)
+        if distinctCounters:
+            # Text axes are not binned, and have one value per category:
+            (numXValues, numYValues) = [counter.count if categories is None else len(categories)
+                                        for (counter, categories) in zip(distinctCounters, self.statistics.categories)]
+            binning = chooseBinCounts(numXValues, numYValues, maxCells,
+                                      keepX=self.statistics.categories[0] is not None,
+                                      keepY=self.statistics.categories[1] is not None)
+        self.grid = None if binning is None else self.aggregate(binning[0], binning[1], reducer)
+        (xmin, xmax, ymin, ymax, zmin, zmax) = [self.pythonToJavaScriptType(extreme)  # @UnusedVariable
+                                                for extreme in self.statistics.extrema()]
+
+        # pythonToJavaScriptType() returns dates as JavaScript source (JsRaw);
+        # other strings are extremes of text columns, for which
+        # Highcharts determines the axis range:
+        (xmin, xmax, ymin, ymax) = [None if isinstance(extreme, str) and not isinstance(extreme, JsRaw) else extreme
+                                    for extreme in (xmin, xmax, ymin, ymax)]
 
-        self.createViz(type="'heatmap'",
-                       margin=[60,10,80,50])
+        self.options['chart'] = {'type' : 'heatmap',
+                                 'margin' : [60,10,80,50]
+                                 }
         
-        self.addDictItem('data', csv="document.getElementById('csv').innerHTML")
+        if self.payloadMode == 'csv':
+            self.options['data'] = {'csv' : JsRaw("document.getElementById('%s_csv').innerHTML" % self.internalChartName)}
         
         if len(chartTitle) > 0:
-            self.addDictItem('title', 
-                             text="'%s'" % chartTitle,
-                             align="'left'",
-                             x=40
-                             )
+            self.options['title'] = {'text' : chartTitle,
+                                     'align' : 'left',
+                                     'x' : 40
+                                     }
             
         if len(chartSubtitle) > 0:
-            self.addDictItem('subtitle', 
-                             text="'%s'" % chartSubtitle,
-                             align="'left'",
-                             x=40
-                             )
+            self.options['subtitle'] = {'text' : chartSubtitle,
+                                        'align' : 'left',
+                                        'x' : 40
+                                        }
             
         
-        self.addDictItem('tooltip',
-            backgroundColor='null',
-            borderWidth=0,
-            distance=10,
-            shadow='false',
-            useHTML='true',
-            style=self.makeDictStr(padding=0, color="'black'")
-            )
+        self.options['tooltip'] = {'backgroundColor' : None,
+                                   'borderWidth' : 0,
+                                   'distance' : 10,
+                                   'shadow' : False,
+                                   'useHTML' : True,
+                                   'style' : {'padding' : 0, 'color' : 'black'}
+                                   }
         
         xAxis = Axis(axisDir='x', 
-                     argDict={'showLastLabel': 'false',
+                     argDict={'showLastLabel': False,
                               'tickLength' : ChartMaker.TICKLENGTH,
                               'tickWidth'  : ChartMaker.TICKWITH,
-                               'labels' : self.makeDictStr(align="'left'",
-                                                           x=5,
-                                                           format="''" if len(xAxisLabelSuffix) == 0 else "'{value}%s'" % xAxisLabelSuffix
-                                                           ),  
-                            'title' : "{text: 'foo'}",                            
+                              'labels' : {'align' : 'left',
+                                          'x' : 5,
+                                          'format' : '' if len(xAxisLabelSuffix) == 0 else '{value}%s' % xAxisLabelSuffix
+                                          },  
+                              'title' : {'text' : None if len(xAxisTitle) == 0 else xAxisTitle},
                               'min' : xmin,
                               'max' : xmax
                              }
                      )
         yAxis = Axis(axisDir='y',
-        			 argDict = {'title' : self.makeDictStr(text='null' if len(yAxisTitle) == 0 else "'%s'" % yAxisTitle),
-                                'labels': self.makeDictStr(format="'{value}%s'" % yLabelSuffix),
+                     argDict = {'title' : {'text' : None if len(yAxisTitle) == 0 else yAxisTitle},
+                                'labels': {'format' : '{value}%s' % yLabelSuffix},
                                 'minPadding'  : 0,
                                 'maxPadding'  : 0,
-                                'startOnTick' : 'false',
-                                'endOnTick'   : 'false',
+                                'startOnTick' : False,
+                                'endOnTick'   : False,
                                 'min'         : ymin,
                                 'max'         : ymax,
-                                'reversed'    : 'true'
+                                'reversed'    : True
                                }
-        			     
-        			 )
-
-
-        self.add(str(xAxis) + ',')
-        self.add(str(yAxis) + ',')
-        self.add('colorAxis: {' +\
-                         "stops: [ " +\
-                         "[0, '#3060cf']," +\
-                         "[0.5, '#fffbbc']," +\
-                         "[0.9, '#c4463a']," +\
-                         "[1, '#c4463a']," +\
-                         "]," +\
-                         "min: -15,"
-                         "max: 25," +\
-                         "startOnTick: false," +\
-                         "endOnTick: false," +\
-                         "labels: {format: '{value}%s'}" % colorAxisLabelSuffix +\
-                         "},"
-                         )
+                     )
 
-        self.add("series: [{" +\
-                 "borderWidth: 0,"  +\
-                 "nullColor: '#EFEFEF'," +\
-                 "colsize: 24 * 36e5," +\
-                 "tooltip: {" +\
-                    "headerFormat: 'Temperature<br/>'," +\
-                     "pointFormat: '{point.x:%e %b, %Y} {point.y}:00: <b>{point.value} </b>'" +\
-                    "}" +\
-                 "}]"
-                 )
-        
+
+        # Dates may be sent as numbers, which the data 
+        # module would not recognize as dates:
+        if self.statistics.kinds[0] == ColumnKind.DATE:
+            xAxis.axisDict['type'] = 'datetime'
+        # Text x or y are sent as codes into the axis' categories:
+        for (axis, categories) in zip((xAxis, yAxis), self.statistics.categories):
+            if categories is not None:
+                axis.axisDict['categories'] = categories.labels
+                (axis.axisDict['min'], axis.axisDict['max']) = (0, max(0, len(categories) - 1))
+
+        self.options['xAxis'] = xAxis
+        self.options['yAxis'] = yAxis
+        (colorMin, colorMax, colorStops) = self.colorAxisScale(colorPercentiles, quantileStops)
+        self.options['colorAxis'] = {'stops' : colorStops,
+                                     'min' : colorMin,
+                                     'max' : colorMax,
+                                     'startOnTick' : False,
+                                     'endOnTick' : False,
+                                     'labels' : {'format' : '{value}%s' % colorAxisLabelSuffix}
+                                     }
+
+        self.options['series'] = [{'borderWidth' : 0,
+                                   'nullColor' : '#EFEFEF',
+                                   'colsize' : JsRaw('24 * 36e5'),
+                                   'tooltip' : {'headerFormat' : 'Temperature<br/>',
+                                                'pointFormat' : '{point.x:%e %b, %Y} {point.y}:00: <b>{point.value} </b>'
+                                                }
+                                   }]
+        if ColumnKind.TEXT in self.statistics.kinds[:2]:
+            self.options['tooltip']['formatter'] = JsRaw(Heatmap.CATEGORY_TOOLTIP_FORMATTER)
+            del self.options['series'][0]['tooltip']
+        if self.statistics.categories[0] is not None:
+            # One column per category code:
+            self.options['series'][0]['colsize'] = 1
+        if renderInWorker:
+            # Read by heatmapHighchartsPlugin.js:
+            self.options['series'][0]['renderInWorker'] = True
+        if self.grid is not None:
+            series = self.options['series'][0]
+            series['colsize'] = self.grid.xBinWidth
+            series['rowsize'] = self.grid.yBinWidth
+        if self.payloadMode == 'columnar':
+            self.scriptDependencies.append('webreportsData.js')
+            series = self.options['series'][0]
+            series['data'] = JsRaw("WebReports.heatmapPoints('%s')" % self.internalChartName)
+            # Highcharts' turbo mode mistakes [x, y, value]
+            # arrays for [x, [y, value]]:
+            series['turboThreshold'] = 0
+
+    def colorAxisScale(self, colorPercentiles=None, quantileStops=False):
+        '''
+        Return the range and the stops of the color axis. The
+        quantiles come from the t-digest of the z values, or for 
+        binned data, from the values of the grid cells, since sums 
+        and counts leave the range of the raw values. For data 
+        without numeric values the range is left to Highcharts.
+        :param colorPercentiles: percentiles at the ends of the axis;
+            None: the smallest and largest value
+        :type colorPercentiles: {(float, float) | None}
+        :param quantileStops: whether to place the stops of COLOR_STOPS
+            at the corresponding quantiles between the ends
+        :type quantileStops: bool
+        :return: smallest value, largest value, and stops of the axis
+        :rtype: ({float | None}, {float | None}, [[float, String]])
+        '''
+        stops = [list(stop) for stop in Heatmap.COLOR_STOPS]
+        if self.grid is not None:
+            gridValues = self.grid.cells()[2]
+            gridValues = gridValues[~np.isnan(gridValues)]
+            if len(gridValues) == 0:
+                return (None, None, stops)
+            quantile = lambda q: float(np.percentile(gridValues, 100.0 * q))
+        elif self.statistics.kinds[2] == ColumnKind.NUMERIC and self.statistics.zDigest.count > 0:
+            quantile = self.statistics.zDigest.quantile
+        else:
+            return (None, None, stops)
+        (lowQuantile, highQuantile) = (0.0, 1.0) if colorPercentiles is None else \
+                                      (colorPercentiles[0] / 100.0, colorPercentiles[1] / 100.0)
+        (low, high) = (quantile(lowQuantile), quantile(highQuantile))
+        if quantileStops and high > low:
+            for stop in stops:
+                stopValue = quantile(lowQuantile + stop[0] * (highQuantile - lowQuantile))
+                stop[0] = min(1.0, max(0.0, (stopValue - low) / (high - low)))
+        return (low, high, stops)
+
+    def aggregate(self, xBins, yBins, reducer):
+        '''
+        Aggregate the heatmap data into a grid, reading
+        it one chunk at a time; a HeatmapState reads only
+        the rows appended since its grid was last used.
+        A text axis gets one bin per category, centered on
+        the category's code, whatever its number of bins.
+        :param xBins: number of bins along x
+        :type xBins: int
+        :param yBins: number of bins along y
+        :type yBins: int
+        :param reducer: one of binning.REDUCERS
+        :type reducer: String
+        :rtype: GridAggregator
+        '''
+        extrema = [self.datetimeToJavaScriptMillis(extreme) if isinstance(extreme, datetime.datetime)
+                   else (0 if extreme is None else extreme)
+                   for extreme in self.statistics.extrema()[:4]]
+        (ranges, numBins) = ([], [])
+        for (axisIndex, axisBins) in enumerate((xBins, yBins)):
+            categories = self.statistics.categories[axisIndex]
+            if categories is None:
+                ranges.append(tuple(extrema[2 * axisIndex:2 * axisIndex + 2]))
+                numBins.append(axisBins)
+            else:
+                ranges.append((-0.5, max(1, len(categories)) - 0.5))
+                numBins.append(max(1, len(categories)))
+        if self.state is not None:
+            # The state keeps the grid up to date:
+            return self.state.grid(ranges[0], ranges[1], numBins[0], numBins[1], reducer)
+        grid = GridAggregator(ranges[0], ranges[1], numBins[0], numBins[1], reducer=reducer)
+        for (xCol, yCol, valueCol, _) in self.iterParsedChunks(ChartMaker.INGEST_ROWS_PER_CHUNK):
+            grid.update(xCol, yCol, valueCol)
+        return grid
+
+    def iterDivSource(self):
+        '''
+        Yield the chart's <div>, followed by the heatmap
+        data: inline in a hidden <pre> in csv payload mode,
+        else as pre-parsed columns. Data are processed
+        a chunk of lines at a time, rather than all at once.
+        :return: successive pieces of the chart's <body> HTML
+        :rtype: Generator(String)
+        '''
+        yield ChartMaker.CHART_DIV_HEATMAP % self.getInternalName()
+        if self.sidecarSrc is not None:
+            # Data are in the sidecar file
+            return
+        if self.payloadMode == 'columnar':
+            for chunk in self.iterColumnarPayload():
+                yield chunk
+            return
+        yield ChartMaker.HEATMAP_CSV_START % self.getInternalName()
+        for chunk in self.iterCSVChunks():
+            yield chunk
+        yield '\n</pre>\n'
+
+    def iterCSVChunks(self):
+        '''
+        Yield the lines of iterDataLines(), joined into
+        chunks of STREAM_ROWS_PER_CHUNK lines.
+        :rtype: Generator(String)
+        '''
+        lines = self.iterDataLines()
+        separator = ''
+        while True:
+            chunk = list(islice(lines, ChartMaker.STREAM_ROWS_PER_CHUNK))
+            if not chunk:
+                break
+            yield separator + '\n'.join(chunk)
+            separator = '\n'
+
+    def hasSidecarData(self):
+        return True
+
+    def iterSidecarPayload(self):
+        '''
+        Yield the heatmap data for the sidecar file: the
+        CSV text as a JavaScript string in csv payload mode,
+        else the columnar payload object.
+        :rtype: Generator(String)
+        '''
+        if self.payloadMode == 'columnar':
+            for chunk in self.iterPayloadJSON():
+                yield chunk
+            return
+        yield '"'
+        for chunk in self.iterCSVChunks():
+            # Without the quotes json.dumps() adds:
+            yield json.dumps(chunk)[1:-1]
+        yield '"'
+
+    def sidecarOptions(self):
+        '''
+        Return the option tree for use with a sidecar. In
+        csv payload mode, the data module gets the CSV from
+        webreportsData.js instead of the page. Columnar data
+        are found by WebReports.heatmapPoints() either way.
+        :rtype: {String : <any>}
+        '''
+        if self.payloadMode == 'columnar':
+            return self.options
+        options = dict(self.options)
+        options['data'] = {'csv' : JsRaw("WebReports.getCSV('%s')" % self.internalChartName)}
+        return options
+
+    def iterColumnarPayload(self):
+        '''
+        Yield the <script> element with the heatmap's data as
+        pre-parsed columns. See iterPayloadJSON().
+        :return: successive pieces of the payload element
+        :rtype: Generator(String)
+        '''
+        yield ChartMaker.HEATMAP_PAYLOAD_START % self.getInternalName()
+        for chunk in self.iterPayloadJSON():
+            yield chunk
+        yield ChartMaker.HEATMAP_PAYLOAD_END
+
+    def iterPayloadJSON(self):
+        '''
+        Yield the heatmap's data as a JSON document of 
+        pre-parsed columns, PAYLOAD_ROWS_PER_CHUNK rows per chunk.
+        See webreportsData.js for the format.
+        :return: successive pieces of the JSON document
+        :rtype: Generator(String)
+        '''
+        yield '{"chunks": ['
+        separator = ''
+        numBadRows = 0
+        if self.grid is not None:
+            parsedChunks = [self.grid.cells() + (0,)]
+        else:
+            parsedChunks = self.iterParsedChunks(ChartMaker.PAYLOAD_ROWS_PER_CHUNK)
+        for (xCol, yCol, valueCol, numBadChunkRows) in parsedChunks:
+            numBadRows += numBadChunkRows
+            yield separator + json.dumps({'x' : ChartMaker.encodeColumn(xCol),
+                                          'y' : ChartMaker.encodeColumn(yCol),
+                                          'value' : ChartMaker.encodeColumn(valueCol, 
+                                                                            quantum=self.valueQuantum, 
+                                                                            floatType='f32')
+                                          })
+            separator = ','
+        if numBadRows > 0:
+            self.warning('Heatmap data contain %d rows with missing or unparsable x or y; rows omitted' % numBadRows)
+        yield ']}'
+
+    def iterDataLines(self):
+        '''
+        Yield all lines of the heatmap data, including
+        header lines. Streamed from the data file if the 
+        lines are not held in heatmapData. Binned data,
+        data from a HeatmapState, and data with text x or y,
+        are yielded as a header line plus one line of numbers 
+        per grid cell or row; text becomes integer codes
+        into the axis' categories.
+        :rtype: Generator(String)
+        '''
+        isCategorical = ColumnKind.TEXT in self.statistics.kinds[:2]
+        if self.grid is not None or self.state is not None or isCategorical:
+            yield 'x,y,value'
+            if self.grid is not None:
+                columnChunks = [self.grid.cells()]
+            else:
+                columnChunks = (chunk[:3] for chunk in self.iterParsedChunks(ChartMaker.STREAM_ROWS_PER_CHUNK))
+            for columns in columnChunks:
+                columns = [column.astype(np.int64) if categories is not None else column
+                           for (column, categories) in zip(columns, self.statistics.categories + [None])]
+                for (x, y, value) in zip(*[column.tolist() for column in columns]):
+                    yield '%r,%r,%s' % (x, y, '' if value != value else repr(value))
+            return
+        if self.heatmapData is not None:
+            for line in self.heatmapData:
+                yield line
+            return
+        with open(self.heatmapFileName, 'r') as fd:
+            for line in fd:
+                yield line.rstrip()
+
+    def iterDataChunks(self, rowsPerChunk):
+        '''
+        Yield the heatmap data without header lines, in
+        lists of at most rowsPerChunk lines.
+        :param rowsPerChunk: maximum number of lines per list
+        :type rowsPerChunk: int
+        :rtype: Generator([String])
+        '''
+        if self.heatmapData is None:
+            for chunk in iterRowChunks(self.heatmapFileName, rowsPerChunk, rowsToSkip=self.rowsToSkip):
+                yield chunk
+            return
+        for startIndex in range(self.rowsToSkip, len(self.heatmapData), rowsPerChunk):
+            yield self.heatmapData[startIndex:startIndex + rowsPerChunk]
+
+    def iterParsedChunks(self, rowsPerChunk):
+        '''
+        Yield the heatmap data as numeric x, y, and value
+        columns, in chunks of at most rowsPerChunk rows, with 
+        the number of rows skipped in each chunk; see parseColumns(). 
+        Data from a HeatmapState need no parsing.
+        :param rowsPerChunk: maximum number of rows per chunk
+        :type rowsPerChunk: int
+        :rtype: Generator((np.ndarray, np.ndarray, np.ndarray, int))
+        '''
+        if self.state is not None:
+            for columns in self.state.iterColumnChunks(rowsPerChunk):
+                yield columns + (0,)
+            return
+        for chunk in self.iterDataChunks(rowsPerChunk):
+            yield self.parseColumns(chunk)
+
+    def parseColumns(self, lines):
+        '''
+        Parse CSV lines into x, y, and value columns. Dates
+        in x or y become millisecond timestamps, text becomes
+        codes into the statistics' category tables. Rows whose 
+        x or y are missing, or not of their column's kind, are
+        skipped; values that are not numbers become NaN.
+        :param lines: CSV lines of x,y,value
+        :type lines: [String]
+        :return: x, y, and value columns, and the number of skipped rows
+        :rtype: (np.ndarray, np.ndarray, np.ndarray, int)
+        '''
+        columns = parseXYZColumns(lines, fieldSep=self.fieldSep, kinds=self.statistics.kinds)
+        (xCol, yCol, valueCol) = [column.asNumbers(categories) 
+                                  for (column, categories) in zip(columns, self.statistics.categories + [None])]
+        badRows = np.isnan(xCol) | np.isnan(yCol)
+        numBadRows = int(np.count_nonzero(badRows))
+        if numBadRows > 0:
+            goodRows = ~badRows
+            return (xCol[goodRows], yCol[goodRows], valueCol[goodRows], numBadRows)
+        return (xCol, yCol, valueCol, 0)
         
 # ---------------------------------------  Support Classes ----------------------------        
 class Axis(object):
@@ -718,20 +2017,32 @@ class Axis(object):
         :type dataSeriesArr: [DataSeries]
         :param labelArr: axis labels
         :type labelArr: [String]
-        :param argDict: dictionary of additional arg/value pairs for the axis
+        :param argDict: dictionary of additional arg/value pairs for the axis.
+            String values are taken to be JavaScript source; all
+            other values are option (sub)trees.
         :type argDict: {Any : Any} 
         '''
         self.axisDict = {}
         self.axisDir = axisDir
         if titleText is not None:
-            self.axisDict['title'] = "{text: '%s'}" % titleText
+            self.axisDict['title'] = {'text' : titleText}
         if labelArr is not None:
-            self.axisDict['categories'] = str(labelArr) + '\n'
+            self.axisDict['categories'] = list(labelArr)
         
         # Merge the arbitrary-args dictionary with
         # the other axis data:
         if argDict is not None:
-            self.axisDict = dict(list(self.axisDict.items()) + list(argDict.items()))
+            for key,val in argDict.items():
+                self.axisDict[key] = JsRaw(val) if isinstance(val, str) else val
+
+    def asOptionTree(self):
+        '''
+        Return the axis options as an option tree,
+        suitable as value of a chart's 'xAxis' or 'yAxis'
+        option.
+        :rtype: {String : <any>}
+        '''
+        return self.axisDict
 
     def __str__(self):
         '''
@@ -740,16 +2051,8 @@ class Axis(object):
         :return: the piece of a Highchart datastructure that defines an axis
         :rtype: String
         '''
-        res = ''
-        if self.axisDir == 'x':
-            res += 'xAxis: {\n'
-        else:
-            res += 'yAxis: {\n'
-            
-        for key in self.axisDict.keys():
-            res += key + ': ' + str(self.axisDict[key]) + ','
-        res = res[:-1] + '}'
-        return res
+        return '%sAxis: %s' % ('x' if self.axisDir == 'x' else 'y',
+                               JsEncoder().encode(self))
 
     
 class BasicDict(MutableMapping):
@@ -786,11 +2089,33 @@ class DataSeries(BasicDict):
     Holds one data series
     '''
     
-    def __init__(self, dataArr, legendLabel='', seriesType=None):
+    def __init__(self, dataArr, legendLabel='', seriesType=None, downsampleTo=None, precision=None):
+        '''
+        Numeric data may be held in an array.array or NumPy array,
+        which is kept as it is rather than copied, and serialized 
+        in bulk by JsEncoder.encodeNumbers(). 
+        
+        :param dataArr: y values, or [x, y] pairs with ascending x
+        :type dataArr: {[<any>] | [[<any>, <any>]] | array.array | np.ndarray}
+        :param legendLabel: name of the series in the legend
+        :type legendLabel: String
+        :param seriesType: Highcharts series type, if different from the chart's
+        :type seriesType: {String | None}
+        :param downsampleTo: if given, the series is reduced to at most
+            this many points before it goes into the page; see
+            downsampling.lttbIndices(). Plain y values then become
+            [index, y] pairs, which keeps them at their category.
+        :type downsampleTo: {int | None}
+        :param precision: if given, numbers are rounded to this many 
+            decimal places in the page
+        :type precision: {int | None}
+        '''
         super(DataSeries, self).__init__()
         
         self['name'] = legendLabel
         self['data'] = dataArr
+        self.downsampleTo = downsampleTo
+        self.precision = precision
         
         if seriesType is not None:
             self['type'] = seriesType
@@ -800,6 +2125,56 @@ class DataSeries(BasicDict):
     
     def data(self):
         return self['data']
+
+    def copy(self):
+        '''
+        :return: a series with the same options, which can be
+            changed without changing this one; the data are shared
+        :rtype: DataSeries
+        '''
+        series = DataSeries(self['data'], downsampleTo=self.downsampleTo, precision=self.precision)
+        series.store = dict(self.store)
+        return series
+
+    def asOptionTree(self):
+        '''
+        Return the series as an option tree, suitable
+        as an element of a chart's 'series' option.
+        :rtype: {String : <any>}
+        '''
+        data = self['data'] if self.downsampleTo is None else self.downsampledData()
+        if self.precision is not None:
+            data = JsRaw(JsEncoder.encodeNumbers(data, precision=self.precision))
+        tree = {'name' : self['name'],
+                'data' : data
+                }
+        for key in ('type', 'pointStart', 'pointInterval'):
+            if key in self:
+                tree[key] = self[key]
+        return tree
+
+    def downsampledData(self):
+        '''
+        Return the series data reduced to at most downsampleTo
+        points by Largest-Triangle-Three-Buckets, as an array
+        of [x, y] rows. Missing y values are NaN. Plain y values
+        of a series with pointStart and pointInterval get the x
+        of their point in time.
+        :rtype: np.ndarray
+        '''
+        data = self['data']
+        if len(data) <= self.downsampleTo:
+            return data
+        dataArr = np.asarray(data, dtype=np.float64)
+        if dataArr.ndim == 2:
+            (x, y) = dataArr.T
+        else:
+            y = dataArr
+            x = np.arange(len(y), dtype=np.float64)
+            if 'pointInterval' in self:
+                x = self['pointStart'] + x * self['pointInterval']
+        indices = lttbIndices(x, y, self.downsampleTo)
+        return np.column_stack((x[indices], y[indices]))
         
     def __str__(self):
         '''
@@ -808,10 +2183,7 @@ class DataSeries(BasicDict):
         :return: the piece of a Highchart datastructure that defines one data series
         :rtype: String
         '''
-        res = ''
-        res += "{name: '%s',\n" % self['name']
-        res += "data: %s}" % str(self['data']) 
-        return res
+        return JsEncoder().encode(self)
         
 class Tooltip(object):
     '''
@@ -830,6 +2202,15 @@ class Tooltip(object):
             self.tooltipDict['shared'] = 'true'
         if useHTML is not None:
             self.tooltipDict['useHTML'] = 'true'
+
+    def asOptionTree(self):
+        '''
+        Return the tooltip as an option tree, suitable
+        as value of a chart's or series' 'tooltip' option.
+        The tooltip values are JavaScript source.
+        :rtype: {String : JsRaw}
+        '''
+        return dict((key, JsRaw(val)) for key,val in self.tooltipDict.items())
                             
     def __str__(self):
         '''
@@ -839,9 +2220,344 @@ class Tooltip(object):
         :rtype: String
         
         '''
-        res = 'tooltip: {'
-        for key in self.tooltipDict.keys():
-            res += key + ': ' + self.tooltipDict[key] + ','
-        res = res[:-1] + '}'            
-        return res       
-            
\ No newline at end of file
+        return 'tooltip: ' + JsEncoder().encode(self)
+
+# ---------------------------------------  JavaScript Literal Encoding ----------------------------        
+
+class JsRaw(str):
+    '''
+    A piece of JavaScript source inside an option tree.
+    Emitted verbatim by JsEncoder, as opposed to plain
+    strings, which become JavaScript string literals.
+    Ex.: JsRaw("document.getElementById('csv').innerHTML")
+    '''
+    __slots__ = ()
+
+class JsFragment(object):
+    '''
+    Key under which ChartMaker.add() keeps a run of 
+    verbatim source substrings in an option tree. 
+    Each instance is a distinct key.
+    '''
+    __slots__ = ()
+
+class JsEncoder(object):
+    '''
+    Serializes an option tree into JavaScript source in
+    a single pass. Trees consist of dicts (JavaScript objects),
+    lists and tuples (arrays), strings, numbers, booleans, None,
+    dates, JsRaw source, and objects with an asOptionTree()
+    method, such as Axis and DataSeries.
+    '''
+    
+    IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_$][A-Za-z0-9_$]*$')
+    
+    # Characters that must be escaped inside a single-quoted
+    # JavaScript string literal:
+    STRING_ESCAPES = {ord('\\') : u'\\\\',
+                      ord("'")  : u"\\'",
+                      ord('\n') : u'\\n',
+                      ord('\r') : u'\\r',
+                      0x2028    : u'\\u2028',
+                      0x2029    : u'\\u2029'
+                      }
+    
+    def __init__(self, dateConverter=None):
+        '''
+        :param dateConverter: function that turns a datetime into
+            JavaScript source. Defaults to ChartMaker.pythonToJavaScriptType
+        :type dateConverter: {function | None}
+        '''
+        if dateConverter is None:
+            dateConverter = ChartMaker.pythonToJavaScriptType
+        self.dateConverter = dateConverter
+    
+    def encode(self, value):
+        '''
+        Return the JavaScript source for the given option (sub)tree.
+        :param value: option tree to serialize
+        :type value: <any>
+        :rtype: String
+        '''
+        parts = []
+        self._encode(value, parts.append)
+        return ''.join(parts)
+    
+    def encodeMembers(self, optionDict):
+        '''
+        Return the JavaScript source of the members of
+        an object, without the enclosing braces.
+        :param optionDict: option tree whose members are to be serialized
+        :type optionDict: dict
+        :rtype: String
+        '''
+        parts = []
+        self._encodeMembers(optionDict, parts.append)
+        return ''.join(parts)
+
+    def quote(self, aString):
+        '''
+        Return aString as a single-quoted JavaScript string
+        literal. Sequences '</' are escaped, so that literals
+        may safely appear inside <script> elements.
+        :param aString: string to quote
+        :type aString: String
+        :rtype: String
+        '''
+        return "'" + aString.translate(JsEncoder.STRING_ESCAPES).replace('</', '<\\/') + "'"
+        
+    def _encode(self, value, emit):
+        # Ordered by frequency in option trees. JsRaw
+        # must be checked before str, bool before int:
+        if isinstance(value, JsRaw):
+            emit(value)
+        elif isinstance(value, str):
+            emit(self.quote(value))
+        elif value is None:
+            emit('null')
+        elif value is True:
+            emit('true')
+        elif value is False:
+            emit('false')
+        elif isinstance(value, int):
+            emit(str(value))
+        elif isinstance(value, float):
+            emit(self._encodeFloat(value))
+        elif isinstance(value, dict):
+            emit('{')
+            self._encodeMembers(value, emit)
+            emit('}')
+        elif isinstance(value, (list, tuple)):
+            emit('[')
+            isFirst = True
+            for element in value:
+                if not isFirst:
+                    emit(',')
+                isFirst = False
+                self._encode(element, emit)
+            emit(']')
+        elif isinstance(value, datetime.datetime):
+            emit(self.dateConverter(value))
+        elif isinstance(value, datetime.date):
+            emit(self.dateConverter(datetime.datetime(value.year, value.month, value.day)))
+        elif isinstance(value, (np.ndarray, array.array)):
+            emit(self.encodeNumbers(value))
+        elif hasattr(value, 'asOptionTree'):
+            self._encode(value.asOptionTree(), emit)
+        elif isinstance(value, numbers.Integral):
+            emit(str(int(value)))
+        elif isinstance(value, numbers.Real):
+            emit(self._encodeFloat(float(value)))
+        else:
+            raise TypeError('Cannot encode %s as JavaScript' % type(value).__name__)
+
+    @classmethod
+    def encodeNumbers(cls, values, precision=None):
+        '''
+        Return a JavaScript array literal of the given numbers,
+        formatted in bulk rather than one option tree element at 
+        a time. Two-dimensional input, such as [x, y] pairs, becomes
+        an array of arrays. NaN, infinities, and None become null; 
+        datetime64 values become milliseconds since the epoch.
+        Floats are written in the shortest form that reads back
+        as the same number of the array's type, after rounding 
+        to precision decimal places if precision is given. Columns
+        of integral floats are written as integers. 
+        :param values: numbers to encode
+        :type values: {np.ndarray | array.array | [<number>] | [[<number>]]}
+        :param precision: number of decimal places, or None for full precision
+        :type precision: {int | None}
+        :rtype: String
+        '''
+        if isinstance(values, array.array):
+            # View, rather than copy, the buffer:
+            numbersArr = np.frombuffer(values, dtype=values.typecode) if len(values) > 0 else np.empty(0)
+        elif isinstance(values, np.ndarray):
+            numbersArr = values
+        else:
+            numbersArr = np.array(values, dtype=np.float64)
+        if numbersArr.ndim == 1:
+            return '[' + ','.join(cls._formatNumbers(numbersArr, precision)) + ']'
+        columns = [cls._formatNumbers(numbersArr[:, colIndex], precision) for colIndex in range(numbersArr.shape[1])]
+        rowTemplate = '[' + ','.join(['{}'] * len(columns)) + ']'
+        return '[' + ','.join(map(rowTemplate.format, *columns)) + ']'
+
+    @classmethod
+    def _formatNumbers(cls, numbersArr, precision):
+        if numbersArr.dtype.kind == 'M':
+            numbersArr = numbersArr.astype('datetime64[ms]')
+            strings = list(map(str, numbersArr.astype(np.int64).tolist()))
+            for index in np.flatnonzero(np.isnat(numbersArr)).tolist():
+                strings[index] = 'null'
+            return strings
+        if numbersArr.dtype.kind in 'biu':
+            return map(str, numbersArr.astype(np.int64).tolist())
+        if precision is not None:
+            numbersArr = np.round(numbersArr, precision)
+        finite = np.isfinite(numbersArr)
+        finiteNumbers = numbersArr[finite]
+        if np.all(finiteNumbers == np.trunc(finiteNumbers)) and np.all(np.abs(finiteNumbers) < 2**53):
+            strings = list(map(str, np.where(finite, numbersArr, 0).astype(np.int64).tolist()))
+        elif numbersArr.dtype == np.float32 and precision is None:
+            # Shortest float32 form, not that of the float64 
+            # the value would become in a list:
+            strings = numbersArr.astype(str).tolist()
+        else:
+            strings = list(map(repr, numbersArr.astype(np.float64).tolist()))
+        for index in np.flatnonzero(~finite).tolist():
+            strings[index] = 'null'
+        return strings
+
+    def _encodeFloat(self, value):
+        # NaN and infinities are not JSON, and mean
+        # 'no value' to Highcharts:
+        if value != value or value in (float('inf'), float('-inf')):
+            return 'null'
+        return repr(value)
+
+    def _encodeMembers(self, optionDict, emit):
+        isFirst = True
+        for key,value in optionDict.items():
+            if isinstance(key, JsFragment):
+                # Run of verbatim substrings from ChartMaker.add();
+                # separating commas are added here instead:
+                source = ''.join(value).strip(' \t\r\n,')
+                if len(source) == 0:
+                    continue
+                if not isFirst:
+                    emit(',')
+                emit(source)
+            else:
+                if not isFirst:
+                    emit(',')
+                emit(key if JsEncoder.IDENTIFIER_PATTERN.match(key) else self.quote(key))
+                emit(': ')
+                self._encode(value, emit)
+            isFirst = False
+
+class SharedOptions(object):
+    '''
+    Option subtrees that several charts on one page have in
+    common, such as the plotOptions of pies, or the same axis
+    on many charts. Each such subtree goes into the page once,
+    as an element of the array SHARED_OPTIONS_VAR, and the charts
+    refer to it there instead of repeating it. Highcharts merges
+    most options into objects of its own, but it assigns to some
+    of the option objects it is given: chart.renderTo is set on
+    the chart options, and the data module replaces the entries
+    of the series array with the parsed series. The subtrees of
+    the options in UNSHARED_OPTIONS, and the subtrees that hold 
+    them, are therefore never shared.
+    '''
+    
+    # Options whose objects Highcharts modifies, or that hold data:
+    UNSHARED_OPTIONS = ('chart', 'series', 'data')
+    
+    def __init__(self, chartObjArr, minCharts, minLength):
+        '''
+        Find the subtrees to share among the given charts.
+        :param chartObjArr: the charts on one page
+        :type chartObjArr: [Subclasses of ChartMaker]
+        :param minCharts: number of charts that must have a subtree for it to be shared
+        :type minCharts: int
+        :param minLength: length of the shortest JavaScript source worth sharing
+        :type minLength: int
+        '''
+        self.encoder = JsEncoder()
+        numCharts = {}
+        for chartObj in chartObjArr:
+            sources = {}
+            self.collectSources(self.expand(chartObj.getOptionTree()), sources)
+            for source in set(sources.values()):
+                numCharts[source] = numCharts.get(source, 0) + 1
+        self.shareable = set(source for (source, count) in numCharts.items() 
+                             if count >= minCharts and len(source) >= minLength)
+        # Source of each subtree in use, in order of first use;
+        # nested shared subtrees need not all be in use:
+        self.used = []
+        self.usedIndex = {}
+
+    def substitute(self, optionTree):
+        '''
+        Return a copy of a chart's option tree in which shared 
+        subtrees are references into SHARED_OPTIONS_VAR.
+        :param optionTree: option tree of one chart
+        :type optionTree: {String : <any>}
+        :rtype: {String : <any>}
+        '''
+        tree = self.expand(optionTree)
+        sources = {}
+        self.collectSources(tree, sources)
+        return dict((key, self._substitute(value, sources)) for (key, value) in tree.items())
+
+    def declaration(self):
+        '''
+        :return: JavaScript statement that defines the shared subtrees 
+            referenced by the trees from substitute() so far
+        :rtype: String
+        '''
+        return 'var %s = [%s];\n' % (ChartMaker.SHARED_OPTIONS_VAR, ','.join(self.used))
+
+    def expand(self, value):
+        '''
+        Return a copy of an option tree that holds only dicts, lists,
+        and leaves: option objects such as Axis are replaced by their 
+        option trees. DataSeries are left as they are, since they are
+        never shared.
+        '''
+        if isinstance(value, dict):
+            return dict((key, subValue if isinstance(key, JsFragment) else self.expand(subValue)) 
+                        for (key, subValue) in value.items())
+        if isinstance(value, (list, tuple)):
+            return [self.expand(element) for element in value]
+        if hasattr(value, 'asOptionTree') and not isinstance(value, DataSeries):
+            return self.expand(value.asOptionTree())
+        return value
+
+    def collectSources(self, value, sources):
+        '''
+        Add the JavaScript source of each subtree of an expanded
+        option tree that may be shared to sources, keyed by the
+        subtree's id().
+        :return: the source of value, if value is a dict or list 
+            that may be shared, else None
+        :rtype: {String | None}
+        '''
+        if isinstance(value, dict):
+            shareable = True
+            for (key, subValue) in value.items():
+                if key in SharedOptions.UNSHARED_OPTIONS:
+                    shareable = False
+                elif not isinstance(key, JsFragment) and \
+                     self.collectSources(subValue, sources) is None and \
+                     not self.isLeaf(subValue):
+                    shareable = False
+        elif isinstance(value, list):
+            shareable = True
+            for element in value:
+                if self.collectSources(element, sources) is None and not self.isLeaf(element):
+                    shareable = False
+        else:
+            return None
+        if not shareable:
+            return None
+        source = self.encoder.encode(value)
+        sources[id(value)] = source
+        return source
+
+    def isLeaf(self, value):
+        return not isinstance(value, (dict, list, DataSeries, np.ndarray, array.array))
+
+    def _substitute(self, value, sources):
+        source = sources.get(id(value))
+        if source in self.shareable:
+            if source not in self.usedIndex:
+                self.usedIndex[source] = len(self.used)
+                self.used.append(source)
+            return JsRaw('%s[%d]' % (ChartMaker.SHARED_OPTIONS_VAR, self.usedIndex[source]))
+        if isinstance(value, dict):
+            return dict((key, subValue if isinstance(key, JsFragment) else self._substitute(subValue, sources)) 
+                        for (key, subValue) in value.items())
+        if isinstance(value, list):
+            return [self._substitute(element, sources) for element in value]
+        return value
@@ -0,0 +1,458 @@
+'''
+Created on Oct 16, 2026
+
+Vectorized parsing of delimited text rows into
+NumPy columns. Used by the chart classes in chartmaker
+for data they receive as CSV lines or files.
+'''
+import csv
+import datetime
+from itertools import islice
+import re
+
+import numpy as np
+
+from dateparsing import DateColumnParser, looksLikeDate
+from sketches import TDigest
+
+
+class ColumnKind:
+    NUMERIC = 'numeric'
+    DATE    = 'date'
+    TEXT    = 'text'
+
+class ParsedColumn(object):
+    '''
+    One column of parsed cells. The values array is float64
+    for numeric columns, datetime64[ms] for date columns, and
+    a unicode string array for text columns. The invalid
+    array is a boolean mask of cells that were missing, or
+    could not be parsed as the column's kind.
+    '''
+
+    def __init__(self, kind, values, invalid):
+        self.kind = kind
+        self.values = values
+        self.invalid = invalid
+
+    def __len__(self):
+        return len(self.values)
+
+    def numInvalid(self):
+        '''
+        :return: number of missing or unparsable cells
+        :rtype: int
+        '''
+        return int(np.count_nonzero(self.invalid))
+
+    def extrema(self, exclude=None):
+        '''
+        Return the smallest and largest valid value of
+        the column as Python quantities: float or int for
+        numeric columns, datetime.datetime for dates, and String
+        for text. (None, None) if the column has no valid cells.
+        :param exclude: optional mask of further cells to ignore
+        :type exclude: {np.ndarray | None}
+        :rtype: (<any>, <any>)
+        '''
+        ignore = self.invalid if exclude is None else self.invalid | exclude
+        valid = self.values[~ignore]
+        if len(valid) == 0:
+            return (None, None)
+        if self.kind == ColumnKind.TEXT:
+            validList = valid.tolist()
+            return (min(validList), max(validList))
+        return (toPython(valid.min()), toPython(valid.max()))
+
+    def asNumbers(self, categories=None):
+        '''
+        Return the column as float64, with dates as
+        milliseconds since the epoch, and NaN for invalid
+        cells. Text columns become their codes in categories,
+        or, without categories, all NaN.
+        :param categories: table of the labels of a text column
+        :type categories: {CategoryTable | None}
+        :rtype: np.ndarray
+        '''
+        if self.kind == ColumnKind.NUMERIC:
+            return self.values
+        if self.kind == ColumnKind.DATE:
+            numbers = self.values.astype(np.int64).astype(np.float64)
+            numbers[self.invalid] = np.nan
+            return numbers
+        if categories is not None:
+            return categories.encode(self.values, self.invalid)
+        return np.full(len(self.values), np.nan)
+
+class CategoryTable(object):
+    '''
+    Dictionary encoding of a text column: each distinct
+    label is stored once, and is represented by its index
+    in labels, its code. Labels are added in the order they
+    are first encoded; within one chunk, in sorted order.
+    '''
+
+    def __init__(self, labels=None):
+        '''
+        :param labels: labels of codes 0, 1, ...; None: no labels yet
+        :type labels: {[String] | None}
+        '''
+        self.labels = [] if labels is None else list(labels)
+        self.codes = dict((label, code) for (code, label) in enumerate(self.labels))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def encode(self, strings, invalid=None):
+        '''
+        Return the codes of strings, adding labels that
+        are not in the table yet. Each distinct string of
+        the chunk is looked up once.
+        :param strings: one chunk of the column
+        :type strings: np.ndarray
+        :param invalid: mask of cells that get no code
+        :type invalid: {np.ndarray | None}
+        :return: the codes as float64; NaN for invalid cells
+        :rtype: np.ndarray
+        '''
+        if invalid is not None and invalid.any():
+            codes = np.full(len(strings), np.nan)
+            codes[~invalid] = self.encode(strings[~invalid])
+            return codes
+        if len(strings) == 0:
+            return np.empty(0)
+        (distinct, inverse) = np.unique(strings, return_inverse=True)
+        distinctCodes = np.array([self.intern(label) for label in distinct.tolist()], dtype=np.float64)
+        return distinctCodes[inverse.reshape(-1)]
+
+    def intern(self, label):
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+
+# Syntax of numbers that float() accepts, so that
+# unparsable cells can be found without exceptions:
+NUMBER_PATTERN = re.compile(r'^\s*[-+]?((\d+\.?\d*|\.\d+)([eE][-+]?\d+)?|inf(inity)?|nan)\s*$', re.IGNORECASE)
+
+def toPython(npValue):
+    '''
+    Turn a NumPy scalar into the equivalent plain Python
+    quantity. Integral floats become int, datetime64 becomes
+    datetime.datetime.
+    :param npValue: NumPy scalar
+    :type npValue: np.generic
+    :rtype: {int | float | datetime.datetime}
+    '''
+    if isinstance(npValue, np.datetime64):
+        return npValue.astype('datetime64[ms]').astype(datetime.datetime)
+    value = npValue.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def splitColumns(rows, fieldSep=',', numCols=3):
+    '''
+    Split rows into numCols columns. Rows are either strings
+    with fields separated by fieldSep, which may be quoted as in
+    CSV, or tuples of values. Missing trailing fields are empty;
+    surplus fields are ignored.
+    :param rows: the rows to split
+    :type rows: {[String] | [tuple]}
+    :param fieldSep: field separator for string rows
+    :type fieldSep: String
+    :param numCols: number of columns to return
+    :type numCols: int
+    :return: one list of cells per column
+    :rtype: [[<any>]]
+    '''
+    if len(rows) > 0 and isinstance(rows[0], tuple):
+        fieldsList = rows
+    else:
+        # Fast path for unquoted rows that all have numCols
+        # fields: split everything at once, and slice out
+        # the columns. The total count of separators does not 
+        # tell whether some rows are short and others long, so
+        # each row's count is checked:
+        text = fieldSep.join(rows)
+        if '"' not in text and text.count(fieldSep) == len(rows) * numCols - 1 and \
+           np.all(np.char.count(np.array(rows, dtype=str), fieldSep) == numCols - 1):
+            cells = text.split(fieldSep)
+            return [cells[colIndex::numCols] for colIndex in range(numCols)]
+        fieldsList = list(csv.reader(rows, delimiter=fieldSep))
+    if set(map(len, fieldsList)) != set([numCols]):
+        padding = ('',) * numCols
+        fieldsList = [tuple(fields[:numCols]) + padding[len(fields):] for fields in fieldsList]
+    if len(fieldsList) == 0:
+        return [[] for _ in range(numCols)]
+    return [list(column) for column in zip(*fieldsList)]
+
+def parseColumn(cells, kind=None):
+    '''
+    Parse one column of cells into a ParsedColumn. Unless
+    kind is given, the column's kind is determined by its first 
+    non-empty cell. Strings that are numbers make a numeric column,
+    date strings in a format that dateparsing recognizes a date
+    column; anything else is text.
+    Python numbers and datetimes are taken as they are; None
+    and NaN cells, as in tuple rows, are missing.
+    :param cells: the column's cells
+    :type cells: [<any>]
+    :param kind: ColumnKind to parse the cells as, or None to detect it
+    :type kind: {String | None}
+    :rtype: ParsedColumn
+    '''
+    if isinstance(cells, list) and len(cells) > 0 and (not isinstance(cells[0], str) or None in cells):
+        missing = np.array([cell is None or (isinstance(cell, float) and cell != cell) for cell in cells], dtype=bool)
+        if missing.any():
+            return withMissingCells(parseColumn([cell for (cell, isMissing) in zip(cells, missing.tolist()) 
+                                                 if not isMissing], 
+                                                kind=kind), 
+                                    missing)
+    if len(cells) > 0 and not isinstance(cells[0], str):
+        cellArr = np.asarray(cells)
+        if cellArr.dtype.kind in 'biuf':
+            values = cellArr.astype(np.float64)
+            return ParsedColumn(ColumnKind.NUMERIC, values, np.isnan(values))
+        if cellArr.dtype.kind == 'M' or isinstance(cells[0], datetime.date):
+            values = cellArr.astype('datetime64[ms]')
+            return ParsedColumn(ColumnKind.DATE, values, np.isnat(values))
+        cells = cellArr.astype(str).tolist()
+
+    if kind is None:
+        kind = detectKind(cells)
+    if kind == ColumnKind.NUMERIC:
+        values = parseNumbers(cells)
+        return ParsedColumn(kind, values, np.isnan(values))
+    if kind == ColumnKind.DATE:
+        values = parseDates(cells)
+        return ParsedColumn(kind, values, np.isnat(values))
+    strings = np.array(cells, dtype=str)
+    return ParsedColumn(kind, strings, np.char.str_len(np.char.strip(strings)) == 0)
+
+def withMissingCells(column, missing):
+    '''
+    Return column with invalid cells inserted where
+    missing is True.
+    :param column: the cells that are not missing
+    :type column: ParsedColumn
+    :param missing: mask of the missing cells among all cells
+    :type missing: np.ndarray
+    :rtype: ParsedColumn
+    '''
+    if column.kind == ColumnKind.NUMERIC:
+        values = np.full(len(missing), np.nan)
+    elif column.kind == ColumnKind.DATE:
+        values = np.full(len(missing), np.datetime64('NaT'), dtype='datetime64[ms]')
+    else:
+        values = np.full(len(missing), '', dtype=column.values.dtype)
+    values[~missing] = column.values
+    invalid = np.ones(len(missing), dtype=bool)
+    invalid[~missing] = column.invalid
+    return ParsedColumn(column.kind, values, invalid)
+
+def detectKind(strings):
+    '''
+    Return the ColumnKind of a column of strings,
+    judging by its first non-empty cell.
+    :param strings: cells of one column
+    :type strings: [String]
+    :rtype: String
+    '''
+    for cell in strings:
+        cell = cell.strip()
+        if len(cell) == 0:
+            continue
+        if NUMBER_PATTERN.match(cell):
+            return ColumnKind.NUMERIC
+        if looksLikeDate(cell):
+            return ColumnKind.DATE
+        return ColumnKind.TEXT
+    return ColumnKind.NUMERIC
+
+def parseNumbers(strings):
+    '''
+    Convert a column of strings to float64. Empty and
+    non-numeric cells become NaN.
+    :param strings: cells of one column
+    :type strings: [String]
+    :rtype: np.ndarray
+    '''
+    try:
+        # Fast path: every cell is a number:
+        return np.array(strings, dtype=np.float64)
+    except ValueError:
+        pass
+    # Parse each distinct cell once:
+    (distinct, inverse) = np.unique(np.array(strings, dtype=str), return_inverse=True)
+    distinctValues = np.array([float(cell) if NUMBER_PATTERN.match(cell) else np.nan for cell in distinct.tolist()],
+                              dtype=np.float64)
+    return distinctValues[inverse.reshape(-1)]
+
+def parseDates(strings):
+    '''
+    Convert a column of strings to datetime64[ms], in UTC.
+    The column's format is detected from its first date; see
+    dateparsing.DateColumnParser. Unparsable cells become NaT.
+    :param strings: cells of one column
+    :type strings: [String]
+    :rtype: np.ndarray
+    '''
+    return DateColumnParser.forColumn(strings).parseColumn(strings)
+
+def parseXYZColumns(rows, fieldSep=',', rowsToSkip=0, kinds=(None, None, None)):
+    '''
+    Parse rows of x, y, and z into three ParsedColumns.
+    :param rows: CSV lines, or three-tuples
+    :type rows: {[String] | [tuple]}
+    :param fieldSep: field separator of CSV lines
+    :type fieldSep: String
+    :param rowsToSkip: number of header rows
+    :type rowsToSkip: int
+    :param kinds: ColumnKind of x, y, and z; None elements are detected
+    :type kinds: (String, String, String)
+    :rtype: (ParsedColumn, ParsedColumn, ParsedColumn)
+    '''
+    cellColumns = splitColumns(rows[rowsToSkip:], fieldSep=fieldSep, numCols=3)
+    return tuple(parseColumn(cells, kind=kind) for (cells, kind) in zip(cellColumns, kinds))
+
+def iterRowChunks(fileName, rowsPerChunk, rowsToSkip=0):
+    '''
+    Read a text file in chunks of at most rowsPerChunk
+    lines, without trailing whitespace. Only one chunk is 
+    in memory at any time.
+    :param fileName: file to read
+    :type fileName: String
+    :param rowsPerChunk: maximum number of lines per chunk
+    :type rowsPerChunk: int
+    :param rowsToSkip: number of header lines to skip
+    :type rowsToSkip: int
+    :return: successive lists of lines
+    :rtype: Generator([String])
+    '''
+    with open(fileName, 'r') as fd:
+        for _ in islice(fd, rowsToSkip):
+            pass
+        while True:
+            chunk = [line.rstrip() for line in islice(fd, rowsPerChunk)]
+            if not chunk:
+                return
+            yield chunk
+
+class XYZStatistics(object):
+    '''
+    Statistics of x/y/z data that arrive in chunks: the
+    extrema of each column, the count and sum of the z
+    values, and a t-digest of numeric z values. Labels of
+    text x and y columns are collected in CategoryTables,
+    in the categories attribute. Rows with a missing or
+    unparsable cell in any column are counted in numMissing,
+    and otherwise ignored. The first chunk fixes the kind of 
+    each column; pass the kinds attribute to parseXYZColumns() 
+    for subsequent chunks.
+    '''
+
+    def __init__(self):
+        self.kinds = [None, None, None]
+        self.minima = [None, None, None]
+        self.maxima = [None, None, None]
+        self.numRows = 0
+        self.numMissing = 0
+        self.zSum = 0.0
+        self.zDigest = TDigest()
+        # CategoryTable of x and y, if they are text:
+        self.categories = [None, None]
+
+    def update(self, columns):
+        '''
+        Add one chunk of parsed columns to the statistics.
+        :param columns: x, y, and z columns of the chunk
+        :type columns: (ParsedColumn, ParsedColumn, ParsedColumn)
+        '''
+        invalidRows = columns[0].invalid | columns[1].invalid | columns[2].invalid
+        numInvalid = int(np.count_nonzero(invalidRows))
+        self.numMissing += numInvalid
+        self.numRows += len(invalidRows) - numInvalid
+        for (colIndex, column) in enumerate(columns):
+            if self.kinds[colIndex] is None:
+                self.kinds[colIndex] = column.kind
+            (chunkMin, chunkMax) = column.extrema(exclude=invalidRows)
+            if chunkMin is None:
+                continue
+            if self.minima[colIndex] is None or chunkMin < self.minima[colIndex]:
+                self.minima[colIndex] = chunkMin
+            if self.maxima[colIndex] is None or chunkMax > self.maxima[colIndex]:
+                self.maxima[colIndex] = chunkMax
+        for (colIndex, column) in enumerate(columns[:2]):
+            if column.kind == ColumnKind.TEXT:
+                if self.categories[colIndex] is None:
+                    self.categories[colIndex] = CategoryTable()
+                # All labels of valid cells, also in rows with a missing
+                # value, since those rows are charted, too:
+                self.categories[colIndex].encode(column.values, column.invalid)
+        if columns[2].kind == ColumnKind.NUMERIC:
+            zValues = columns[2].values[~invalidRows]
+            self.zSum += float(zValues.sum())
+            self.zDigest.update(zValues)
+
+    def extrema(self):
+        '''
+        :return: xmin, xmax, ymin, ymax, zmin, zmax as Python quantities
+        :rtype: (<any>, <any>, <any>, <any>, <any>, <any>)
+        '''
+        return (self.minima[0], self.maxima[0],
+                self.minima[1], self.maxima[1],
+                self.minima[2], self.maxima[2])
+
+    def toJSON(self):
+        '''
+        :return: the statistics as a JSON-serializable dict;
+            dates become tagged ISO 8601 strings
+        :rtype: {String : <any>}
+        '''
+        def encode(extreme):
+            return {'datetime' : extreme.isoformat()} if isinstance(extreme, datetime.datetime) else extreme
+        return {'kinds' : self.kinds,
+                'minima' : [encode(extreme) for extreme in self.minima],
+                'maxima' : [encode(extreme) for extreme in self.maxima],
+                'numRows' : self.numRows,
+                'numMissing' : self.numMissing,
+                'zSum' : self.zSum,
+                'zDigest' : self.zDigest.toJSON(),
+                'categories' : [None if table is None else table.labels for table in self.categories]
+                }
+
+    @classmethod
+    def fromJSON(cls, jsonDict):
+        '''
+        :param jsonDict: statistics as returned by toJSON()
+        :type jsonDict: {String : <any>}
+        :rtype: XYZStatistics
+        '''
+        def decode(extreme):
+            return datetime.datetime.fromisoformat(extreme['datetime']) if isinstance(extreme, dict) else extreme
+        statistics = cls()
+        statistics.kinds = list(jsonDict['kinds'])
+        statistics.minima = [decode(extreme) for extreme in jsonDict['minima']]
+        statistics.maxima = [decode(extreme) for extreme in jsonDict['maxima']]
+        statistics.numRows = jsonDict['numRows']
+        statistics.numMissing = jsonDict['numMissing']
+        statistics.zSum = jsonDict['zSum']
+        # States saved before z values were digested have none:
+        if 'zDigest' in jsonDict:
+            statistics.zDigest = TDigest.fromJSON(jsonDict['zDigest'])
+        if 'categories' in jsonDict:
+            statistics.categories = [None if labels is None else CategoryTable(labels) 
+                                     for labels in jsonDict['categories']]
+        return statistics
+
+    def zMean(self):
+        '''
+        :return: mean of the valid z values, or None if there are none
+        :rtype: {float | None}
+        '''
+        if self.numRows == 0:
+            return None
+        return self.zSum / self.numRows
@@ -0,0 +1,187 @@
+'''
+Created on Oct 16, 2026
+
+Parsing of date and time strings. The format of a column
+of dates is detected once, from its first date. ISO 8601
+strings are parsed by NumPy in bulk, or by datetime.fromisoformat;
+other common formats by strptime. Only strings in odd formats
+go through dateutil. Results for repeated strings come from
+a bounded LRU cache.
+'''
+import datetime
+from functools import lru_cache
+import re
+
+import dateutil.parser
+import numpy as np
+
+
+# Maximum number of distinct strings whose parse
+# results are remembered:
+DATE_CACHE_SIZE = 4096
+
+ISO_DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}'                # date
+                              r'([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?' # optional time
+                              r'(Z|[+-]\d{2}:?\d{2})?$')             # optional timezone
+
+NUMBER_PATTERN = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+
+# Formats other than ISO 8601 that are recognized
+# as dates when detecting the kind of a column:
+KNOWN_FORMATS = ['%m/%d/%Y',
+                 '%m/%d/%Y %H:%M',
+                 '%m/%d/%Y %H:%M:%S',
+                 '%Y/%m/%d',
+                 '%Y/%m/%d %H:%M:%S',
+                 '%d.%m.%Y',
+                 '%d %b %Y',
+                 '%b %d %Y',
+                 '%b %d, %Y',
+                 '%B %d, %Y',
+                 '%a, %d %b %Y %H:%M:%S',
+                 ]
+
+class DateFormat:
+    ISO   = 'iso'
+    # Anything else is a strptime() format, or
+    # None for 'unknown, use dateutil'
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def detectDateFormat(dateString):
+    '''
+    Return the DateFormat of a date string: ISO for ISO 8601,
+    the matching entry of KNOWN_FORMATS, or None if the string
+    is in neither.
+    :param dateString: string holding a date
+    :type dateString: String
+    :rtype: {String | None}
+    '''
+    dateString = dateString.strip()
+    if ISO_DATE_PATTERN.match(dateString):
+        return DateFormat.ISO
+    if NUMBER_PATTERN.match(dateString) or not any(char.isdigit() for char in dateString):
+        return None
+    for dateFormat in KNOWN_FORMATS:
+        try:
+            datetime.datetime.strptime(dateString, dateFormat)
+            return dateFormat
+        except ValueError:
+            continue
+    return None
+
+def looksLikeDate(aString):
+    '''
+    Cheap test whether a string is a date in ISO 8601,
+    or one of the KNOWN_FORMATS. Strings in other formats
+    are not considered dates, even if dateutil would make
+    sense of them. Numbers are not dates.
+    :param aString: string to test
+    :type aString: String
+    :rtype: bool
+    '''
+    return detectDateFormat(aString) is not None
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parseDatetime(dateString, dateFormat=DateFormat.ISO):
+    '''
+    Parse a date and/or time string, trying the given format
+    first, then ISO 8601, then dateutil. Results are cached.
+    :param dateString: string to parse
+    :type dateString: String
+    :param dateFormat: DateFormat to try first
+    :type dateFormat: {String | None}
+    :return: the parsed datetime, or None if dateString holds no date
+    :rtype: {datetime.datetime | None}
+    '''
+    dateString = dateString.strip()
+    if len(dateString) == 0:
+        return None
+    if dateFormat not in (DateFormat.ISO, None):
+        try:
+            return datetime.datetime.strptime(dateString, dateFormat)
+        except ValueError:
+            pass
+    if ISO_DATE_PATTERN.match(dateString):
+        try:
+            return datetime.datetime.fromisoformat(dateString.replace('Z', '+00:00'))
+        except ValueError:
+            pass
+    try:
+        return dateutil.parser.parse(dateString)
+    except (ValueError, OverflowError):
+        return None
+
+def toUTC(aDatetime):
+    '''
+    Return a datetime without timezone that holds the
+    UTC time of aDatetime. Datetimes without timezone
+    are returned unchanged.
+    :param aDatetime: datetime to convert
+    :type aDatetime: datetime.datetime
+    :rtype: datetime.datetime
+    '''
+    if aDatetime.tzinfo is None:
+        return aDatetime
+    return aDatetime.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+class DateColumnParser(object):
+    '''
+    Parser for a column of date strings. The format is
+    detected once, from the column's first non-empty string.
+    '''
+
+    def __init__(self, sampleString):
+        '''
+        :param sampleString: a date string typical for the column
+        :type sampleString: String
+        '''
+        self.dateFormat = detectDateFormat(sampleString)
+        self.hasTimezone = self.dateFormat == DateFormat.ISO and \
+                           ISO_DATE_PATTERN.match(sampleString.strip()).group(4) is not None
+
+    @classmethod
+    def forColumn(cls, strings):
+        '''
+        Return a parser for the given column.
+        :param strings: the column's cells
+        :type strings: [String]
+        :rtype: DateColumnParser
+        '''
+        for cell in strings:
+            if len(cell.strip()) > 0:
+                return cls(cell)
+        return cls('')
+
+    def parse(self, dateString):
+        '''
+        :param dateString: one cell of the column
+        :type dateString: String
+        :return: UTC datetime without timezone, or None if the cell holds no date
+        :rtype: {datetime.datetime | None}
+        '''
+        aDatetime = parseDatetime(dateString, self.dateFormat)
+        if aDatetime is None:
+            return None
+        return toUTC(aDatetime)
+
+    def parseColumn(self, strings):
+        '''
+        Convert the column to datetime64[ms], with NaT for
+        cells that hold no date. Plain ISO 8601 columns are
+        converted by NumPy in bulk; others one distinct cell
+        at a time.
+        :param strings: the column's cells
+        :type strings: [String]
+        :rtype: np.ndarray
+        '''
+        if self.dateFormat == DateFormat.ISO and not self.hasTimezone:
+            try:
+                return np.array(strings, dtype='datetime64[ms]')
+            except ValueError:
+                pass
+        (distinct, inverse) = np.unique(np.array(strings, dtype=str), return_inverse=True)
+        distinctDates = []
+        for cell in distinct.tolist():
+            aDatetime = self.parse(cell)
+            distinctDates.append(np.datetime64('NaT') if aDatetime is None else np.datetime64(aDatetime, 'ms'))
+        return np.array(distinctDates, dtype='datetime64[ms]')[inverse.reshape(-1)]
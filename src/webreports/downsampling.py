@@ -0,0 +1,67 @@
+'''
+Created on Oct 16, 2026
+
+Downsampling of line series with the Largest-Triangle-Three-Buckets
+algorithm (Steinarsson, 2013). The first and last points are kept.
+The points in between are divided into equally sized buckets, and
+each bucket contributes the point that spans the largest triangle
+with the point chosen in the previous bucket and the average of
+the next bucket. That keeps peaks and the overall shape.
+'''
+import numpy as np
+
+
+def lttbIndices(x, y, numPoints):
+    '''
+    Return the indices of the points that LTTB keeps. The
+    work within each bucket is done by NumPy; only the walk
+    over the buckets is a Python loop, so the cost is linear
+    in the number of input points with a small constant.
+    Points whose y is NaN are never picked over ones with
+    a y, unless a whole bucket is NaN.
+    :param x: x coordinates, ascending
+    :type x: np.ndarray
+    :param y: y coordinates
+    :type y: np.ndarray
+    :param numPoints: number of points to keep; at least 3
+    :type numPoints: int
+    :return: ascending indices into x and y
+    :rtype: np.ndarray
+    '''
+    numInput = len(x)
+    if numPoints >= numInput or numInput <= 2:
+        return np.arange(numInput)
+    if numPoints < 3:
+        raise ValueError('LTTB needs a target of at least 3 points, not %d' % numPoints)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket boundaries for all points but the first and last:
+    bucketEdges = np.linspace(1, numInput - 1, numPoints - 1).astype(np.int64)
+    # Average of each bucket, the third corner of the triangles
+    # in the preceding bucket; NaNs ignored:
+    bucketSizes = np.diff(bucketEdges)
+    hasY = ~np.isnan(y)
+    yForSums = np.where(hasY, y, 0.0)
+    xSums = np.add.reduceat(x[1:-1], bucketEdges[:-1] - 1)
+    ySums = np.add.reduceat(yForSums[1:-1], bucketEdges[:-1] - 1)
+    yCounts = np.add.reduceat(hasY[1:-1].astype(np.int64), bucketEdges[:-1] - 1)
+    xAverages = np.append(xSums / bucketSizes, x[-1])
+    yAverages = np.append(ySums / np.maximum(yCounts, 1), y[-1])
+    yAverages[np.append(yCounts, 1) == 0] = np.nan
+
+    indices = np.empty(numPoints, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = numInput - 1
+    previous = 0
+    for bucket in range(numPoints - 2):
+        start = bucketEdges[bucket]
+        end = bucketEdges[bucket + 1]
+        (ax, ay) = (x[previous], y[previous])
+        (cx, cy) = (xAverages[bucket + 1], yAverages[bucket + 1])
+        # Twice the triangle areas; the factor does not matter:
+        areas = np.abs((ax - cx) * (y[start:end] - ay) - (ax - x[start:end]) * (cy - ay))
+        areas[np.isnan(areas)] = -1.0
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+    return indices
@@ -0,0 +1,274 @@
+'''
+Created on Oct 16, 2026
+
+Persistent, parsed state of a heatmap's data, so that
+data that grow over time need not be re-read and re-parsed 
+on every refresh. The state is a directory holding:
+
+    meta.json      the XYZStatistics of all rows, and the row count
+    x.f64          x of each row with valid x and y, as little-endian
+    y.f64          float64; dates as milliseconds since the epoch,
+                   text as codes into the category tables in meta.json
+    value.f64      value of each such row; NaN if missing
+    distinct.npz   distinct x and y, for Heatmap's maxCells
+    grid.npz       the binned grid last charted
+
+New rows are appended in time proportional to their number.
+Pass the state to Heatmap in place of a CSV file to chart it.
+The distinct values and the grid cover the rows stored when
+they were last used, and are brought up to date by reading
+only the rows appended since. The grid keeps its first bin 
+and bin width: as the x or y range grows, bins are added,
+and adjacent bins are merged when there are more than asked
+for. It is rebuilt only if it is much coarser than asked for,
+or the reducer changes.
+
+Usage:
+
+    state = HeatmapState('/var/webreports/engagementCS145')
+    state.appendFile('newWeek.csv', rowsToSkip=1)
+    heatmap = Heatmap(state, payloadMode='columnar')
+'''
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from binning import DistinctCounter, GridAggregator
+from columns import XYZStatistics, iterRowChunks, parseXYZColumns
+
+
+class HeatmapState(object):
+    '''
+    Parsed x/y/value columns and statistics of a heatmap,
+    kept in a directory.
+    '''
+
+    COLUMN_NAMES = ('x', 'y', 'value')
+    META_NAME = 'meta.json'
+    DISTINCT_NAME = 'distinct.npz'
+    GRID_NAME = 'grid.npz'
+
+    # Number of rows per chunk when columns are read:
+    ROWS_PER_CHUNK = 100000
+
+    def __init__(self, stateDir):
+        '''
+        Open the state in stateDir, or start an empty one.
+        :param stateDir: directory of the state; created if needed
+        :type stateDir: String
+        '''
+        self.stateDir = stateDir
+        if not os.path.isdir(stateDir):
+            os.makedirs(stateDir)
+        try:
+            with open(os.path.join(stateDir, HeatmapState.META_NAME), 'r') as fd:
+                meta = json.load(fd)
+            self.statistics = XYZStatistics.fromJSON(meta['statistics'])
+            self.numStoredRows = meta['numStoredRows']
+        except IOError:
+            self.statistics = XYZStatistics()
+            self.numStoredRows = 0
+        # Drop rows that an interrupted append wrote
+        # to the columns, but not to meta.json:
+        for columnName in HeatmapState.COLUMN_NAMES:
+            path = self.columnPath(columnName)
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+            if os.path.getsize(path) > self.numStoredRows * 8:
+                with open(path, 'r+b') as fd:
+                    fd.truncate(self.numStoredRows * 8)
+
+    def columnPath(self, columnName):
+        return os.path.join(self.stateDir, columnName + '.f64')
+
+    def append(self, rows, fieldSep=',', rowsToSkip=0):
+        '''
+        Add rows to the state. The kinds of the columns are 
+        fixed by the first rows ever appended. Rows with missing 
+        or unparsable cells count in the statistics' numMissing;
+        rows whose x and y are valid are stored even if their 
+        value is missing. If the rows cannot be added, the
+        state stays as it was.
+        :param rows: CSV lines, or x/y/value tuples
+        :type rows: {[String] | [tuple]}
+        :param fieldSep: field separator of CSV lines
+        :type fieldSep: String
+        :param rowsToSkip: number of header lines in rows
+        :type rowsToSkip: int
+        '''
+        columns = parseXYZColumns(rows, fieldSep=fieldSep, rowsToSkip=rowsToSkip, kinds=self.statistics.kinds)
+        oldStatistics = self.statistics.toJSON()
+        oldNumStoredRows = self.numStoredRows
+        try:
+            self.statistics.update(columns)
+            (xCol, yCol, valueCol) = [column.asNumbers(categories) 
+                                      for (column, categories) in zip(columns, self.statistics.categories + [None])]
+            goodRows = ~(np.isnan(xCol) | np.isnan(yCol))
+            for (columnName, column) in zip(HeatmapState.COLUMN_NAMES, (xCol, yCol, valueCol)):
+                with open(self.columnPath(columnName), 'ab') as fd:
+                    column[goodRows].astype('<f8').tofile(fd)
+            self.numStoredRows += int(np.count_nonzero(goodRows))
+            self.saveMeta()
+        except:
+            # Columns must all have numStoredRows rows:
+            self.statistics = XYZStatistics.fromJSON(oldStatistics)
+            self.numStoredRows = oldNumStoredRows
+            for columnName in HeatmapState.COLUMN_NAMES:
+                with open(self.columnPath(columnName), 'r+b') as fd:
+                    fd.truncate(self.numStoredRows * 8)
+            raise
+
+    def appendFile(self, csvFileName, fieldSep=',', rowsToSkip=0):
+        '''
+        Add the rows of a CSV file, a chunk at a time.
+        :param csvFileName: file with the new rows
+        :type csvFileName: String
+        :param fieldSep: field separator
+        :type fieldSep: String
+        :param rowsToSkip: number of header lines
+        :type rowsToSkip: int
+        '''
+        for rowChunk in iterRowChunks(csvFileName, HeatmapState.ROWS_PER_CHUNK, rowsToSkip=rowsToSkip):
+            self.append(rowChunk, fieldSep=fieldSep)
+
+    def saveMeta(self):
+        meta = {'statistics' : self.statistics.toJSON(),
+                'numStoredRows' : self.numStoredRows
+                }
+        (fd, tmpPath) = tempfile.mkstemp(dir=self.stateDir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmpFd:
+            json.dump(meta, tmpFd)
+        os.replace(tmpPath, os.path.join(self.stateDir, HeatmapState.META_NAME))
+
+    def saveArrays(self, fileName, arrays):
+        (fd, tmpPath) = tempfile.mkstemp(dir=self.stateDir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmpFd:
+            np.savez(tmpFd, **arrays)
+        os.replace(tmpPath, os.path.join(self.stateDir, fileName))
+
+    def loadArrays(self, fileName):
+        '''
+        :return: the arrays saved by saveArrays(), or None
+            if there are none, or they are for more rows
+            than are stored
+        :rtype: {dict | None}
+        '''
+        try:
+            with np.load(os.path.join(self.stateDir, fileName)) as arrays:
+                arrays = dict(arrays)
+        except (IOError, ValueError):
+            return None
+        if int(arrays['numRows']) > self.numStoredRows:
+            return None
+        return arrays
+
+    def distinctCounters(self, limit):
+        '''
+        Return counters of the distinct x and y of the
+        stored rows, as in Heatmap's maxCells pass. Only 
+        rows appended since the last call are read.
+        :param limit: limit of the counters
+        :type limit: int
+        :rtype: (DistinctCounter, DistinctCounter)
+        '''
+        counters = (DistinctCounter(limit), DistinctCounter(limit))
+        arrays = self.loadArrays(HeatmapState.DISTINCT_NAME)
+        if arrays is not None and int(arrays['limit']) == limit:
+            (counters[0].distinct, counters[1].distinct) = (arrays['xDistinct'], arrays['yDistinct'])
+            numRows = int(arrays['numRows'])
+        else:
+            numRows = 0
+        if numRows < self.numStoredRows:
+            for columns in self.iterColumnChunks(startRow=numRows):
+                for (column, counter) in zip(columns, counters):
+                    counter.update(column)
+            self.saveArrays(HeatmapState.DISTINCT_NAME, {'limit' : limit,
+                                                         'numRows' : self.numStoredRows,
+                                                         'xDistinct' : counters[0].distinct,
+                                                         'yDistinct' : counters[1].distinct
+                                                         })
+        return counters
+
+    def grid(self, xRange, yRange, xBins, yBins, reducer):
+        '''
+        Return the stored rows aggregated into a grid; see
+        binning.GridAggregator. The grid of the last call is
+        extended by bins to the current ranges, and its adjacent
+        bins are merged until there are at most xBins by yBins; 
+        then only rows appended since the last call are read.
+        The grid is rebuilt from all rows if its bins are over 
+        twice as wide as those of a new grid of xBins by yBins,
+        or if the reducer differs.
+        :param xRange: smallest and largest x value
+        :type xRange: (float, float)
+        :param yRange: smallest and largest y value
+        :type yRange: (float, float)
+        :param xBins: number of bins along x
+        :type xBins: int
+        :param yBins: number of bins along y
+        :type yBins: int
+        :param reducer: one of binning.REDUCERS
+        :type reducer: String
+        :rtype: GridAggregator
+        '''
+        grid = GridAggregator(xRange, yRange, xBins, yBins, reducer=reducer)
+        arrays = self.loadArrays(HeatmapState.GRID_NAME)
+        numRows = 0
+        if arrays is not None and 'xAxis' in arrays and str(arrays['reducer']) == reducer:
+            ((xStart, xBinWidth, savedXBins), (yStart, yBinWidth, savedYBins)) = (arrays['xAxis'].tolist(), 
+                                                                                   arrays['yAxis'].tolist())
+            if xBinWidth <= 2 * grid.xBinWidth and yBinWidth <= 2 * grid.yBinWidth:
+                savedGrid = GridAggregator((0, 1), (0, 1), int(savedXBins), int(savedYBins), reducer=reducer)
+                (savedGrid.xStart, savedGrid.xBinWidth, savedGrid.yStart, savedGrid.yBinWidth) = \
+                    (xStart, xBinWidth, yStart, yBinWidth)
+                (savedGrid.rowCounts, savedGrid.valueCounts) = (arrays['rowCounts'], arrays['valueCounts'])
+                if savedGrid.accumulator is not None:
+                    savedGrid.accumulator = arrays['accumulator']
+                savedGrid.extend(xRange, yRange)
+                (xFactor, yFactor) = (1, 1)
+                while -(-savedGrid.xBins // xFactor) > xBins:
+                    xFactor *= 2
+                while -(-savedGrid.yBins // yFactor) > yBins:
+                    yFactor *= 2
+                savedGrid.coarsen(xFactor, yFactor)
+                grid = savedGrid
+                numRows = int(arrays['numRows'])
+        if numRows < self.numStoredRows:
+            for (xCol, yCol, valueCol) in self.iterColumnChunks(startRow=numRows):
+                grid.update(xCol, yCol, valueCol)
+            gridArrays = {'xAxis' : np.array([grid.xStart, grid.xBinWidth, grid.xBins], dtype=np.float64),
+                          'yAxis' : np.array([grid.yStart, grid.yBinWidth, grid.yBins], dtype=np.float64),
+                          'reducer' : reducer,
+                          'numRows' : self.numStoredRows,
+                          'rowCounts' : grid.rowCounts,
+                          'valueCounts' : grid.valueCounts
+                          }
+            if grid.accumulator is not None:
+                gridArrays['accumulator'] = grid.accumulator
+            self.saveArrays(HeatmapState.GRID_NAME, gridArrays)
+        return grid
+
+    def iterColumnChunks(self, rowsPerChunk=None, startRow=0):
+        '''
+        Yield the stored x, y, and value columns in chunks
+        of at most rowsPerChunk rows, read without parsing.
+        :param rowsPerChunk: rows per chunk; default: ROWS_PER_CHUNK
+        :type rowsPerChunk: {int | None}
+        :param startRow: index of the first row to read
+        :type startRow: int
+        :rtype: Generator((np.ndarray, np.ndarray, np.ndarray))
+        '''
+        if rowsPerChunk is None:
+            rowsPerChunk = HeatmapState.ROWS_PER_CHUNK
+        columnFds = [open(self.columnPath(columnName), 'rb') for columnName in HeatmapState.COLUMN_NAMES]
+        try:
+            for fd in columnFds:
+                fd.seek(startRow * 8)
+            for startRow in range(startRow, self.numStoredRows, rowsPerChunk):
+                numRows = min(rowsPerChunk, self.numStoredRows - startRow)
+                yield tuple(np.fromfile(fd, dtype='<f8', count=numRows) for fd in columnFds)
+        finally:
+            for fd in columnFds:
+                fd.close()
@@ -0,0 +1,346 @@
+'''
+Created on Oct 16, 2026
+
+Group-by and pivot of long-format rows, such as the
+(week, video id, views) rows of an engagement extract, into
+the series of a Line or Histogram, or the rows of a Heatmap.
+Rows are read ROWS_PER_CHUNK at a time; keys are dictionary
+encoded, and each group keeps only the running state of the
+reducer, so memory use is proportional to the number of groups,
+not rows.
+
+Usage:
+
+    views = Pivot('data/videoByWeekCS145.csv', 0, columnKey=1, valueColumns=2, header=False)
+    heatmap = Heatmap(views.heatmapLines(), rowsToSkip=1)
+
+    answers = Pivot('data/testProblemSet.csv', 'resource_display_name',
+                    valueColumns=['numCorrect', 'numIncorrect'])
+    histogram = Histogram('Answers', 'Problem', answers.rowLabels(), answers.dataSeries()[0])
+'''
+import csv
+import io
+
+import numpy as np
+
+from binning import REDUCERS
+from chartmaker import DataSeries
+from columns import CategoryTable, ColumnKind, iterRowChunks, parseColumn, splitColumns
+
+
+class Pivot(object):
+    '''
+    Values of long-format rows, reduced per group: per
+    distinct rowKey, or, with a columnKey, per distinct pair
+    of rowKey and columnKey. Columns are given by their
+    zero-based index, or with header=True, also by name. A key
+    is numeric, or dates, if its first cells are; it becomes text
+    as soon as a cell is neither. Rows whose key cells are empty
+    are counted in numSkipped, and otherwise ignored; empty and
+    non-numeric value cells count as rows without a value.
+    '''
+
+    # Number of rows parsed at a time:
+    ROWS_PER_CHUNK = 100000
+
+    def __init__(self, source, rowKey, columnKey=None, valueColumns=None, reducer=None,
+                 fieldSep=',', header=True):
+        '''
+        :param source: path to a CSV file, or array of CSV lines or tuples
+        :type source: {String | [String] | [tuple]}
+        :param rowKey: column whose values make the rows of the result
+        :type rowKey: {int | String}
+        :param columnKey: column whose values make the columns of the
+            result, as in a pivot table; None: a plain group-by
+        :type columnKey: {int | String | None}
+        :param valueColumns: column(s) of numbers to reduce; None: rows
+            are only counted
+        :type valueColumns: {int | String | [{int | String}] | None}
+        :param reducer: one of binning.REDUCERS; 'count' counts
+            the rows of each group. None: 'sum' if there are
+            value columns, else 'count'
+        :type reducer: {String | None}
+        :param fieldSep: field separator of CSV lines
+        :type fieldSep: String
+        :param header: whether the first row holds the column names
+        :type header: bool
+        '''
+        if valueColumns is None:
+            valueColumns = []
+        elif not isinstance(valueColumns, list):
+            valueColumns = [valueColumns]
+        if reducer is None:
+            reducer = 'sum' if valueColumns else 'count'
+        if reducer not in REDUCERS:
+            raise ValueError('Reducer must be one of %s, not %s' % (', '.join(REDUCERS), str(reducer)))
+        if reducer != 'count' and not valueColumns:
+            raise ValueError("Pivot needs value columns for reducer '%s'" % reducer)
+        self.source = source
+        self.reducer = reducer
+        self.fieldSep = fieldSep
+        self.header = header
+        self.columnNames = self.readColumnNames() if header else None
+        self.keyIndices = [self.columnIndex(key) for key in ([rowKey] if columnKey is None else [rowKey, columnKey])]
+        self.valueIndices = [self.columnIndex(column) for column in valueColumns]
+        self.valueNames = [self.columnNames[index] if header else str(column)
+                           for (index, column) in zip(self.valueIndices, valueColumns)]
+        # Fields per row; all of them, if known, such that
+        # splitColumns() can take its fast path:
+        self.numFields = len(self.columnNames) if header else max(self.keyIndices + self.valueIndices) + 1
+        self.keyKinds = [None] * len(self.keyIndices)
+        self.keyTables = [CategoryTable() for _ in self.keyIndices]
+        # Codes of the cell texts of numeric and date keys,
+        # for a key that later becomes text:
+        self.cellTexts = [{} for _ in self.keyIndices]
+        self.numSkipped = 0
+
+        # Groups by row code and column code; arrays
+        # grow as new keys appear:
+        self.rowCounts = np.zeros((0, 0 if columnKey is not None else 1), dtype=np.int64)
+        self.valueCounts = [self.rowCounts.copy() for _ in self.valueIndices]
+        if reducer == 'max':
+            self.initialValue = -np.inf
+        elif reducer == 'min':
+            self.initialValue = np.inf
+        else:
+            self.initialValue = 0.0
+        self.accumulators = [np.zeros(self.rowCounts.shape) for _ in self.valueIndices]
+
+        for rows in self.iterRowChunks():
+            self.update(rows)
+
+    def readColumnNames(self):
+        '''
+        :return: the names of the columns, from the first row
+        :rtype: [String]
+        '''
+        if isinstance(self.source, str):
+            with open(self.source, 'r') as fd:
+                firstRow = fd.readline().rstrip()
+        elif len(self.source) > 0:
+            firstRow = self.source[0]
+        else:
+            return []
+        if isinstance(firstRow, tuple):
+            return [str(name) for name in firstRow]
+        return next(csv.reader([firstRow], delimiter=self.fieldSep), [])
+
+    def columnIndex(self, column):
+        '''
+        :param column: zero-based index, or name, of a column
+        :type column: {int | String}
+        :rtype: int
+        '''
+        if isinstance(column, int):
+            return column
+        if self.columnNames is None or column not in self.columnNames:
+            raise ValueError('No column named %s' % column)
+        return self.columnNames.index(column)
+
+    def iterRowChunks(self):
+        '''
+        Yield the data rows of the source, without the
+        header, in lists of at most ROWS_PER_CHUNK rows.
+        :rtype: Generator([{String | tuple}])
+        '''
+        rowsToSkip = 1 if self.header else 0
+        if isinstance(self.source, str):
+            for chunk in iterRowChunks(self.source, Pivot.ROWS_PER_CHUNK, rowsToSkip=rowsToSkip):
+                yield chunk
+            return
+        for startIndex in range(rowsToSkip, len(self.source), Pivot.ROWS_PER_CHUNK):
+            yield self.source[startIndex:startIndex + Pivot.ROWS_PER_CHUNK]
+
+    def update(self, rows):
+        '''
+        Add one chunk of rows to the groups.
+        :param rows: CSV lines or tuples, without header
+        :type rows: [{String | tuple}]
+        '''
+        cellColumns = splitColumns(rows, fieldSep=self.fieldSep, numCols=self.numFields)
+        keyCodes = []
+        for (keyIndex, colIndex) in enumerate(self.keyIndices):
+            cells = cellColumns[colIndex]
+            column = parseColumn(cells, kind=self.keyKinds[keyIndex])
+            self.keyKinds[keyIndex] = column.kind
+            if column.kind != ColumnKind.TEXT and \
+               any(isinstance(cells[rowIndex], str) and len(cells[rowIndex].strip()) > 0
+                   for rowIndex in np.flatnonzero(column.invalid).tolist()):
+                # Keys that are not of the kind of the keys
+                # so far, such as ids after a run of numeric ids:
+                self.fallBackToText(keyIndex)
+                column = parseColumn(cells, kind=ColumnKind.TEXT)
+            keyCodes.append(self.keyTables[keyIndex].encode(column.values, column.invalid))
+            if column.kind != ColumnKind.TEXT:
+                self.rememberCellTexts(keyIndex, cells, keyCodes[-1])
+        validRows = ~np.any(np.isnan(keyCodes), axis=0)
+        self.numSkipped += len(validRows) - int(np.count_nonzero(validRows))
+        keyCodes = [codes[validRows].astype(np.int64) for codes in keyCodes]
+        self.grow()
+
+        (numRows, numCols) = self.rowCounts.shape
+        groups = keyCodes[0] * numCols + (keyCodes[1] if len(keyCodes) > 1 else 0)
+        self.rowCounts += np.bincount(groups, minlength=numRows * numCols).reshape(numRows, numCols)
+        for (valueIndex, colIndex) in enumerate(self.valueIndices):
+            values = parseColumn(cellColumns[colIndex], kind=ColumnKind.NUMERIC).values[validRows]
+            hasValue = ~np.isnan(values)
+            (valueGroups, values) = (groups[hasValue], values[hasValue])
+            self.valueCounts[valueIndex] += np.bincount(valueGroups, minlength=numRows * numCols).reshape(numRows, numCols)
+            accumulator = self.accumulators[valueIndex].reshape(-1)
+            if self.reducer in ('sum', 'mean'):
+                accumulator += np.bincount(valueGroups, weights=values, minlength=numRows * numCols)
+            elif self.reducer == 'max':
+                np.maximum.at(accumulator, valueGroups, values)
+            elif self.reducer == 'min':
+                np.minimum.at(accumulator, valueGroups, values)
+
+    def rememberCellTexts(self, keyIndex, cells, codes):
+        '''
+        Record the code of each distinct cell text of a
+        numeric or date key, as the cells would read as text.
+        :param keyIndex: 0 for the row key, 1 for the column key
+        :type keyIndex: int
+        :param cells: one chunk of the key's cells
+        :type cells: [<any>]
+        :param codes: codes of the cells; NaN for cells without one
+        :type codes: np.ndarray
+        '''
+        hasCode = ~np.isnan(codes)
+        (texts, firstIndices) = np.unique(np.asarray(cells).astype(str)[hasCode], return_index=True)
+        # In the order the texts first appear:
+        order = np.argsort(firstIndices)
+        (texts, firstIndices) = (texts[order], firstIndices[order])
+        cellTexts = self.cellTexts[keyIndex]
+        for (text, code) in zip(texts.tolist(), codes[hasCode][firstIndices].astype(np.int64).tolist()):
+            cellTexts.setdefault(text, code)
+
+    def fallBackToText(self, keyIndex):
+        '''
+        Make a numeric or date key a text key. Each code is
+        labeled with a cell text it was seen with, and every
+        cell text seen so far keeps its code, so the groups
+        stay as they are, and later cells of the same text
+        join them. Cells such as '1.5' and '1.50', which
+        were one number, stay one group.
+        :param keyIndex: 0 for the row key, 1 for the column key
+        :type keyIndex: int
+        '''
+        cellTexts = self.cellTexts[keyIndex]
+        labels = [None] * len(self.keyTables[keyIndex])
+        for (text, code) in cellTexts.items():
+            if labels[code] is None:
+                labels[code] = text
+        table = CategoryTable(labels)
+        table.codes.update(cellTexts)
+        self.keyTables[keyIndex] = table
+        self.keyKinds[keyIndex] = ColumnKind.TEXT
+        self.cellTexts[keyIndex] = {}
+
+    def grow(self):
+        '''
+        Enlarge the group arrays to the current number of keys.
+        '''
+        shape = (len(self.keyTables[0]), len(self.keyTables[1]) if len(self.keyTables) > 1 else 1)
+        if shape == self.rowCounts.shape:
+            return
+        def grown(groupArr, fillValue):
+            grownArr = np.full(shape, fillValue, dtype=groupArr.dtype)
+            grownArr[:groupArr.shape[0], :groupArr.shape[1]] = groupArr
+            return grownArr
+        self.rowCounts = grown(self.rowCounts, 0)
+        self.valueCounts = [grown(counts, 0) for counts in self.valueCounts]
+        self.accumulators = [grown(accumulator, self.initialValue) for accumulator in self.accumulators]
+
+    def labels(self, keyIndex):
+        '''
+        :return: the distinct values of a key in ascending order,
+            and their codes in that order
+        :rtype: ([<any>], [int])
+        '''
+        labels = [int(label) if isinstance(label, float) and label.is_integer() else label
+                  for label in self.keyTables[keyIndex].labels]
+        order = sorted(range(len(labels)), key=labels.__getitem__)
+        return ([labels[code] for code in order], order)
+
+    def rowLabels(self):
+        '''
+        :return: distinct values of the row key, in ascending order
+        :rtype: [<any>]
+        '''
+        return self.labels(0)[0]
+
+    def columnLabels(self):
+        '''
+        :return: distinct values of the column key, in ascending
+            order; None without a column key
+        :rtype: {[<any>] | None}
+        '''
+        return self.labels(1)[0] if len(self.keyTables) > 1 else None
+
+    def values(self, valueColumn=None):
+        '''
+        Return the reduced values of one value column by
+        row and column, in the order of rowLabels() and
+        columnLabels(). Groups without values are NaN, or 0
+        for the count reducer.
+        :param valueColumn: index or name of one of the value
+            columns; None: the first
+        :type valueColumn: {int | String | None}
+        :return: array of one row per row key, and one column per
+            column key, or a single column without a column key
+        :rtype: np.ndarray
+        '''
+        if self.reducer == 'count':
+            reduced = self.rowCounts.astype(np.float64)
+        else:
+            valueIndex = 0 if valueColumn is None else self.valueIndices.index(self.columnIndex(valueColumn))
+            valueCounts = self.valueCounts[valueIndex]
+            reduced = self.accumulators[valueIndex].copy()
+            if self.reducer == 'mean':
+                reduced /= np.maximum(valueCounts, 1)
+            reduced[valueCounts == 0] = np.nan
+        rowOrder = self.labels(0)[1]
+        columnOrder = self.labels(1)[1] if len(self.keyTables) > 1 else [0]
+        return reduced[np.ix_(rowOrder, columnOrder)]
+
+    def dataSeries(self, valueColumn=None):
+        '''
+        Return the result as DataSeries over the row keys,
+        for charts whose x axis labels are rowLabels(): one per
+        column key, or without a column key, one per value column.
+        :param valueColumn: value column to chart with a column
+            key; None: the first
+        :type valueColumn: {int | String | None}
+        :rtype: [DataSeries]
+        '''
+        if len(self.keyTables) > 1:
+            reduced = self.values(valueColumn)
+            return [DataSeries(np.ascontiguousarray(reduced[:, colIndex]), legendLabel=str(label))
+                    for (colIndex, label) in enumerate(self.columnLabels())]
+        if self.reducer == 'count' or not self.valueIndices:
+            return [DataSeries(self.values()[:, 0], legendLabel='count')]
+        return [DataSeries(self.values(valueIndex)[:, 0], legendLabel=valueName)
+                for (valueIndex, valueName) in zip(self.valueIndices, self.valueNames)]
+
+    def heatmapLines(self, valueColumn=None):
+        '''
+        Return the result as CSV lines of row key, column
+        key, and reduced value, after a header line, for Heatmap
+        with rowsToSkip=1. Groups without rows are left out.
+        :param valueColumn: value column to chart; None: the first
+        :type valueColumn: {int | String | None}
+        :rtype: [String]
+        '''
+        if len(self.keyTables) < 2:
+            raise ValueError('Heatmap lines need a column key')
+        reduced = self.values(valueColumn)
+        hasRows = self.rowCounts[np.ix_(self.labels(0)[1], self.labels(1)[1])] > 0
+        lineBuffer = io.StringIO()
+        writer = csv.writer(lineBuffer, lineterminator='\n')
+        writer.writerow(['x', 'y', 'value'])
+        rowLabels = [label.isoformat() if hasattr(label, 'isoformat') else label for label in self.rowLabels()]
+        columnLabels = [label.isoformat() if hasattr(label, 'isoformat') else label for label in self.columnLabels()]
+        for (rowIndex, colIndex) in zip(*np.nonzero(hasRows)):
+            value = reduced[rowIndex, colIndex]
+            writer.writerow([rowLabels[rowIndex], columnLabels[colIndex], '' if value != value else repr(float(value))])
+        return lineBuffer.getvalue().split('\n')[:-1]
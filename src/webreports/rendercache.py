@@ -0,0 +1,404 @@
+'''
+Created on Oct 16, 2026
+
+On-disk cache of rendered charts. A chart is looked up by
+a content hash of its class, the source of the modules that 
+render it, its constructor arguments, and the data it reads: 
+arguments that the chart class lists in FILE_PARAMETERS stand
+for the path, size, and content hash of the file they name,
+and a HeatmapState for its directory, row count, and meta.json.
+On a hit,
+the chart's JavaScript and HTML come from the cache, and the
+chart is not constructed at all.
+
+Usage:
+
+    cache = RenderCache('/var/cache/webreports', maxBytes=500 * 2**20)
+    heatmap = cache.getChart(Heatmap, 'data/testHeatmapInput.csv', rowsToSkip=1)
+    ChartMaker.makeWebPage([heatmap])
+'''
+import array
+from collections import OrderedDict
+import datetime
+import hashlib
+import inspect
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from chartmaker import BasicDict, ChartMaker, JsRaw
+from heatmapstate import HeatmapState
+
+
+class DataFile(object):
+    '''
+    A chart argument that names a data file, keyed
+    on the file's content rather than only its name.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+class CachedChart(ChartMaker):
+    '''
+    Stand-in for a chart whose rendered source came from
+    a RenderCache. Takes the next chart name, like a chart that
+    is constructed, and can be passed to makeWebPage() with other
+    charts.
+    '''
+
+    def __init__(self, entry):
+        '''
+        :param entry: the cache entry, as written by RenderCache.storeChart()
+        :type entry: {String : <any>}
+        '''
+        super(CachedChart, self).__init__()
+        self.chartType = entry['chartType']
+        self.scriptDependencies = list(entry['scriptDependencies'])
+        self.highchartsModules = list(entry['highchartsModules'])
+        self.optionsSource = entry['optionsSource'].replace(RenderCache.NAME_PLACEHOLDER, self.internalChartName)
+        self.divSource = entry['divSource'].replace(RenderCache.NAME_PLACEHOLDER, self.internalChartName)
+
+    def getChartFuncSource(self, sharedOptions=None, lazy=False):
+        (header, footer) = self.getChartFuncFrame(lazy)
+        return header + self.optionsSource + footer
+
+    def iterDivSource(self):
+        yield self.divSource
+
+class RenderCache(object):
+    '''
+    Content-addressed cache of rendered charts in a
+    directory. When the entries exceed maxBytes, the least
+    recently used ones are deleted. The hits, misses, and
+    evictions attributes count what happened since the cache
+    object was created.
+    '''
+
+    # Stands for the chart's name in cached sources:
+    NAME_PLACEHOLDER = '@@WEBREPORTS_CHART@@'
+
+    FILE_HASHES_NAME = 'fileHashes.json'
+
+    def __init__(self, cacheDir, maxBytes=256 * 2**20):
+        '''
+        :param cacheDir: directory of the cache; created if needed
+        :type cacheDir: String
+        :param maxBytes: upper limit on the size of all entries
+        :type maxBytes: int
+        '''
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        # Content hashes of data files, by path; reused
+        # while size and modification time are unchanged:
+        self.fileHashes = {}
+        try:
+            with open(os.path.join(cacheDir, RenderCache.FILE_HASHES_NAME), 'r') as fd:
+                self.fileHashes = json.load(fd)
+        except (IOError, ValueError):
+            pass
+        self.fileHashesChanged = False
+
+    def getChart(self, chartClass, *args, **kwargs):
+        '''
+        Return chartClass(*args, **kwargs), or the equivalent
+        CachedChart if the same chart, with the same data, was
+        rendered before. Arguments of the parameters in
+        chartClass.FILE_PARAMETERS that name existing files
+        stand for the files' content.
+        :param chartClass: chart class, such as Heatmap
+        :type chartClass: type
+        :rtype: ChartMaker
+        '''
+        key = self.chartKey(chartClass, args, kwargs)
+        entry = self.loadEntry(key)
+        if entry is not None:
+            self.hits += 1
+            return CachedChart(entry)
+        self.misses += 1
+        chart = chartClass(*args, **kwargs)
+        self.storeChart(key, chart)
+        return chart
+
+    def statistics(self):
+        '''
+        :return: hits, misses, evictions, and the current number and bytes of entries
+        :rtype: {String : int}
+        '''
+        entryFiles = self.entryFiles()
+        return {'hits' : self.hits,
+                'misses' : self.misses,
+                'evictions' : self.evictions,
+                'entries' : len(entryFiles),
+                'bytes' : sum(size for (_, size, _) in entryFiles)
+                }
+
+    def clear(self):
+        '''
+        Delete all entries.
+        '''
+        for (entryFile, _, _) in self.entryFiles():
+            self.removeFile(entryFile)
+
+    def chartKey(self, chartClass, args, kwargs):
+        '''
+        Return the cache key of a chart: the SHA-256 of the
+        chart class, the source files of webreports, and the 
+        arguments. Any change to the code that renders charts,
+        or to the format of entries, thus changes all keys.
+        :rtype: String
+        '''
+        hasher = hashlib.sha256()
+        self.feed(hasher, [chartClass.__module__, chartClass.__name__])
+        for sourceFile in self.sourceFiles(chartClass):
+            self.feedFile(hasher, sourceFile)
+        (args, kwargs) = self.markDataFiles(chartClass, args, kwargs)
+        self.feed(hasher, list(args))
+        self.feed(hasher, kwargs)
+        if self.fileHashesChanged:
+            self.saveFileHashes()
+        return hasher.hexdigest()
+
+    def sourceFiles(self, chartClass):
+        '''
+        :return: the Python files of webreports, other than tests,
+            and the file of chartClass, if it is not one of them
+        :rtype: [String]
+        '''
+        sourceDir = os.path.dirname(os.path.abspath(__file__))
+        sourceFiles = [os.path.join(sourceDir, fileName) for fileName in sorted(os.listdir(sourceDir))
+                       if fileName.endswith('.py') and not fileName.startswith('test_')]
+        classFile = os.path.abspath(inspect.getsourcefile(chartClass))
+        if classFile not in sourceFiles:
+            sourceFiles.append(classFile)
+        return sourceFiles
+
+    def markDataFiles(self, chartClass, args, kwargs):
+        '''
+        Wrap the string arguments of the parameters that
+        chartClass lists in FILE_PARAMETERS into DataFile.
+        Other strings, such as titles, stay strings, even if
+        they happen to name a file.
+        :return: the arguments, with data files marked
+        :rtype: ([<any>], {String : <any>})
+        '''
+        fileParameters = getattr(chartClass, 'FILE_PARAMETERS', ())
+        if not fileParameters:
+            return (args, kwargs)
+        fileIndices = set(index for (index, name) in enumerate(inspect.signature(chartClass).parameters)
+                          if name in fileParameters)
+        args = [DataFile(arg) if isinstance(arg, str) and index in fileIndices else arg
+                for (index, arg) in enumerate(args)]
+        kwargs = dict((name, DataFile(arg) if isinstance(arg, str) and name in fileParameters else arg)
+                      for (name, arg) in kwargs.items())
+        return (args, kwargs)
+
+    def feed(self, hasher, value):
+        '''
+        Add an unambiguous representation of value to hasher.
+        :raise TypeError: for values whose content cannot be determined
+        '''
+        if isinstance(value, str):
+            hasher.update(b's%d:' % len(value))
+            hasher.update(value.encode('utf-8'))
+        elif isinstance(value, DataFile):
+            self.feed(hasher, ['DataFile', value.path])
+            if os.path.isfile(value.path):
+                self.feedFile(hasher, value.path)
+        elif value is None or isinstance(value, (bool, int, float, datetime.date, datetime.time)):
+            hasher.update(('%s:%r;' % (type(value).__name__, value)).encode('utf-8'))
+        elif isinstance(value, bytes):
+            hasher.update(b'b%d:' % len(value))
+            hasher.update(value)
+        elif isinstance(value, (list, tuple)):
+            hasher.update(b'l%d[' % len(value))
+            for element in value:
+                self.feed(hasher, element)
+            hasher.update(b']')
+        elif isinstance(value, dict):
+            hasher.update(b'd%d{' % len(value))
+            for key in sorted(value, key=str):
+                self.feed(hasher, key)
+                self.feed(hasher, value[key])
+            hasher.update(b'}')
+        elif isinstance(value, np.ndarray):
+            self.feed(hasher, ['ndarray', str(value.dtype), list(value.shape)])
+            hasher.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, array.array):
+            self.feed(hasher, ['array', value.typecode, len(value)])
+            hasher.update(value.tobytes())
+        elif isinstance(value, np.generic):
+            self.feed(hasher, value.item())
+        elif isinstance(value, BasicDict):
+            # DataSeries and the like: their items and attributes
+            self.feed(hasher, [type(value).__name__, dict(value.items()),
+                               dict((key, val) for (key, val) in vars(value).items() if key != 'store')])
+        elif hasattr(value, 'asOptionTree'):
+            self.feed(hasher, [type(value).__name__, value.asOptionTree()])
+        elif isinstance(value, HeatmapState):
+            # Each append rewrites meta.json, which holds
+            # the row count and the statistics of all rows:
+            self.feed(hasher, ['HeatmapState', os.path.abspath(value.stateDir), value.numStoredRows])
+            metaPath = os.path.join(value.stateDir, HeatmapState.META_NAME)
+            if os.path.isfile(metaPath):
+                self.feedFile(hasher, metaPath)
+        else:
+            raise TypeError('Cannot compute a cache key from %s' % type(value).__name__)
+
+    def feedFile(self, hasher, fileName):
+        '''
+        Add a file's size and content hash to hasher. The
+        content is read only if the file's size or modification
+        time changed since it was last hashed; a file rewritten
+        with the same bytes keeps its key.
+        '''
+        path = os.path.abspath(fileName)
+        fileStat = os.stat(path)
+        (size, mtime) = (fileStat.st_size, fileStat.st_mtime_ns)
+        remembered = self.fileHashes.get(path)
+        if remembered is not None and remembered[:2] == [size, mtime]:
+            contentHash = remembered[2]
+        else:
+            contentHasher = hashlib.sha256()
+            with open(path, 'rb') as fd:
+                for block in iter(lambda: fd.read(2**20), b''):
+                    contentHasher.update(block)
+            contentHash = contentHasher.hexdigest()
+            self.fileHashes[path] = [size, mtime, contentHash]
+            self.fileHashesChanged = True
+        self.feed(hasher, ['file', size, contentHash])
+
+    def saveFileHashes(self):
+        self.writeAtomically(os.path.join(self.cacheDir, RenderCache.FILE_HASHES_NAME), json.dumps(self.fileHashes))
+        self.fileHashesChanged = False
+
+    def entryPath(self, key):
+        return os.path.join(self.cacheDir, key[:2], key + '.json')
+
+    def loadEntry(self, key):
+        '''
+        :return: the entry under key, or None if there is none
+        :rtype: {{String : <any>} | None}
+        '''
+        path = self.entryPath(key)
+        try:
+            with open(path, 'r') as fd:
+                entry = json.load(fd)
+        except (IOError, ValueError):
+            return None
+        # Mark as recently used:
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def storeChart(self, key, chart):
+        '''
+        Render chart, and store its sources under key, with
+        its name replaced by NAME_PLACEHOLDER where the chart
+        refers to itself, but not in its data. Then evict entries
+        if the cache grew beyond maxBytes.
+        '''
+        chartName = chart.getInternalName()
+        # The page's elements of the chart start with one of these:
+        divStarts = dict((template % chartName, template % RenderCache.NAME_PLACEHOLDER)
+                         for template in (ChartMaker.CHART_DIV, ChartMaker.CHART_DIV_HEATMAP,
+                                          ChartMaker.HEATMAP_CSV_START, ChartMaker.HEATMAP_PAYLOAD_START))
+        entry = {'chartType' : getattr(chart, 'chartType', None),
+                 'scriptDependencies' : chart.scriptDependencies,
+                 'highchartsModules' : chart.highchartsModules,
+                 'optionsSource' : chart.toJavaScript(self.withNamePlaceholder(chart.getOptionTree(), chartName), 
+                                                      members=True),
+                 'divSource' : ''.join(divStarts.get(piece, piece) for piece in chart.iterDivSource())
+                 }
+        path = self.entryPath(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.writeAtomically(path, json.dumps(entry))
+        self.evict()
+
+    def withNamePlaceholder(self, value, chartName):
+        '''
+        Return a copy of an option tree in which the chart's name
+        is replaced by NAME_PLACEHOLDER. Charts refer to themselves
+        only in JavaScript source (JsRaw), as a quoted string, such
+        as 'chart0' or 'chart0_csv'; strings of data are left alone.
+        :param value: option (sub)tree
+        :type value: <any>
+        :param chartName: the chart's name
+        :type chartName: String
+        :rtype: <any>
+        '''
+        if isinstance(value, JsRaw):
+            namePattern = re.compile('''(?<=['"])%s(?=(_csv|_data)?['"])''' % re.escape(chartName))
+            return JsRaw(namePattern.sub(RenderCache.NAME_PLACEHOLDER, value))
+        if isinstance(value, dict):
+            return OrderedDict((key, self.withNamePlaceholder(element, chartName)) for (key, element) in value.items())
+        if isinstance(value, (list, tuple)):
+            return [self.withNamePlaceholder(element, chartName) for element in value]
+        if hasattr(value, 'asOptionTree'):
+            return self.withNamePlaceholder(value.asOptionTree(), chartName)
+        return value
+
+    def entryFiles(self):
+        '''
+        :return: path, size, and last use of each entry
+        :rtype: [(String, int, float)]
+        '''
+        entryFiles = []
+        for (dirPath, _, fileNames) in os.walk(self.cacheDir):
+            if dirPath == self.cacheDir:
+                continue
+            for fileName in fileNames:
+                if not fileName.endswith('.json'):
+                    continue
+                path = os.path.join(dirPath, fileName)
+                try:
+                    fileStat = os.stat(path)
+                except OSError:
+                    continue
+                entryFiles.append((path, fileStat.st_size, fileStat.st_mtime))
+        return entryFiles
+
+    def evict(self):
+        '''
+        Delete least recently used entries until all
+        entries together take at most maxBytes.
+        '''
+        entryFiles = self.entryFiles()
+        totalBytes = sum(size for (_, size, _) in entryFiles)
+        if totalBytes <= self.maxBytes:
+            return
+        for (path, size, _) in sorted(entryFiles, key=lambda entryFile: entryFile[2]):
+            if totalBytes <= self.maxBytes:
+                break
+            if self.removeFile(path):
+                self.evictions += 1
+            totalBytes -= size
+
+    def removeFile(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            # Removed by a concurrent process
+            return False
+
+    def writeAtomically(self, path, content):
+        '''
+        Write content to path such that concurrent readers
+        see either the old or the new file, never part of one.
+        '''
+        (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmpFd:
+            tmpFd.write(content)
+        os.replace(tmpPath, path)
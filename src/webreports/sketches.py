@@ -0,0 +1,221 @@
+'''
+Created on Oct 16, 2026
+
+Bounded-memory summaries of columns that arrive in chunks.
+TDigest estimates quantiles, such as the percentiles that Heatmap
+scales its color axis by, in the same single pass over the rows
+that computes the extrema. SpaceSaving finds the most frequent
+labels of a categorical column, such as the largest slices of
+a Pie.
+'''
+import heapq
+import itertools
+
+import numpy as np
+
+
+# Default t-digest compression: the digest keeps at most
+# about this many centroids, and estimates quantiles near
+# the tails more precisely than near the median:
+DEFAULT_COMPRESSION = 100
+
+class TDigest(object):
+    '''
+    Merging t-digest (Dunning and Ertl). Values are buffered;
+    when the buffer is full, buffer and centroids are sorted
+    together, and neighbors are merged into one centroid as
+    long as they lie in the same unit of the arcsine k-scale.
+    Centroids near the extremes therefore stay small, and
+    memory use is bounded by the compression, not the number
+    of values. The extrema are kept exactly.
+    '''
+
+    def __init__(self, compression=DEFAULT_COMPRESSION, bufferSize=None):
+        '''
+        :param compression: about the maximum number of centroids
+        :type compression: int
+        :param bufferSize: number of values buffered before they are
+            merged into the centroids; None: 10 * compression
+        :type bufferSize: {int | None}
+        '''
+        self.compression = compression
+        self.bufferSize = 10 * compression if bufferSize is None else bufferSize
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.numBuffered = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        '''
+        :param values: one chunk of the column; NaNs are ignored
+        :type values: np.ndarray
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        (chunkMin, chunkMax) = (float(values.min()), float(values.max()))
+        self.min = chunkMin if self.min is None else min(self.min, chunkMin)
+        self.max = chunkMax if self.max is None else max(self.max, chunkMax)
+        self.buffer.append(values)
+        self.numBuffered += len(values)
+        if self.numBuffered >= self.bufferSize:
+            self.compress()
+
+    def compress(self):
+        '''
+        Merge the buffered values into the centroids.
+        '''
+        if self.numBuffered == 0:
+            return
+        means = np.concatenate([self.means] + self.buffer)
+        weights = np.concatenate((self.weights, np.ones(self.numBuffered)))
+        self.buffer = []
+        self.numBuffered = 0
+        order = np.argsort(means, kind='mergesort')
+        (means, weights) = (means[order], weights[order])
+        cumulative = np.cumsum(weights)
+        quantiles = (cumulative - weights / 2.0) / cumulative[-1]
+        # Unit of the k-scale into which each centroid falls:
+        units = np.floor(self.compression * (np.arcsin(2 * quantiles - 1) / np.pi + 0.5)).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(units)) + 1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        '''
+        Return the estimated q-quantile of the values seen so far,
+        interpolating between centroids.
+        :param q: quantile between 0 and 1, or an array of them
+        :type q: {float | np.ndarray}
+        :return: the quantile(s); None if there were no values
+        :rtype: {float | np.ndarray | None}
+        '''
+        if self.count == 0:
+            return None
+        self.compress()
+        cumulative = np.cumsum(self.weights)
+        positions = np.concatenate(([0], cumulative - self.weights / 2.0, [cumulative[-1]]))
+        values = np.concatenate(([self.min], self.means, [self.max]))
+        result = np.interp(np.asarray(q, dtype=np.float64) * cumulative[-1], positions, values)
+        return float(result) if np.ndim(result) == 0 else result
+
+    def toJSON(self):
+        '''
+        :return: the digest as a JSON-serializable dict
+        :rtype: {String : <any>}
+        '''
+        self.compress()
+        return {'compression' : self.compression,
+                'means' : self.means.tolist(),
+                'weights' : self.weights.tolist(),
+                'min' : self.min,
+                'max' : self.max
+                }
+
+    @classmethod
+    def fromJSON(cls, jsonDict):
+        '''
+        :param jsonDict: digest as returned by toJSON()
+        :type jsonDict: {String : <any>}
+        :rtype: TDigest
+        '''
+        digest = cls(compression=jsonDict['compression'])
+        digest.means = np.array(jsonDict['means'], dtype=np.float64)
+        digest.weights = np.array(jsonDict['weights'], dtype=np.float64)
+        digest.count = int(round(digest.weights.sum()))
+        digest.min = jsonDict['min']
+        digest.max = jsonDict['max']
+        return digest
+
+class SpaceSaving(object):
+    '''
+    Space-Saving heavy hitters (Metwally, Agrawal, and El Abbadi)
+    over a stream of weighted labels. At most capacity labels are
+    counted; a label that is not counted takes over the counter
+    of the currently smallest one, and inherits its count as
+    the error bound. Every label whose weight exceeds
+    total / capacity is among the counted labels, and each count
+    overestimates the label's weight by at most its error.
+    The counts add up to the total weight.
+    '''
+
+    def __init__(self, capacity):
+        '''
+        :param capacity: maximum number of labels counted
+        :type capacity: int
+        '''
+        if capacity < 1:
+            raise ValueError('SpaceSaving needs a capacity of at least 1, not %s' % capacity)
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # Min-heap of (count, sequence number, label). Counts
+        # in the heap may lag behind self.counts; since counts
+        # only grow, a lagging entry is refreshed when it
+        # comes to the top:
+        self.heap = []
+        self.sequence = itertools.count()
+
+    def update(self, label, weight=1):
+        '''
+        :param label: the category
+        :type label: <any hashable>
+        :param weight: weight of this occurrence
+        :type weight: {int | float}
+        '''
+        self.total += weight
+        if label in self.counts:
+            self.counts[label] += weight
+            return
+        if len(self.counts) < self.capacity:
+            (self.counts[label], self.errors[label]) = (weight, 0)
+        else:
+            minCount = self.popMinimum()
+            (self.counts[label], self.errors[label]) = (minCount + weight, minCount)
+        heapq.heappush(self.heap, (self.counts[label], next(self.sequence), label))
+
+    def updateChunk(self, rows):
+        '''
+        Count a chunk of labels, or of (label, weight) pairs.
+        Repeated labels in the chunk are added up first, which
+        saves most counter updates on skewed streams.
+        :param rows: labels or (label, weight) pairs
+        :type rows: [{<any hashable> | (<any hashable>, {int | float})}]
+        '''
+        chunkCounts = {}
+        for row in rows:
+            (label, weight) = row if isinstance(row, (tuple, list)) else (row, 1)
+            chunkCounts[label] = chunkCounts.get(label, 0) + weight
+        for (label, weight) in chunkCounts.items():
+            self.update(label, weight)
+
+    def popMinimum(self):
+        '''
+        Remove the label with the smallest count.
+        :return: its count
+        :rtype: {int | float}
+        '''
+        while True:
+            (count, _, label) = heapq.heappop(self.heap)
+            if self.counts[label] == count:
+                del self.counts[label]
+                del self.errors[label]
+                return count
+            heapq.heappush(self.heap, (self.counts[label], next(self.sequence), label))
+
+    def top(self, k):
+        '''
+        :param k: number of labels to return
+        :type k: int
+        :return: the k labels with the largest counts, with their
+            counts and error bounds, largest first
+        :rtype: [(<any hashable>, {int | float}, {int | float})]
+        '''
+        largest = heapq.nlargest(k, self.counts.items(), key=lambda labelCount: labelCount[1])
+        return [(label, count, self.errors[label]) for (label, count) in largest]
@@ -0,0 +1,108 @@
+'''
+Created on Oct 16, 2026
+'''
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from batchreports import generateReports, pageFileName, partitionCSV
+import batchreports
+from chartmaker import DataSeries, Histogram
+
+
+def problemCharts(courseName, csvFileName):
+    '''
+    Report spec used by the tests: a histogram of
+    correct and incorrect answers in one course.
+    '''
+    with open(csvFileName, 'r') as fd:
+        rows = list(csv.DictReader(fd))
+    numCorrect = sum(int(row['numCorrect']) for row in rows)
+    numIncorrect = sum(int(row['numIncorrect']) for row in rows)
+    return [Histogram(courseName, 'Correctness', ['correct', 'incorrect'], DataSeries([numCorrect, numIncorrect])),
+            Histogram(courseName, 'Attempts', ['rows'], DataSeries([len(rows)]))]
+
+class TestBatchReports(unittest.TestCase):
+
+    def setUp(self):
+        self.outDir = tempfile.mkdtemp()
+        # testProblemSet.csv holds one course; move every
+        # third row to a second one:
+        with open('data/testProblemSet.csv', 'r') as fd:
+            rows = [row for row in csv.reader(fd) if row]
+        for row in rows[1::3]:
+            row[0] = 'Engineering/db/Databases'
+        self.rows = rows
+        self.csvFileName = os.path.join(self.outDir, 'problems.csv')
+        with open(self.csvFileName, 'w') as fd:
+            csv.writer(fd).writerows(rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.outDir)
+
+    def testPartitionCSV(self):
+        batchreports.MAX_OPEN_PARTITION_FILES = 1
+        try:
+            partitions = partitionCSV(self.csvFileName, 'course_display_name', self.outDir)
+        finally:
+            batchreports.MAX_OPEN_PARTITION_FILES = 64
+        rows = self.rows
+        self.assertEqual(['Engineering/db/Databases', 'Engineering/EE368/Digital_Image_Proceing'], list(partitions.keys()))
+        numRows = 0
+        for (course, partitionFile) in partitions.items():
+            with open(partitionFile, 'r') as fd:
+                partitionRows = list(csv.reader(fd))
+            self.assertEqual(rows[0], partitionRows[0])
+            self.assertTrue(all(row[0] == course for row in partitionRows[1:]))
+            numRows += len(partitionRows) - 1
+        self.assertEqual(len(rows) - 1, numRows)
+
+    def testKeysWithSameFileName(self):
+        keys = ['a/b', 'a b', 'a_b']
+        self.assertEqual(3, len(set(pageFileName(self.outDir, key) for key in keys)))
+        self.assertEqual(os.path.join(self.outDir, 'a_b.html'), pageFileName(self.outDir, 'a_b'))
+        csvFileName = os.path.join(self.outDir, 'keys.csv')
+        with open(csvFileName, 'w') as fd:
+            csv.writer(fd).writerows([['key', 'value']] + [[key, str(value)] for (value, key) in enumerate(keys * 2)])
+        partitions = partitionCSV(csvFileName, 'key', self.outDir)
+        self.assertEqual(keys, list(partitions.keys()))
+        for (value, key) in enumerate(keys):
+            with open(partitions[key], 'r') as fd:
+                self.assertEqual([['key', 'value'], [key, str(value)], [key, str(value + 3)]], list(csv.reader(fd)))
+
+    def testGenerateReports(self):
+        partitions = partitionCSV(self.csvFileName, 'course_display_name', self.outDir)
+        pages = generateReports('test_batchreports:problemCharts', partitions, self.outDir, numProcesses=2)
+        self.assertEqual(set(partitions.keys()), set(pages.keys()))
+        for (course, pageFile) in pages.items():
+            self.assertEqual(pageFileName(self.outDir, course), pageFile)
+            with open(pageFile, 'r') as fd:
+                page = fd.read()
+            # Chart names start over on each page:
+            self.assertIn("$('#chart0')", page)
+            self.assertIn("$('#chart1')", page)
+            self.assertNotIn('chart2', page)
+        # Same pages when made serially, in this process:
+        serialDir = os.path.join(self.outDir, 'serial')
+        serialPages = generateReports(problemCharts, partitions, serialDir, numProcesses=1)
+        for (course, pageFile) in pages.items():
+            with open(pageFile, 'r') as fd, open(serialPages[course], 'r') as serialFd:
+                self.assertEqual(fd.read(), serialFd.read())
+
+    def testCommandLine(self):
+        output = subprocess.check_output([sys.executable, 'batchreports.py',
+                                          '--spec', 'test_batchreports:problemCharts',
+                                          '--key', 'course_display_name',
+                                          '--outDir', self.outDir,
+                                          self.csvFileName])
+        lines = output.decode('utf-8').strip().split('\n')
+        self.assertEqual(2, len(lines))
+        for line in lines:
+            self.assertTrue(os.path.exists(line.split(': ')[1]))
+
+if __name__ == "__main__":
+    unittest.main()
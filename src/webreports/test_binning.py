@@ -0,0 +1,102 @@
+'''
+Created on Oct 16, 2026
+'''
+import unittest
+
+import numpy as np
+
+from binning import DistinctCounter, GridAggregator, HistogramCounter, ValueSample, chooseBinCounts, \
+    histogramEdges, histogramLabels
+
+
+class TestBinning(unittest.TestCase):
+
+    def testChooseBinCounts(self):
+        self.assertIsNone(chooseBinCounts(10, 10, 100))
+        (xBins, yBins) = chooseBinCounts(365 * 24, 500, 10000)
+        self.assertTrue(xBins * yBins <= 10000)
+        self.assertTrue(xBins > yBins)
+        self.assertEqual((1, 100), chooseBinCounts(1, 1000, 100))
+        # An axis that fits is kept whole, the other gets the rest:
+        self.assertEqual((192, 52), chooseBinCounts(10000, 52, 10000))
+        self.assertEqual((833, 24), chooseBinCounts(100000, 24, 20000))
+        self.assertEqual((52, 192), chooseBinCounts(52, 10000, 10000))
+        # Text axes stay whole:
+        self.assertEqual((500, 20), chooseBinCounts(500, 52, 10000, keepX=True))
+        self.assertEqual((20000, 1), chooseBinCounts(20000, 52, 10000, keepX=True))
+
+    def testDistinctCounter(self):
+        counter = DistinctCounter(3)
+        counter.update(np.array([1., 2., np.nan, 1.]))
+        self.assertEqual(2, counter.count)
+        counter.update(np.array([5., 6., 7.]))
+        self.assertEqual(4, counter.count)
+
+    def testGridAggregator(self):
+        x = np.array([0., 1., 2., 3., 3.])
+        y = np.array([0., 0., 0., 10., 10.])
+        values = np.array([1., 2., 4., 8., np.nan])
+        for (reducer, expected) in [('sum', [3., 4., 8.]),
+                                    ('mean', [1.5, 4., 8.]),
+                                    ('max', [2., 4., 8.]),
+                                    ('min', [1., 4., 8.]),
+                                    ('count', [2., 1., 2.])]:
+            grid = GridAggregator((0, 3), (0, 10), 2, 2, reducer=reducer)
+            grid.update(x[:2], y[:2], values[:2])
+            grid.update(x[2:], y[2:], values[2:])
+            (xCenters, yCenters, cellValues) = grid.cells()
+            self.assertEqual(expected, cellValues.tolist(), reducer)
+        self.assertEqual([0.75, 2.25, 2.25], xCenters.tolist())
+        self.assertEqual([2.5, 2.5, 7.5], yCenters.tolist())
+        
+        # Grown and merged cells are those of a grid built with their geometry:
+        for reducer in ('sum', 'max', 'min', 'count'):
+            grid = GridAggregator((0, 3), (0, 10), 3, 2, reducer=reducer)
+            grid.update(x[:3], y[:3], values[:3])
+            grid.extend((-1, 5), (0, 10))
+            self.assertEqual((-1, 6), (grid.xStart, grid.xBins))
+            grid.update(np.array([5., -1.]), np.array([10., 0.]), np.array([16., 32.]))
+            grid.coarsen(4, 1)
+            expected = GridAggregator((-1, 7), (0, 10), 2, 2, reducer=reducer)
+            expected.update(np.array([0., 1., 2., 5., -1.]), np.array([0., 0., 0., 10., 0.]), 
+                            np.array([1., 2., 4., 16., 32.]))
+            self.assertEqual([column.tolist() for column in expected.cells()], 
+                             [column.tolist() for column in grid.cells()], reducer)
+        self.assertRaises(ValueError, GridAggregator, (0, 1), (0, 1), 1, 1, 'median')
+    def testHistogramEdges(self):
+        self.assertEqual([0, 2.5, 5, 7.5, 10], histogramEdges(0, 10, bins=4).tolist())
+        self.assertEqual([0, 3, 6, 9, 12], histogramEdges(0, 10, binWidth=3).tolist())
+        self.assertEqual([1, 2, 4], histogramEdges(0, 10, bins=[1, 2, 4]).tolist())
+        self.assertEqual([1, 2, 4], histogramEdges(0, 10, bins=np.array([1, 2, 4])).tolist())
+        self.assertEqual([0, 5, 10], histogramEdges(0, 10, bins=np.int64(2)).tolist())
+        self.assertEqual([-0.5, 0.5, 1.5, 2.5], histogramEdges(0, 2, bins='discrete').tolist())
+        # Freedman-Diaconis: width 2 * 4 / 8 ** (1/3) = 4
+        self.assertEqual([0, 4, 8, 12], histogramEdges(0, 12, bins='fd', iqr=4, numValues=8).tolist())
+        self.assertEqual(2, len(histogramEdges(0, 12, bins='fd', iqr=0, numValues=8)))
+        self.assertRaises(ValueError, histogramEdges, 0, 1, 'sturges')
+        self.assertRaises(ValueError, histogramEdges, 0, 1e6, binWidth=0.5)
+        self.assertEqual(['0', '1', '2'], histogramLabels(histogramEdges(0, 2, bins='discrete')))
+        self.assertEqual(['0 - 2.5', '2.5 - 5'], histogramLabels(np.array([0, 2.5, 5])))
+
+    def testHistogramCounter(self):
+        counter = HistogramCounter([0, 1, 2, 4])
+        counter.update(np.array([0., 0.5, 1., np.nan, 3.9, 4., 5.]))
+        counter.update(np.array([1.5]))
+        self.assertEqual([2, 2, 2], counter.counts.tolist())
+
+    def testValueSample(self):
+        sample = ValueSample(sampleSize=1000, seed=1)
+        for start in range(0, 100000, 10000):
+            sample.update(np.arange(start, start + 10000, dtype=np.float64))
+        self.assertEqual(1000, len(sample.values))
+        self.assertEqual((0, 99999), (sample.low, sample.high))
+        self.assertEqual(100000, sample.numValues)
+        self.assertAlmostEqual(50000, sample.iqr(), delta=5000)
+        # The same data give the same sample:
+        samples = [ValueSample(sampleSize=1000), ValueSample(sampleSize=1000)]
+        for sample in samples:
+            sample.update(np.arange(100000, dtype=np.float64))
+        self.assertEqual(samples[0].values.tolist(), samples[1].values.tolist())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,15 +3,26 @@ Created on May 8, 2014
 
 @author: paepcke
 '''
+from array import array
+import base64
 from collections import OrderedDict
 import datetime
+import gzip
+import io
+import json
+import os
 import re
+import shutil
+import subprocess
+import tempfile
 from unittest import skipIf
 import unittest
 
 from htmlmin.minify import html_minify
+import numpy as np
 
-from chartmaker import ChartMaker, Histogram, Pie, Line, Heatmap, DataSeries
+from chartmaker import AssetMode, ChartMaker, Histogram, Pie, Line, Heatmap, DataSeries, JsEncoder, JsRaw, \
+    SharedOptions
 
 
 DO_ALL = False
@@ -108,6 +119,494 @@ class TestChartMaker(unittest.TestCase):
         #self.assertEqualToFile('data/testHeatmapGroundTruth.html', html)
 
 
+    def testWriteWebPage(self):
+        heatChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)
+        videoChart = Heatmap('data/videoByWeekCS145.csv')
+        html = ChartMaker.makeWebPage([heatChart, videoChart])
+        
+        fd = io.StringIO()
+        ChartMaker.writeWebPage(fd, [heatChart, videoChart])
+        self.assertEqual(html, fd.getvalue())
+        
+        # Heatmap data must arrive in chunks, not as one string:
+        ChartMaker.STREAM_ROWS_PER_CHUNK = 5
+        try:
+            chunks = list(ChartMaker.iterWebPage([heatChart, videoChart]))
+        finally:
+            ChartMaker.STREAM_ROWS_PER_CHUNK = 1000
+        self.assertEqual(html, ''.join(chunks))
+        self.assertTrue(len(chunks) > len(heatChart.heatmapData) / 5)
+
+    def testJsEncoder(self):
+        encoder = JsEncoder()
+        self.assertEqual("{title: {text: 'It\\'s \\\\ <\\/b>\\n'},'data-id': [1,2.5,null,true],fn: f(x)}",
+                         encoder.encode({'title' : {'text' : "It's \\ </b>\n"},
+                                         'data-id' : [1, 2.5, None, True],
+                                         'fn' : JsRaw('f(x)')
+                                         }))
+        self.assertEqual('[null,null]', encoder.encode([float('nan'), float('inf')]))
+        self.assertEqual("{name: 'CS101',data: [1,3]}", str(DataSeries([1,3], legendLabel='CS101')))
+        
+    def testLegacyAdd(self):
+        histChart = Histogram('Testchart', 
+                              'Correctness',
+                              ['correct', 'incorrect'],
+                              self.histogramData)
+        histChart.add('credits: {')
+        histChart.add('enabled: false},')
+        histChart.addDictItem('exporting', enabled='false', width=400)
+        histChart.add("subtitle: {text: 'sub'},")
+        histChart.backtrack()
+        self.assertTrue(histChart.getChartFuncSource().endswith(
+                        "series: [{name: '',data: [34,9]}],credits: {enabled: false},"
+                        "exporting: {enabled: false,width: 400},subtitle: {text: 'sub'}});});"))
+
+    def testLegacyFuncDef(self):
+        histChart = Histogram('Testchart', 'Correctness', ['correct', 'incorrect'], self.histogramData)
+        histChart.funcDef += "subtitle: {text: 'sub'},"
+        histChart.funcDef = histChart.funcDef[:-1]
+        self.assertTrue(histChart.getChartFuncSource().endswith(
+                        "series: [{name: '',data: [34,9]}],subtitle: {text: 'sub'}});});"))
+        histChart.funcDef = histChart.thisChartFuncHeader
+        histChart.funcDef += "title: {text: 'Other'},"
+        self.assertEqual(histChart.thisChartFuncHeader + "title: {text: 'Other'}" + ChartMaker.CHART_FUNC_FOOTER,
+                         histChart.getChartFuncSource())
+        histChart.funcDef = 'f({'
+        self.assertEqual('f({' + ChartMaker.CHART_FUNC_FOOTER, histChart.getChartFuncSource())
+
+    def testLegacyNestedAdd(self):
+        lineChart = Line('Activity', self.xAxisLabels, 'Count', self.lineData)
+        lineChart.add('plotOptions: {')
+        lineChart.addDictItem('pie', cursor="'pointer'")
+        lineChart.addDictItem('line', lineWidth=2)
+        lineChart.backtrack()
+        lineChart.add('},xAxis2: {')
+        lineChart.addDictItem('labels', x=2)
+        lineChart.backtrack()
+        lineChart.add('},')
+        lineChart.addDictItem('yAxis2')
+        lineChart.backtrack()
+        source = lineChart.getChartFuncSource()
+        self.assertIn("plotOptions: {pie: {cursor: 'pointer'},line: {lineWidth: 2}},"
+                      "xAxis2: {labels: {x: 2}},yAxis2: {}});", source)
+        # Repeated options add to each other:
+        lineChart = Line('Activity', self.xAxisLabels, 'Count', self.lineData)
+        lineChart.addDictItem('credits', enabled='false')
+        lineChart.addDictItem('credits', text="'WebReports'")
+        self.assertIn("credits: {enabled: false,text: 'WebReports'}", lineChart.getChartFuncSource())
+        lineChart.add('exporting: {enabled: false}')
+        lineChart.addDictItem('legend', enabled='false')
+        self.assertIn("exporting: {enabled: false},legend: {enabled: false}});", lineChart.getChartFuncSource())
+        if shutil.which('node') is not None:
+            with tempfile.NamedTemporaryFile('w', suffix='.js') as fd:
+                fd.write(source)
+                fd.flush()
+                self.assertEqual(0, subprocess.call(['node', '--check', fd.name]))
+
+    def testHeatmapPluginOncePerPage(self):
+        heatCharts = [Heatmap('data/testHeatmapInput.csv', rowsToSkip=1) for _ in range(3)]
+        html = ChartMaker.makeWebPage(heatCharts)
+        self.assertEqual(1, html.count('function KDTree'))
+        for heatChart in heatCharts:
+            self.assertNotIn('KDTree', heatChart.getChartFuncSource())
+        # Plugin is read from disk once per process:
+        self.assertIs(ChartMaker.getScriptSource('heatmapHighchartsPlugin.js'),
+                      ChartMaker.getScriptSource('heatmapHighchartsPlugin.js'))
+
+    def testSharedOptions(self):
+        pies = [Pie('Course %d' % courseIndex, self.pieData) for courseIndex in range(3)]
+        lineChart = Line('Activity', ['Mon', 'Tue'], 'Count', [DataSeries([1, 2], legendLabel='CS145')])
+        html = ChartMaker.makeWebPage(pies + [lineChart])
+        plotOptions = JsEncoder().encode(pies[0].options['plotOptions'])
+        self.assertEqual(1, html.count(plotOptions))
+        self.assertIn('var WR_SHARED = [%s];' % plotOptions, html)
+        for pie in pies:
+            funcSource = pie.getChartFuncSource(SharedOptions(pies, 2, 32))
+            self.assertIn("title: {text: '%s'},plotOptions: WR_SHARED[0],series: [{type: 'pie'" % pie.options['title']['text'],
+                          funcSource)
+            # Highcharts assigns to the chart options:
+            self.assertIn('chart: {plotBackgroundColor: null', funcSource)
+        # The line chart shares nothing, and series data are never shared:
+        self.assertIn(lineChart.getChartFuncSource(), html)
+        self.assertEqual(1, html.count(pies[1].getChartFuncSource(SharedOptions(pies, 2, 32))))
+        # Chart, series, and data options of heatmaps stay with each chart:
+        heatCharts = [Heatmap(['x,y,z', '1,2,3', '2,3,4'], rowsToSkip=1) for _ in range(2)]
+        sharedOptions = SharedOptions(heatCharts, 2, 1)
+        for heatChart in heatCharts:
+            funcSource = heatChart.getChartFuncSource(sharedOptions)
+            for optionName in ('chart', 'series', 'data'):
+                self.assertNotIn('%s: WR_SHARED' % optionName, funcSource)
+                self.assertIn('%s: ' % optionName, funcSource)
+        # Nothing is shared on single-chart pages:
+        self.assertNotIn('WR_SHARED', ChartMaker.makeWebPage(pies[0]))
+
+    def testLazyCharts(self):
+        lineChart = Line('Activity', ['Mon', 'Tue'], 'Count', [DataSeries([1, 2], legendLabel='CS145')])
+        pie = Pie('Regions', self.pieData)
+        html = ChartMaker.makeWebPage([lineChart, pie], lazy=True)
+        self.assertIn('WR.whenVisible = function', html)
+        for chart in (lineChart, pie):
+            self.assertIn(" WebReports.whenVisible('%s', function () {\n     $('#%s').highcharts({\n" % 
+                          (chart.getInternalName(), chart.getInternalName()), html)
+        self.assertNotIn('$(function', html)
+        # The options are the same either way:
+        self.assertEqual(lineChart.getChartFuncSource()[len(lineChart.thisChartFuncHeader):],
+                         lineChart.getChartFuncSource(lazy=True).split('\n', 2)[2])
+        # Lazy charts with sidecars load their data when made:
+        lineChart.setSidecar('report.%s.js' % lineChart.getInternalName())
+        self.assertTrue(lineChart.getChartFuncSource(lazy=True).startswith(
+                        " WebReports.whenVisible('%s', function () {\n WebReports.whenData('%s', 'report.%s.js', function () {\n" %
+                        ((lineChart.getInternalName(),) * 3)))
+        self.assertTrue(lineChart.getChartFuncSource(lazy=True).endswith('});});});'))
+
+    def testPageHighchartsFiles(self):
+        lineChart = Line('Activity', ['Mon', 'Tue'], 'Count', [DataSeries([1, 2])])
+        csvHeatmap = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)
+        columnarHeatmap = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, payloadMode='columnar')
+        self.assertEqual(['highcharts.js', 'modules/exporting.js'],
+                         ChartMaker.getPageHighchartsFiles([lineChart]))
+        self.assertEqual(['highcharts.js', 'modules/exporting.js', 'modules/heatmap.js'],
+                         ChartMaker.getPageHighchartsFiles([columnarHeatmap, lineChart]))
+        self.assertEqual(['highcharts.js', 'modules/data.js', 'modules/exporting.js', 'modules/heatmap.js'],
+                         ChartMaker.getPageHighchartsFiles([csvHeatmap, columnarHeatmap]))
+        html = ChartMaker.makeWebPage([lineChart])
+        self.assertEqual(['http://ajax.googleapis.com/ajax/libs/jquery/1.8.2/jquery.min.js',
+                          ChartMaker.HIGHCHARTS_URL + '/highcharts.js',
+                          ChartMaker.HIGHCHARTS_URL + '/modules/exporting.js'],
+                         re.findall(r'src="([^"]*)"', html))
+
+    def testInlineAssets(self):
+        heatChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, payloadMode='columnar')
+        html = ChartMaker.makeWebPage([heatChart], assets=AssetMode.INLINE)
+        # Nothing is loaded from elsewhere:
+        self.assertIsNone(re.search(r'<script[^>]* src=', html))
+        # Adapter and shim come before the chart functions,
+        # each Highcharts file once:
+        self.assertTrue(html.index('HighchartsAdapter') < html.index('win.$ = function') < html.index(heatChart.getChartFuncSource()))
+        for fileName in ChartMaker.getPageHighchartsFiles([heatChart]):
+            self.assertEqual(1, html.count(ChartMaker.getScriptSource('highcharts/' + fileName)))
+        self.assertFalse(ChartMaker.getScriptSource('highcharts/modules/data.js') in html)
+        with self.assertRaises(ValueError):
+            ChartMaker.makeWebPage([heatChart], assets=AssetMode.COPY)
+
+    def testCopiedAssets(self):
+        outDir = tempfile.mkdtemp()
+        try:
+            lineChart = Line('Activity', ['Mon', 'Tue'], 'Count', [DataSeries([1, 2])])
+            files = ChartMaker.writeWebPageWithSidecars(os.path.join(outDir, 'a.html'), [lineChart], 
+                                                        compress=False, assets=AssetMode.COPY)
+            bundleFileName = files[-1]
+            self.assertTrue(re.match(r'webreports-[0-9a-f]{12}\.js$', os.path.basename(bundleFileName)))
+            with open(bundleFileName, 'r') as fd:
+                self.assertEqual(ChartMaker.getAssetBundle([lineChart]), fd.read())
+            with open(files[0], 'r') as fd:
+                page = fd.read()
+            self.assertIn('<script type="text/javascript" src="%s"></script>' % os.path.basename(bundleFileName), page)
+            self.assertNotIn('googleapis', page)
+            # Pages with the same charts share the bundle:
+            self.assertEqual(bundleFileName, ChartMaker.writeAssetBundle(outDir, lineChart))
+        finally:
+            shutil.rmtree(outDir)
+
+    def testHeatmapRenderInWorker(self):
+        self.assertNotIn('renderInWorker', Heatmap('data/testHeatmapInput.csv', rowsToSkip=1).getChartFuncSource())
+        heatChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, renderInWorker=True)
+        self.assertIn('renderInWorker: true', heatChart.getChartFuncSource())
+
+    def testHeatmapColumnarPayload(self):
+        heatChart = Heatmap('data/testHeatmapInput.csv', 
+                            rowsToSkip=1, 
+                            payloadMode='columnar',
+                            valueQuantum=0.1)
+        csvChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)
+        html = ChartMaker.makeWebPage([heatChart, csvChart])
+        
+        # Each heatmap has its own data element:
+        self.assertIn('<pre id="chart1_csv"', html)
+        self.assertIn("getElementById('chart1_csv')", html)
+        self.assertIn("WebReports.heatmapPoints('chart0')", html)
+        self.assertNotIn('<pre id="chart0_csv"', html)
+        
+        payload = re.search(r'<script type="application/json" id="chart0_data">(.*?)</script>', html, re.DOTALL)
+        chunk = json.loads(payload.group(1))['chunks'][0]
+        self.assertEqual('f64', chunk['x']['type'])
+        self.assertEqual('i32', chunk['y']['type'])
+        self.assertEqual({'type' : 'i32', 'scale' : 0.1}, dict((key, chunk['value'][key]) for key in ('type', 'scale')))
+        xCol = array('d', base64.b64decode(chunk['x']['data']))
+        valueCol = array('i', base64.b64decode(chunk['value']['data']))
+        # 2013-01-01,0,1.3:
+        self.assertEqual(ChartMaker.datetimeToJavaScriptMillis(datetime.datetime(2013,1,1)), xCol[0])
+        self.assertEqual(13, valueCol[0])
+        self.assertEqual(len(csvChart.heatmapData) - 1, len(valueCol))
+
+    def testFindMinMaxYZ(self):
+        heatChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)
+        (xmin, xmax, ymin, ymax, zmin, zmax) = heatChart.findMinMaxYZ(['Date,Time,Temperature',
+                                                                       '2013-01-02,0,1.3',
+                                                                       '2013-01-01,23,-4',
+                                                                       '2013-01-01,7,',
+                                                                       '2013-01-03,x,99'
+                                                                       ],
+                                                                      rowsToSkip=1)
+        self.assertEqual(heatChart.pythonToJavaScriptType(datetime.datetime(2013,1,1)), xmin)
+        self.assertEqual(heatChart.pythonToJavaScriptType(datetime.datetime(2013,1,2)), xmax)
+        # Rows with missing or non-numeric cells are ignored:
+        self.assertEqual((0, 23, -4, 1.3), (ymin, ymax, zmin, zmax))
+        self.assertEqual((1, 3, 10, 30, 5, 6), heatChart.findMinMaxYZ([(1, 10, 5), (3, 30, 6)]))
+        # Conversion functions of the caller are applied:
+        self.assertEqual((-30, -10, 5, 6), heatChart.findMinMaxYZ(['1,10,5', '3,30,6', '4,x,7'],
+                                                                  yToComparableFunc=lambda y: -int(y),
+                                                                  zToComparableFunc=float)[2:])
+
+    def testHeatmapRaggedRows(self):
+        heatChart = Heatmap(['x,y,z', '1,2', '3,4,5,6', '7,8,9'], rowsToSkip=1)
+        self.assertEqual(1, heatChart.statistics.numMissing)
+        self.assertEqual((3, 7, 4, 8, 5, 9), heatChart.statistics.extrema())
+
+    def testHeatmapBinning(self):
+        heatChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, maxCells=1000, reducer='max')
+        (xCol, yCol, valueCol) = heatChart.grid.cells()
+        self.assertTrue(len(xCol) <= 1000)
+        self.assertEqual(heatChart.statistics.extrema()[5], np.nanmax(valueCol))
+        series = heatChart.options['series'][0]
+        self.assertEqual(heatChart.grid.xBinWidth, series['colsize'])
+        self.assertEqual('datetime', heatChart.options['xAxis'].axisDict['type'])
+        page = ChartMaker.makeWebPage([heatChart])
+        self.assertIn('x,y,value\n', page)
+        self.assertEqual(len(xCol) + 1, page.count('\n', page.index('x,y,value'), page.index('</pre>')))
+        
+        # Data that fit are not binned:
+        self.assertIsNone(Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, maxCells=10000).grid)
+        heatChart = Heatmap(['x,y,z', '1,1,1', '2,2,2', '3,3,3'], rowsToSkip=1, binning=(1, 1), 
+                            reducer='sum', payloadMode='columnar')
+        self.assertEqual(([2.0], [2.0], [6.0]), tuple(column.tolist() for column in heatChart.grid.cells()))
+        self.assertEqual(6, heatChart.options['colorAxis']['max'])
+
+    def testPieFromStream(self):
+        countries = ['US'] * 50 + ['IN'] * 30 + ['DE'] * 10 + ['c%d' % i for i in range(200)]
+        pieChart = Pie.fromStream('Participant Origin', iter(countries), topK=3, capacity=40)
+        sliceData = pieChart.options['series'][0]['data']
+        self.assertEqual(['US', 'IN', 'DE', 'Other'], [name for (name, _) in sliceData])
+        self.assertEqual(len(countries), sum(size for (_, size) in sliceData))
+        # Exact counts, of weighted rows:
+        rows = [('US', 2.5), ('IN', 1), ('US', 1)] + [('c%d' % i, 0.01) for i in range(1000)]
+        sliceData = Pie.fromStream('Participant Origin', rows, topK=2, capacity=20, exact=True).options['series'][0]['data']
+        self.assertEqual([['US', 3.5], ['IN', 1]], sliceData[:2])
+        self.assertAlmostEqual(10, sliceData[2][1])
+        # No Other slice when nothing is left:
+        self.assertEqual(2, len(Pie.fromStream('Origin', ['US', 'IN', 'US'], topK=2).options['series'][0]['data']))
+        with self.assertRaises(ValueError):
+            Pie.fromStream('Origin', iter(countries), exact=True)
+
+    def testHeatmapCategories(self):
+        videoIds = ['i4x-Engineering-db-video-%032x' % video for video in range(3)]
+        lines = ['week,video,views'] + ['%d,"%s",%d' % (week, videoIds[(week + video) % 3], week * video)
+                                        for week in range(1, 5) for video in range(3)]
+        heatChart = Heatmap(lines, rowsToSkip=1)
+        yAxis = heatChart.options['yAxis'].axisDict
+        self.assertEqual(videoIds, yAxis['categories'])
+        self.assertEqual((0, 2), (yAxis['min'], yAxis['max']))
+        self.assertNotIn('categories', heatChart.options['xAxis'].axisDict)
+        # Each label occurs once in the page:
+        page = ChartMaker.makeWebPage([heatChart])
+        self.assertEqual(1, page.count(videoIds[0]))
+        self.assertIn('x,y,value\n1.0,1,0.0\n1.0,2,1.0\n', page)
+        columnarChart = Heatmap(lines, rowsToSkip=1, payloadMode='columnar')
+        payload = ''.join(columnarChart.iterColumnarPayload())
+        chunk = json.loads(payload[payload.index('{'):payload.rindex('}') + 1])['chunks'][0]
+        self.assertEqual('i32', chunk['y']['type'])
+        self.assertEqual([1, 2, 0], array('i', base64.b64decode(chunk['y']['data'])).tolist()[:3])
+        # Numeric x keeps its column width:
+        self.assertEqual(JsRaw('24 * 36e5'), heatChart.options['series'][0]['colsize'])
+        self.assertIn('axis.categories[value]', heatChart.getChartFuncSource())
+        # Only the weeks are binned; each video keeps its row:
+        binnedChart = Heatmap(lines, rowsToSkip=1, maxCells=6, reducer='sum')
+        self.assertEqual((2, 3), (binnedChart.grid.xBins, binnedChart.grid.yBins))
+        (xCol, yCol, valueCol) = binnedChart.grid.cells()
+        self.assertEqual([0, 1, 2], sorted(set(yCol.tolist())))
+        self.assertEqual(sum(week * video for week in range(1, 5) for video in range(3)), valueCol.sum())
+        self.assertEqual(1, binnedChart.options['series'][0]['rowsize'])
+        
+        # Text x: one column per category, named in the tooltip:
+        heatChart = Heatmap(['x,y,z', 'a,p,1', 'b,q,2', 'a,q,3'], rowsToSkip=1)
+        self.assertEqual(['a', 'b'], heatChart.options['xAxis'].axisDict['categories'])
+        series = heatChart.options['series'][0]
+        self.assertEqual(1, series['colsize'])
+        self.assertNotIn('tooltip', series)
+        self.assertNotIn('%e %b', ''.join(str(value) for value in series.values()))
+        self.assertIn('axis.categories[value]', heatChart.options['tooltip']['formatter'])
+
+    def testHeatmapColorScale(self):
+        heatChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)
+        colorAxis = heatChart.options['colorAxis']
+        self.assertEqual((-14.4, 26.3), (colorAxis['min'], colorAxis['max']))
+        self.assertEqual([0, 0.5, 0.9, 1], [stop[0] for stop in colorAxis['stops']])
+        # Outliers beyond the percentiles saturate the colors:
+        clippedAxis = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, colorPercentiles=(5, 95)).options['colorAxis']
+        self.assertTrue(-14.4 < clippedAxis['min'] < clippedAxis['max'] < 26.3)
+        quantileAxis = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, colorPercentiles=(5, 95), 
+                               quantileStops=True).options['colorAxis']
+        self.assertEqual((clippedAxis['min'], clippedAxis['max']), (quantileAxis['min'], quantileAxis['max']))
+        positions = [stop[0] for stop in quantileAxis['stops']]
+        self.assertEqual(sorted(positions), positions)
+        self.assertNotEqual([0, 0.5, 0.9, 1], positions)
+
+    def testHistogramFromValues(self):
+        histogramSeries = [0,0,1,1,0,1,1,1,3,1,1,3,1,1,1,1,1,3,2,2,1,3,0,1,1,1,1,1,1,0,1,0,0,1,0,1,1,1,0,1,1,1,1]
+        histChart = Histogram.fromValues('Testchart', 'Attempts', histogramSeries, bins='discrete')
+        self.assertEqual(['0', '1', '2', '3'], histChart.options['xAxis'].axisDict['categories'])
+        self.assertEqual([self.numWrong, 28, 2, 4], histChart.options['series'][0]['data'])
+        histChart = Histogram.fromValues('Testchart', 'Attempts', np.array([1., 2., np.nan, 9.]), binWidth=5)
+        self.assertEqual(['1 - 6', '6 - 11'], histChart.options['xAxis'].axisDict['categories'])
+        self.assertEqual([2, 1], histChart.options['series'][0]['data'])
+        # NumPy edges and bin counts:
+        histChart = Histogram.fromValues('Testchart', 'Attempts', histogramSeries, bins=np.array([0, 1, 4]))
+        self.assertEqual([self.numWrong, 34], histChart.options['series'][0]['data'])
+        histChart = Histogram.fromValues('Testchart', 'Attempts', histogramSeries, bins=np.int64(3))
+        self.assertEqual(3, len(histChart.options['series'][0]['data']))
+
+    def testHistogramFromCSVColumn(self):
+        ChartMaker.INGEST_ROWS_PER_CHUNK = 1000
+        try:
+            histChart = Histogram.fromCSVColumn('Temperatures', 'Degrees', 'data/testHeatmapInput.csv', 
+                                                column=2, rowsToSkip=1, bins=10)
+        finally:
+            ChartMaker.INGEST_ROWS_PER_CHUNK = 100000
+        statistics = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1).statistics
+        self.assertEqual('-14.4 - -10.33', histChart.options['xAxis'].axisDict['categories'][0])
+        counts = histChart.options['series'][0]['data']
+        self.assertEqual(10, len(counts))
+        self.assertEqual(statistics.numRows, sum(counts))
+        # Freedman-Diaconis bins; the sample holds all values of this file:
+        temperatures = np.genfromtxt('data/testHeatmapInput.csv', delimiter=',', skip_header=1, usecols=2)
+        histChart = Histogram.fromCSVColumn('Temperatures', 'Degrees', 'data/testHeatmapInput.csv', column=2, rowsToSkip=1)
+        self.assertEqual(np.histogram(temperatures[~np.isnan(temperatures)], bins='fd')[0].tolist(), 
+                         histChart.options['series'][0]['data'])
+
+    def testLineDownsampling(self):
+        series = DataSeries([float(i % 7) for i in range(10000)], legendLabel='Activity')
+        chart = Line('Activity', [], 'Count', [series, DataSeries([1, 2, 3])], downsampleTo=50)
+        data = chart.options['series'][0].asOptionTree()['data']
+        self.assertEqual(50, len(data))
+        self.assertEqual([0, 0.0], data[0].tolist())
+        # The caller's series is not changed:
+        self.assertIsNone(series.downsampleTo)
+        self.assertEqual(10000, len(series.asOptionTree()['data']))
+        self.assertEqual([1, 2, 3], chart.options['series'][1].asOptionTree()['data'])
+        self.assertIn("data: [[0,0],", chart.getChartFuncSource())
+        pairs = DataSeries([[1.5, 1], [2.5, None], [3.5, 3], [4.5, 0]], downsampleTo=3).downsampledData()
+        self.assertEqual([[1.5, 1.0], [3.5, 3.0], [4.5, 0.0]], pairs.tolist())
+
+    def testLineRegularInterval(self):
+        hours = [datetime.datetime(2014, 1, 1) + datetime.timedelta(hours=hour) for hour in range(5000)]
+        series = DataSeries([hour % 24 for hour in range(5000)], legendLabel='Activity')
+        chart = Line('Activity', hours, 'Count', [series, DataSeries([1, None, 3])])
+        source = chart.getChartFuncSource()
+        self.assertNotIn('categories', source)
+        self.assertIn("xAxis: {type: 'datetime'}", source)
+        start = ChartMaker.datetimeToJavaScriptMillis(hours[0])
+        self.assertEqual(2, source.count('pointStart: %d,pointInterval: 3600000' % start))
+        self.assertIn("data: [1,null,3]", source)
+        self.assertIn("data: [0,1,2,", source)
+        # Long series stay on Highcharts' fast path:
+        self.assertEqual({'animation' : False, 'marker' : {'enabled' : False}, 'shadow' : False}, 
+                         chart.options['plotOptions']['series'])
+        # Downsampled points are placed at their time:
+        series = DataSeries(list(range(5000)), downsampleTo=10)
+        chart = Line('Activity', [hour.isoformat() for hour in hours], 'Count', series)
+        self.assertEqual(ChartMaker.datetimeToJavaScriptMillis(hours[-1]), 
+                         chart.options['series'][0].downsampledData()[-1][0])
+        # The caller's series is not changed:
+        self.assertNotIn('pointStart', series)
+        self.assertIsInstance(series['data'], list)
+        # Explicit intervals, irregular dates, and other labels:
+        self.assertEqual((start, 60000), Line.regularInterval(None, hours[0], datetime.timedelta(minutes=1)))
+        self.assertEqual((start, 60000), Line.regularInterval(hours[:1], pointInterval=60000))
+        self.assertIsNone(Line.regularInterval(['2014-01-01', '2014-01-02', '2014-01-04']))
+        self.assertIsNone(Line.regularInterval(self.xAxisLabels))
+        self.assertNotIn('plotOptions', Line('Completion', self.xAxisLabels, 'Percent', self.lineData).options)
+
+    def testArrayDataSeries(self):
+        values = array('d', [1.25, 2.5, float('nan'), 4])
+        series = DataSeries(values, legendLabel='Grades')
+        self.assertIs(values, series['data'])
+        encoder = JsEncoder()
+        self.assertEqual("{name: 'Grades',data: [1.25,2.5,null,4.0]}", encoder.encode(series))
+        self.assertEqual("{name: 'Grades',data: [1.2,2.5,null,4.0]}", 
+                         encoder.encode(DataSeries(values, legendLabel='Grades', precision=1)))
+        self.assertEqual('[1,2,null]', JsEncoder.encodeNumbers([1.0, 2.0, None]))
+        self.assertEqual('[0.1,3.0]', JsEncoder.encodeNumbers(np.array([0.1, 3], dtype=np.float32)))
+        self.assertEqual('[7,-3]', JsEncoder.encodeNumbers(array('i', [7, -3])))
+        self.assertEqual('[[1,0.5],[2,null]]', JsEncoder.encodeNumbers(np.array([[1, 0.5], [2, np.inf]])))
+        self.assertEqual('[1356998400000,null]', 
+                         JsEncoder.encodeNumbers(np.array(['2013-01-01', 'NaT'], dtype='datetime64[D]')))
+        
+        # Chart classes take array series unchanged:
+        self.assertIn('data: [3,4]', Histogram('Counts', 'Answer', ['right', 'wrong'], 
+                                                DataSeries(np.array([3, 4]))).getChartFuncSource())
+        self.assertIn("data: [['Europe',20.5]]", Pie('Origin', [DataSeries(array('d', [20.5]), legendLabel='Europe')]).getChartFuncSource())
+
+    def testSidecars(self):
+        outDir = tempfile.mkdtemp()
+        try:
+            heatChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)
+            lineChart = Line('Activity', ['Mon', 'Tue'], 'Count', [DataSeries([1, 2], legendLabel='CS145')])
+            inlinePage = ChartMaker.makeWebPage([Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)])
+            pageFile = os.path.join(outDir, 'report.html')
+            files = ChartMaker.writeWebPageWithSidecars(pageFile, [heatChart, lineChart])
+            self.assertEqual([pageFile, 
+                              os.path.join(outDir, 'report.chart0.js'), os.path.join(outDir, 'report.chart0.js.gz'),
+                              os.path.join(outDir, 'report.chart1.js'), os.path.join(outDir, 'report.chart1.js.gz')],
+                             files)
+            with open(pageFile, 'r') as fd:
+                page = fd.read()
+            self.assertTrue(len(page) * 5 < len(inlinePage))
+            self.assertIn("WebReports.whenData('chart0', 'report.chart0.js', function () {", page)
+            self.assertIn("csv: WebReports.getCSV('chart0')", page)
+            self.assertIn("data: WebReports.getPayload('chart1')[0]", page)
+            self.assertEqual(1, page.count('WR.receive = function'))
+            with open(files[1], 'r') as fd:
+                sidecar = fd.read()
+            with gzip.open(files[2], 'rt') as fd:
+                self.assertEqual(sidecar, fd.read())
+            self.assertTrue(sidecar.startswith("WebReports.receive('chart0', \"Date,Time,Temperature\\n2013-01-01,0,1.3\\n"))
+            with open(files[3], 'r') as fd:
+                self.assertEqual("WebReports.receive('chart1', [[1,2]]);\n", fd.read())
+            # The charts are inline again:
+            self.assertIsNone(heatChart.sidecarSrc)
+            self.assertNotIn('webreportsData.js', lineChart.scriptDependencies)
+            self.assertIn('data: [1,2]', lineChart.getChartFuncSource())
+        finally:
+            shutil.rmtree(outDir)
+
+    def testDateConversion(self):
+        self.assertEqual('Date.UTC(2013, 0, 31, 10, 5, 0, 0)', ChartMaker.pythonToJavaScriptType('2013-01-31 10:05'))
+        self.assertEqual('Date.UTC(2010, 4, 8, 21, 41, 54, 500)', 
+                         ChartMaker.pythonToJavaScriptType('2010-05-08T23:41:54.500+02:00'))
+        # Numbers are not dates:
+        self.assertEqual('9', ChartMaker.pythonToJavaScriptType('9'))
+        self.assertEqual(9, ChartMaker.pythonToJavaScriptType(9))
+        chart = ChartMaker()
+        toComparable = chart.valueToComparable('01/05/2013')
+        self.assertTrue(toComparable('01/05/2013') > toComparable('12/31/2012'))
+        self.assertEqual(10.0, chart.valueToComparable(10.0)(10.0))
+
+    def testHeatmapStreaming(self):
+        loadedChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)
+        ChartMaker.INGEST_ROWS_PER_CHUNK = 1000
+        try:
+            streamedChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, streaming=True)
+        finally:
+            ChartMaker.INGEST_ROWS_PER_CHUNK = 100000
+        self.assertIsNone(streamedChart.heatmapData)
+        self.assertEqual(loadedChart.statistics.extrema(), streamedChart.statistics.extrema())
+        self.assertEqual(loadedChart.statistics.numMissing, streamedChart.statistics.numMissing)
+        self.assertAlmostEqual(loadedChart.statistics.zMean(), streamedChart.statistics.zMean())
+        
+        # Same page, apart from chart names:
+        loadedPage = ChartMaker.makeWebPage(loadedChart).replace(loadedChart.getInternalName(), 'chart')
+        streamedPage = ChartMaker.makeWebPage(streamedChart).replace(streamedChart.getInternalName(), 'chart')
+        self.assertEqual(loadedPage, streamedPage)
 
     # --------------------------  Support Functions ------------------
 
@@ -0,0 +1,103 @@
+'''
+Created on Oct 16, 2026
+'''
+import datetime
+import unittest
+
+import numpy as np
+
+from columns import CategoryTable, ColumnKind, XYZStatistics, iterRowChunks, parseColumn, parseXYZColumns, splitColumns
+
+
+class TestColumns(unittest.TestCase):
+
+    def testSplitColumns(self):
+        self.assertEqual([['1', '4'], ['a,b', ''], ['3', '']],
+                         splitColumns(['1,"a,b",3', '4'], numCols=3))
+        self.assertEqual([[1, 4], [2, 5]], splitColumns([(1, 2), (4, 5)], numCols=2))
+        # Short and long rows that together have the expected
+        # number of separators:
+        self.assertEqual([['1', '3', '7'], ['2', '4', '8'], ['', '5', '9']],
+                         splitColumns(['1,2', '3,4,5,6', '7,8,9'], numCols=3))
+
+    def testNumericColumn(self):
+        column = parseColumn(['1.5', '', ' 3', 'n/a', '-2e1'])
+        self.assertEqual(ColumnKind.NUMERIC, column.kind)
+        self.assertEqual([False, True, False, True, False], column.invalid.tolist())
+        self.assertEqual(2, column.numInvalid())
+        self.assertEqual((-20, 3), column.extrema())
+        # None cells of tuple rows are missing:
+        for cells in ([None, 1.0, 2.0], [1.0, float('nan'), None], ['1', None, '2']):
+            column = parseColumn(cells)
+            self.assertEqual(ColumnKind.NUMERIC, column.kind)
+            self.assertEqual([cell is None or cell != cell for cell in cells], column.invalid.tolist())
+        (x, y, z) = parseXYZColumns([(1, None, 2.0), (2, 'b', None)])
+        self.assertEqual(ColumnKind.TEXT, y.kind)
+        self.assertEqual(['', 'b'], y.values.tolist())
+        self.assertEqual((True, False), tuple(y.invalid.tolist()))
+        self.assertEqual((2, 2), z.extrema())
+
+    def testDateColumn(self):
+        column = parseColumn(['2013-01-02', '2013-01-01', ''])
+        self.assertEqual(ColumnKind.DATE, column.kind)
+        self.assertEqual((datetime.datetime(2013,1,1), datetime.datetime(2013,1,2)), column.extrema())
+        self.assertEqual(np.datetime64('2013-01-02', 'ms').astype(np.int64), column.asNumbers()[0])
+        self.assertTrue(np.isnan(column.asNumbers()[2]))
+        
+        # Formats other than ISO 8601:
+        column = parseColumn(['2013-01-02', 'Jan 5 2013', 'junk'])
+        self.assertEqual(datetime.datetime(2013,1,5), column.extrema()[1])
+        self.assertEqual(1, column.numInvalid())
+        
+        # Format detected from the first date; timezones become UTC:
+        column = parseColumn(['01/05/2013', '12/31/2012', '01/05/2013'])
+        self.assertEqual(ColumnKind.DATE, column.kind)
+        self.assertEqual((datetime.datetime(2012,12,31), datetime.datetime(2013,1,5)), column.extrema())
+        column = parseColumn(['2013-01-02T01:00:00+02:00', '2013-01-02T00:00:00Z'])
+        self.assertEqual((datetime.datetime(2013,1,1,23), datetime.datetime(2013,1,2)), column.extrema())
+
+    def testXYZColumns(self):
+        (x, y, z) = parseXYZColumns(['Date,Time,Temperature', 
+                                     '2013-01-01,0,1.3', 
+                                     '2013-01-01,1,'],
+                                    rowsToSkip=1)
+        self.assertEqual((ColumnKind.DATE, ColumnKind.NUMERIC, ColumnKind.NUMERIC), (x.kind, y.kind, z.kind))
+        self.assertEqual([False, True], z.invalid.tolist())
+        (x, y, z) = parseXYZColumns([(1, 'a', 2.0), (2, 'b', 3.0)])
+        self.assertEqual(ColumnKind.TEXT, y.kind)
+        self.assertEqual(('a', 'b'), y.extrema())
+
+    def testCategoryTable(self):
+        categories = CategoryTable()
+        column = parseColumn(['vidB', 'vidA', '', 'vidB'], kind=ColumnKind.TEXT)
+        codes = column.asNumbers(categories)
+        self.assertEqual([1, 0, 1], codes[~column.invalid].tolist())
+        self.assertTrue(np.isnan(codes[2]))
+        self.assertEqual([2, 1], categories.encode(np.array(['vidC', 'vidB'])).tolist())
+        self.assertEqual(['vidA', 'vidB', 'vidC'], categories.labels)
+        # Labels of rows with a missing value are collected, too:
+        statistics = XYZStatistics()
+        statistics.update(parseXYZColumns(['1,vidB,3', '2,vidA,']))
+        self.assertEqual(['vidA', 'vidB'], statistics.categories[1].labels)
+        self.assertIsNone(statistics.categories[0])
+        restored = XYZStatistics.fromJSON(statistics.toJSON())
+        self.assertEqual(['vidA', 'vidB'], restored.categories[1].labels)
+        self.assertEqual([None, None], XYZStatistics.fromJSON(XYZStatistics().toJSON()).categories)
+
+    def testChunkedStatistics(self):
+        chunks = list(iterRowChunks('data/testHeatmapInput.csv', 1000, rowsToSkip=1))
+        self.assertEqual(9, len(chunks))
+        self.assertEqual('2013-01-01,0,1.3', chunks[0][0])
+        statistics = XYZStatistics()
+        for chunk in chunks:
+            statistics.update(parseXYZColumns(chunk, kinds=statistics.kinds))
+        self.assertEqual([ColumnKind.DATE, ColumnKind.NUMERIC, ColumnKind.NUMERIC], statistics.kinds)
+        self.assertEqual((datetime.datetime(2013,1,1), datetime.datetime(2013,12,31), 0, 23, -14.4, 26.3), 
+                         statistics.extrema())
+        self.assertEqual(8759, statistics.numRows + statistics.numMissing)
+        self.assertEqual((-14.4, 26.3), (statistics.zDigest.quantile(0), statistics.zDigest.quantile(1)))
+        self.assertEqual(statistics.zDigest.quantile(0.5), 
+                         XYZStatistics.fromJSON(statistics.toJSON()).zDigest.quantile(0.5))
+
+if __name__ == "__main__":
+    unittest.main()
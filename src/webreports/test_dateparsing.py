@@ -0,0 +1,44 @@
+'''
+Created on Oct 16, 2026
+'''
+import datetime
+import unittest
+
+from dateparsing import DateColumnParser, DateFormat, detectDateFormat, looksLikeDate, parseDatetime
+
+
+class TestDateParsing(unittest.TestCase):
+
+    def testDetectDateFormat(self):
+        self.assertEqual(DateFormat.ISO, detectDateFormat('2013-01-01'))
+        self.assertEqual(DateFormat.ISO, detectDateFormat('2010-05-08T23:41:54.000Z'))
+        self.assertEqual('%m/%d/%Y', detectDateFormat('01/05/2013'))
+        self.assertEqual('%b %d %Y', detectDateFormat('Jan 5 2013'))
+        self.assertIsNone(detectDateFormat('10.5'))
+        self.assertIsNone(detectDateFormat('Temperature'))
+        self.assertFalse(looksLikeDate('9'))
+        self.assertTrue(looksLikeDate('2013-01-01 10:00'))
+
+    def testParseDatetime(self):
+        self.assertEqual(datetime.datetime(2013,1,1), parseDatetime('2013-01-01'))
+        self.assertEqual(datetime.datetime(2010,5,8,23,41,54, tzinfo=datetime.timezone.utc), 
+                         parseDatetime('2010-05-08T23:41:54.000Z'))
+        # Odd formats go to dateutil:
+        self.assertEqual(datetime.datetime(2013,1,5,10,30), parseDatetime('Saturday, January 5th 2013 10:30'))
+        self.assertIsNone(parseDatetime('junk'))
+        self.assertIsNone(parseDatetime(''))
+        # Repeated strings come from the cache:
+        hits = parseDatetime.cache_info().hits
+        parseDatetime('2013-01-01')
+        self.assertEqual(hits + 1, parseDatetime.cache_info().hits)
+
+    def testDateColumnParser(self):
+        parser = DateColumnParser.forColumn(['', '5.1.2013', '31.12.2012'])
+        self.assertEqual('%d.%m.%Y', parser.dateFormat)
+        self.assertEqual(datetime.datetime(2013,1,5), parser.parse('5.1.2013'))
+        dates = parser.parseColumn(['', '5.1.2013', '31.12.2012', '5.1.2013'])
+        self.assertEqual(['NaT', '2013-01-05T00:00:00.000', '2012-12-31T00:00:00.000', '2013-01-05T00:00:00.000'],
+                         [str(date) for date in dates])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+'''
+Created on Oct 16, 2026
+'''
+import unittest
+
+import numpy as np
+
+from downsampling import lttbIndices
+
+
+class TestDownsampling(unittest.TestCase):
+
+    def testLttbIndices(self):
+        x = np.arange(1000, dtype=np.float64)
+        y = np.sin(x / 50.0)
+        y[500] = 10.0
+        indices = lttbIndices(x, y, 100)
+        self.assertEqual(100, len(indices))
+        self.assertEqual(0, indices[0])
+        self.assertEqual(999, indices[-1])
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        # Peaks survive:
+        self.assertIn(500, indices)
+        # Nothing to drop:
+        self.assertEqual([0, 1, 2], lttbIndices(x[:3], y[:3], 10).tolist())
+        self.assertRaises(ValueError, lttbIndices, x, y, 2)
+
+    def testMissingValues(self):
+        x = np.arange(100, dtype=np.float64)
+        y = np.ones(100)
+        y[10:20] = np.nan
+        y[50] = 5.0
+        indices = lttbIndices(x, y, 10)
+        self.assertIn(50, indices)
+        self.assertEqual(10, len(indices))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+'''
+Created on Oct 16, 2026
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from binning import GridAggregator
+from chartmaker import ChartMaker, Heatmap
+from heatmapstate import HeatmapState
+
+
+class TestHeatmapState(unittest.TestCase):
+
+    def setUp(self):
+        self.stateDir = tempfile.mkdtemp()
+        with open('data/testHeatmapInput.csv', 'r') as fd:
+            self.lines = [line.rstrip() for line in fd]
+
+    def tearDown(self):
+        shutil.rmtree(self.stateDir)
+        ChartMaker.resetChartNameIndex()
+
+    def testAppend(self):
+        state = HeatmapState(self.stateDir)
+        state.append(self.lines[:5000], rowsToSkip=1)
+        # Reopened, as by the next refresh:
+        state = HeatmapState(self.stateDir)
+        state.append(self.lines[5000:])
+        wholeChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1)
+        self.assertEqual(wholeChart.statistics.extrema(), state.statistics.extrema())
+        self.assertEqual(wholeChart.statistics.numMissing, state.statistics.numMissing)
+        self.assertAlmostEqual(wholeChart.statistics.zMean(), state.statistics.zMean())
+        
+        (xCol, yCol, valueCol) = [np.concatenate(columns) for columns in zip(*state.iterColumnChunks(1000))]
+        (wholeX, wholeY, wholeValue, _) = wholeChart.parseColumns(self.lines[1:])
+        self.assertEqual(wholeX.tolist(), xCol.tolist())
+        self.assertEqual(wholeY.tolist(), yCol.tolist())
+        np.testing.assert_array_equal(wholeValue, valueCol)
+
+    def testInterruptedAppend(self):
+        state = HeatmapState(self.stateDir)
+        state.append(self.lines[1:100])
+        with open(state.columnPath('x'), 'ab') as fd:
+            fd.write(b'\0' * 12)
+        state = HeatmapState(self.stateDir)
+        self.assertEqual(99, state.numStoredRows)
+        self.assertEqual(99 * 8, os.path.getsize(state.columnPath('x')))
+
+    def testFailedAppend(self):
+        state = HeatmapState(self.stateDir)
+        state.append(self.lines[1:100])
+        def failingSaveMeta():
+            raise IOError('Disk full')
+        state.saveMeta = failingSaveMeta
+        self.assertRaises(IOError, state.append, self.lines[100:200])
+        del state.saveMeta
+        self.assertEqual(99, state.numStoredRows)
+        for columnName in HeatmapState.COLUMN_NAMES:
+            self.assertEqual(99 * 8, os.path.getsize(state.columnPath(columnName)))
+        state.append(self.lines[100:200])
+        self.assertEqual(HeatmapState(self.stateDir).statistics.toJSON(), state.statistics.toJSON())
+        (xCol, _, _) = [np.concatenate(columns) for columns in zip(*state.iterColumnChunks())]
+        self.assertEqual(199, len(xCol))
+
+    def testIncrementalGrid(self):
+        # Rows arrive in date order, so each append
+        # extends the x range:
+        lines = self.lines[1:]
+        HeatmapState(self.stateDir).append(lines[:3000])
+        Heatmap(HeatmapState(self.stateDir), maxCells=100, reducer='max')
+        for (startRow, endRow) in ((3000, 6000), (6000, len(lines))):
+            state = HeatmapState(self.stateDir)
+            state.append(lines[startRow:endRow])
+            startRows = []
+            iterColumnChunks = state.iterColumnChunks
+            def recordingIterColumnChunks(rowsPerChunk=None, startRow=0):
+                startRows.append(startRow)
+                return iterColumnChunks(rowsPerChunk, startRow=startRow)
+            state.iterColumnChunks = recordingIterColumnChunks
+            grid = Heatmap(state, maxCells=100, reducer='max').grid
+            # Only the distinct values and the grid read rows, and only the new ones:
+            self.assertEqual([startRow, startRow], startRows)
+            self.assertTrue(grid.xBins * grid.yBins <= 100)
+            xMax = max(xCol.max() for (xCol, _, _) in iterColumnChunks())
+            self.assertTrue(grid.xStart + grid.xBins * grid.xBinWidth >= xMax)
+        # The same cells as a grid of that geometry over all rows:
+        expected = GridAggregator((grid.xStart, grid.xStart + grid.xBins * grid.xBinWidth),
+                                  (grid.yStart, grid.yStart + grid.yBins * grid.yBinWidth),
+                                  grid.xBins, grid.yBins, reducer='max')
+        for columns in state.iterColumnChunks():
+            expected.update(*columns)
+        for (expectedColumn, column) in zip(expected.cells(), grid.cells()):
+            np.testing.assert_allclose(expectedColumn, column)
+
+    def testCategoricalAppend(self):
+        textDir = os.path.join(self.stateDir, 'text')
+        HeatmapState(textDir).append(['wk1,videoB,1', 'wk1,videoA,2'])
+        state = HeatmapState(textDir)
+        state.append(['wk2,videoB,3', 'wk2,videoC,'])
+        self.assertEqual(['videoA', 'videoB', 'videoC'], state.statistics.categories[1].labels)
+        (xCol, yCol, valueCol) = next(state.iterColumnChunks())
+        self.assertEqual([0, 0, 1, 1], xCol.tolist())
+        self.assertEqual([1, 0, 1, 2], yCol.tolist())
+        self.assertIn('\n1,2,\n', ''.join(Heatmap(state).iterDivSource()))
+
+    def testHeatmapFromState(self):
+        state = HeatmapState(self.stateDir)
+        state.appendFile('data/testHeatmapInput.csv', rowsToSkip=1)
+        fileChart = Heatmap('data/testHeatmapInput.csv', rowsToSkip=1, payloadMode='columnar')
+        ChartMaker.resetChartNameIndex()
+        stateChart = Heatmap(state, payloadMode='columnar')
+        ChartMaker.resetChartNameIndex()
+        self.assertEqual(''.join(fileChart.iterDivSource()), ''.join(stateChart.iterDivSource()))
+        self.assertEqual(fileChart.getChartFuncSource(), stateChart.getChartFuncSource())
+        
+        csvPayload = ''.join(Heatmap(state, maxCells=100, reducer='max').iterDivSource())
+        self.assertIn('x,y,value\n', csvPayload)
+        csvPayload = ''.join(Heatmap(state).iterDivSource())
+        self.assertIn('\n1356998400000.0,0.0,1.3\n', csvPayload)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+'''
+Created on Oct 16, 2026
+'''
+import csv
+import unittest
+
+import numpy as np
+
+from chartmaker import ChartMaker, Heatmap
+from pivot import Pivot
+
+
+class TestPivot(unittest.TestCase):
+
+    def setUp(self):
+        with open('data/testProblemSet.csv', 'r') as fd:
+            self.problemRows = list(csv.DictReader(fd))
+        # Grow the groups over several chunks:
+        Pivot.ROWS_PER_CHUNK = 7
+
+    def tearDown(self):
+        Pivot.ROWS_PER_CHUNK = 100000
+        ChartMaker.resetChartNameIndex()
+
+    def testGroupBy(self):
+        answers = Pivot('data/testProblemSet.csv', 'resource_display_name', valueColumns=['numCorrect', 'numIncorrect'])
+        expected = {}
+        for row in self.problemRows:
+            if row['resource_display_name']:
+                sums = expected.setdefault(row['resource_display_name'], [0, 0])
+                sums[0] += int(row['numCorrect'])
+                sums[1] += int(row['numIncorrect'])
+        self.assertEqual(sorted(expected), answers.rowLabels())
+        # The empty last line of the file:
+        self.assertEqual(1, answers.numSkipped)
+        self.assertEqual([expected[label][1] for label in answers.rowLabels()], answers.values('numIncorrect')[:, 0].tolist())
+        (correct, incorrect) = answers.dataSeries()
+        self.assertEqual(('numCorrect', 'numIncorrect'), (correct['name'], incorrect['name']))
+        self.assertEqual([expected[label][0] for label in answers.rowLabels()], correct['data'].tolist())
+
+    def testReducers(self):
+        rows = [('key', 'value'), (2, 1.0), (1, 2.0), (2, 4.0), (3, None), (None, 5.0)]
+        self.assertEqual([2.0, 2.5], Pivot(rows, 'key', valueColumns='value', reducer='mean').values()[:2, 0].tolist())
+        self.assertEqual([2.0, 4.0], Pivot(rows, 0, valueColumns=1, reducer='max').values()[:2, 0].tolist())
+        counts = Pivot(rows, 'key')
+        self.assertEqual([1, 2, 3], counts.rowLabels())
+        self.assertEqual([1, 2, 1], counts.values()[:, 0].tolist())
+        self.assertEqual('count', counts.dataSeries()[0]['name'])
+        self.assertTrue(np.isnan(Pivot(rows, 'key', valueColumns='value').values()[2, 0]))
+        self.assertRaises(ValueError, Pivot, rows, 'key', reducer='sum')
+        self.assertRaises(ValueError, Pivot, rows, 'nokey')
+
+    def testKeysChangeKind(self):
+        Pivot.ROWS_PER_CHUNK = 2
+        values = Pivot(['k,v', '1,1', '2,2', 'abc,3', ',5', 'def,4', '1,6'], 'k', valueColumns='v')
+        self.assertEqual(['1', '2', 'abc', 'def'], values.rowLabels())
+        self.assertEqual([7, 2, 3, 4], values.values()[:, 0].tolist())
+        # Only the empty key:
+        self.assertEqual(1, values.numSkipped)
+
+        # Earlier keys keep the text of their cells:
+        dates = Pivot(['2013-01-01,1', '2013-01-02,2', 'x,3', '2013-01-01,4'], 0, valueColumns=1, header=False)
+        self.assertEqual(['2013-01-01', '2013-01-02', 'x'], dates.rowLabels())
+        self.assertEqual([5, 2, 3], dates.values()[:, 0].tolist())
+        numbers = Pivot(['1.50,1', '1.5,2', 'x,3', '1.50,4', '1.5,5'], 0, valueColumns=1, header=False)
+        self.assertEqual(['1.50', 'x'], numbers.rowLabels())
+        self.assertEqual([12, 3], numbers.values()[:, 0].tolist())
+
+    def testPivotToHeatmap(self):
+        views = Pivot('data/videoByWeekCS145.csv', 0, columnKey=1, valueColumns=2, header=False)
+        self.assertEqual([2, 4, 5], views.rowLabels())
+        with open('data/videoByWeekCS145.csv', 'r') as fd:
+            rows = list(csv.reader(fd))
+        self.assertEqual(sorted(set(row[1] for row in rows)), views.columnLabels())
+        table = views.values()
+        self.assertEqual(len(rows), np.count_nonzero(~np.isnan(table)))
+        self.assertEqual(sum(float(row[2]) for row in rows), np.nansum(table))
+        self.assertEqual([str(label) for label in views.columnLabels()], [series['name'] for series in views.dataSeries()])
+        
+        lines = views.heatmapLines()
+        self.assertEqual('x,y,value', lines[0])
+        self.assertEqual(len(rows) + 1, len(lines))
+        heatChart = Heatmap(lines, rowsToSkip=1)
+        self.assertEqual(sorted(set(row[1] for row in rows)), heatChart.options['yAxis'].axisDict['categories'])
+        self.assertRaises(ValueError, Pivot('data/videoByWeekCS145.csv', 0, header=False).heatmapLines)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+'''
+Created on Oct 16, 2026
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from chartmaker import ChartMaker, DataSeries, Heatmap, Histogram, Pie
+from heatmapstate import HeatmapState
+from rendercache import CachedChart, RenderCache
+
+
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        ChartMaker.resetChartNameIndex()
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir)
+        ChartMaker.resetChartNameIndex()
+
+    def testHitAndMiss(self):
+        cache = RenderCache(self.cacheDir)
+        histogram = cache.getChart(Histogram, 'Grades', 'Grade', ['A', 'B'], DataSeries(np.array([3, 4])))
+        heatmap = cache.getChart(Heatmap, 'data/testHeatmapInput.csv', rowsToSkip=1)
+        self.assertIsInstance(heatmap, Heatmap)
+        page = ChartMaker.makeWebPage([histogram, heatmap])
+        lazyPage = ChartMaker.makeWebPage([histogram, heatmap], lazy=True)
+        
+        # A second run, by another cache object, renders nothing:
+        ChartMaker.resetChartNameIndex()
+        cache = RenderCache(self.cacheDir)
+        histogram = cache.getChart(Histogram, 'Grades', 'Grade', ['A', 'B'], DataSeries(np.array([3, 4])))
+        heatmap = cache.getChart(Heatmap, 'data/testHeatmapInput.csv', rowsToSkip=1)
+        self.assertIsInstance(heatmap, CachedChart)
+        self.assertEqual(page, ChartMaker.makeWebPage([histogram, heatmap]))
+        self.assertEqual(lazyPage, ChartMaker.makeWebPage([histogram, heatmap], lazy=True))
+        self.assertEqual((2, 0), (cache.hits, cache.misses))
+        
+        # Cached charts take the next chart name:
+        ChartMaker.resetChartNameIndex()
+        ChartMaker()
+        heatmap = cache.getChart(Heatmap, 'data/testHeatmapInput.csv', rowsToSkip=1)
+        self.assertEqual('chart1', heatmap.getInternalName())
+        self.assertIn("'chart1_csv'", heatmap.getChartFuncSource())
+        self.assertNotIn('chart0', ''.join(heatmap.iterDivSource()))
+        
+        # Different arguments or data miss:
+        cache.getChart(Histogram, 'Grades', 'Grade', ['A', 'B'], DataSeries(np.array([3, 5])))
+        cache.getChart(Heatmap, 'data/testHeatmapInput.csv', rowsToSkip=1, payloadMode='columnar')
+        self.assertEqual(2, cache.misses)
+        self.assertEqual(4, cache.statistics()['entries'])
+
+    def testFileFingerprint(self):
+        dataFile = os.path.join(self.cacheDir, 'heat.csv')
+        shutil.copy('data/testHeatmapInput.csv', dataFile)
+        cache = RenderCache(self.cacheDir)
+        key = cache.chartKey(Heatmap, (dataFile,), {'rowsToSkip' : 1})
+        self.assertEqual(key, cache.chartKey(Heatmap, (dataFile,), {'rowsToSkip' : 1}))
+        with open(dataFile, 'a') as fd:
+            fd.write('2014-01-01,0,1.0\n')
+        self.assertNotEqual(key, cache.chartKey(Heatmap, (dataFile,), {'rowsToSkip' : 1}))
+        self.assertRaises(TypeError, cache.chartKey, Heatmap, (object(),), {})
+        # The same bytes, written again, keep the key:
+        key = cache.chartKey(Heatmap, (dataFile,), {'rowsToSkip' : 1})
+        with open(dataFile, 'r') as fd:
+            content = fd.read()
+        with open(dataFile, 'w') as fd:
+            fd.write(content)
+        os.utime(dataFile, ns=(0, 0))
+        self.assertEqual(key, cache.chartKey(Heatmap, (dataFile,), {'rowsToSkip' : 1}))
+        # Titles are text, even if they name a file:
+        histogramArgs = [dataFile, 'Grade', ['A'], DataSeries([3])]
+        key = cache.chartKey(Histogram, histogramArgs, {})
+        keywordKey = cache.chartKey(Heatmap, (), {'xyzCSVFileOrArr' : dataFile})
+        with open(dataFile, 'a') as fd:
+            fd.write('2014-01-02,0,1.0\n')
+        self.assertEqual(key, cache.chartKey(Histogram, histogramArgs, {}))
+        self.assertNotEqual(keywordKey, cache.chartKey(Heatmap, (), {'xyzCSVFileOrArr' : dataFile}))
+        self.assertNotEqual(key, cache.chartKey(Histogram, ['data'] + histogramArgs[1:], {}))
+
+    def testHeatmapState(self):
+        state = HeatmapState(os.path.join(self.cacheDir, 'state'))
+        state.append(['2013-01-01,0,1.3', '2013-01-01,1,1.4'])
+        cache = RenderCache(os.path.join(self.cacheDir, 'cache'))
+        self.assertIsInstance(cache.getChart(Heatmap, state), Heatmap)
+        self.assertIsInstance(cache.getChart(Heatmap, state), CachedChart)
+        # Appended rows make a new chart:
+        state.append(['2013-01-02,0,1.5'])
+        self.assertIsInstance(cache.getChart(Heatmap, state), Heatmap)
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+    def testSourceFiles(self):
+        cache = RenderCache(self.cacheDir)
+        sourceFiles = [os.path.basename(sourceFile) for sourceFile in cache.sourceFiles(Heatmap)]
+        for moduleName in ('chartmaker.py', 'columns.py', 'binning.py', 'dateparsing.py', 'sketches.py', 
+                           'heatmapstate.py', 'rendercache.py'):
+            self.assertIn(moduleName, sourceFiles)
+        self.assertFalse([sourceFile for sourceFile in sourceFiles if sourceFile.startswith('test_')])
+
+    def testNameInData(self):
+        cache = RenderCache(self.cacheDir)
+        cache.getChart(Histogram, 'chart0', 'Grade', ['chart0', "'chart0'"], DataSeries([3, 4]))
+        cache.getChart(Pie, 'Origin', [DataSeries([3], legendLabel='chart1')])
+        ChartMaker.resetChartNameIndex()
+        ChartMaker()
+        ChartMaker()
+        histogram = cache.getChart(Histogram, 'chart0', 'Grade', ['chart0', "'chart0'"], DataSeries([3, 4]))
+        pie = cache.getChart(Pie, 'Origin', [DataSeries([3], legendLabel='chart1')])
+        self.assertEqual((2, 0), (cache.hits, cache.misses - 2))
+        self.assertIn("title: {text: 'chart0'}", histogram.getChartFuncSource())
+        self.assertIn("categories: ['chart0','\\'chart0\\'']", histogram.getChartFuncSource())
+        self.assertIn('<div id="chart2"', ''.join(histogram.iterDivSource()))
+        self.assertIn("series: [{type: 'pie',name: 'chart3',data: [['chart1',3]]}]", pie.getChartFuncSource())
+
+    def testEviction(self):
+        cache = RenderCache(self.cacheDir, maxBytes=2000)
+        for numB in range(20):
+            cache.getChart(Histogram, 'Grades', 'Grade', ['A', 'B'], DataSeries([3, numB]))
+        statistics = cache.statistics()
+        self.assertTrue(statistics['bytes'] <= 2000)
+        self.assertTrue(statistics['evictions'] > 0)
+        self.assertEqual(20, statistics['misses'])
+        self.assertEqual(20, statistics['entries'] + statistics['evictions'])
+
+if __name__ == "__main__":
+    unittest.main()
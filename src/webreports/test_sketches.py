@@ -0,0 +1,66 @@
+'''
+Created on Oct 16, 2026
+'''
+import json
+import unittest
+
+import numpy as np
+
+from sketches import SpaceSaving, TDigest
+
+
+class TestSketches(unittest.TestCase):
+
+    def testQuantiles(self):
+        values = np.random.RandomState(7).lognormal(size=100000)
+        digest = TDigest(compression=100)
+        for chunk in np.array_split(values, 37):
+            digest.update(chunk)
+        self.assertEqual(len(values), digest.count)
+        self.assertTrue(len(digest.means) <= 2 * digest.compression)
+        # Extrema are exact:
+        self.assertEqual((values.min(), values.max()), (digest.quantile(0), digest.quantile(1)))
+        quantiles = np.array([0.001, 0.01, 0.05, 0.5, 0.95, 0.99, 0.999])
+        ranks = np.searchsorted(np.sort(values), digest.quantile(quantiles)) / float(len(values))
+        self.assertTrue(np.all(np.abs(ranks - quantiles) < 0.005))
+
+    def testEmptyAndMissing(self):
+        digest = TDigest()
+        self.assertIsNone(digest.quantile(0.5))
+        digest.update(np.array([np.nan, 4., np.nan]))
+        self.assertEqual(1, digest.count)
+        self.assertEqual(4., digest.quantile(0.5))
+
+    def testJSON(self):
+        digest = TDigest(compression=50)
+        digest.update(np.arange(10000.))
+        restored = TDigest.fromJSON(json.loads(json.dumps(digest.toJSON())))
+        self.assertEqual(digest.count, restored.count)
+        self.assertEqual(digest.quantile(0.9), restored.quantile(0.9))
+        # Restored digests keep taking values:
+        restored.update(np.array([-1., 20000.]))
+        self.assertEqual((-1., 20000.), (restored.quantile(0), restored.quantile(1)))
+    def testSpaceSaving(self):
+        # Zipf-like stream: label i occurs about 10000 / i times
+        random = np.random.RandomState(3)
+        labels = ['label%d' % i for i in np.minimum(random.zipf(1.5, size=50000), 100000)]
+        sketch = SpaceSaving(50)
+        for start in range(0, len(labels), 5000):
+            sketch.updateChunk(labels[start:start + 5000])
+        self.assertEqual(len(labels), sketch.total)
+        self.assertTrue(len(sketch.counts) <= 50)
+        self.assertEqual(sketch.total, sum(sketch.counts.values()))
+        trueCounts = dict((label, labels.count(label)) for label in set(labels[:2000]))
+        trueTop = sorted(trueCounts, key=lambda label: -trueCounts[label])[:5]
+        top = sketch.top(5)
+        self.assertEqual(trueTop, [label for (label, _, _) in top])
+        for (label, count, error) in top:
+            self.assertTrue(count - error <= trueCounts[label] <= count)
+        # Weighted rows:
+        sketch = SpaceSaving(2)
+        sketch.updateChunk([('a', 5), ('b', 1), ('c', 2), ('a', 1.5)])
+        self.assertEqual(('a', 6.5, 0), sketch.top(1)[0])
+        self.assertEqual(9.5, sketch.total)
+
+if __name__ == "__main__":
+    unittest.main()